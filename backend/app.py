@@ -1,31 +1,81 @@
 from flask import Flask
-from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
 from app.config import Config
 from app.extensions import db, jwt, init_cors
 from app.routes.auth import bp as auth_bp
-from flasgger import Swagger
 from flask.cli import FlaskGroup
 from app.routes.exam import bp as exam_bp
+from app.question_bank import question_bank
+from app.papers import paper_pool
+from app.cli import exam_cli, questions_cli
+from app import regrade  # noqa: registers exam CLI commands
+from app import importer  # noqa: registers questions CLI commands
+from app import archive  # noqa: registers exam CLI commands
+from app.grading_queue import grading_queue
+from app.autosave import answer_buffer
+from app.aggregates import aggregates
+from app.expiry import exam_expiry
+from app.hashing import password_hasher
+from app.kvstore import init_store
+from app.ratelimit import login_limiter
+from app.security import init_keyring
+from app.profiles import profile_cache
+from app.db_metrics import pool_metrics
+from app.metrics import init_metrics, metrics
+from app.profiler import slow_request_profiler
+from app.json_provider import init_json
+from app.compression import compressor
+from app.routing import replica_router
+from app.schema import init_schema
+from app.revocation import token_denylist
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    init_json(app)
+    hops = app.config.get("PROXY_FIX_HOPS", 0)
+    if hops:
+        # request.remote_addr becomes the client's address, not the proxy's
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
 
-    Swagger(app)
+    if app.config.get("SWAGGER_ENABLED"):
+        # flasgger builds the spec on the first /apispec_1.json request
+        from flasgger import Swagger
+        Swagger(app)
 
+    init_metrics(app)
+    slow_request_profiler.init_app(app)
+    compressor.init_app(app)
+    pool_metrics.init_app(app)
     db.init_app(app)
-    Migrate(app, db)
+    replica_router.init_app(app, db)
     jwt.init_app(app)
+    token_denylist.init_app(app)
+    question_bank.init_app(app)
+    paper_pool.init_app(app)
+    password_hasher.init_app(app)
+    init_store(app)
+    login_limiter.init_app(app)
+    init_keyring(app)
+    profile_cache.init_app(app)
+    grading_queue.init_app(app)
+    answer_buffer.init_app(app)
+    aggregates.init_app(app)
+    exam_expiry.init_app(app)
     init_cors(app, [o.strip() for o in app.config.get("CORS_ORIGINS","").split(",") if o.strip()])
-    print("CORS_ORIGINS:", app.config.get("CORS_ORIGINS"))
+    app.logger.info("CORS_ORIGINS: %s", app.config.get("CORS_ORIGINS"))
 
 
     with app.app_context():
         from app import models  # noqa
-        db.create_all()
+        # handy for local runs; deployments managed by `flask db upgrade` turn it off
+        if app.config.get("DB_CREATE_ALL"):
+            init_schema()
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(exam_bp)
+    app.cli.add_command(exam_cli)
+    app.cli.add_command(questions_cli)
 
     @app.get("/health")
     def health():
@@ -50,6 +100,48 @@ def create_app():
                       example: flask_auth
         """
         return {"status": "ok", "service": "flask_auth"}
+
+    @app.get("/stats")
+    def stats():
+        """
+        Internal runtime statistics
+        ---
+        tags:
+          - System
+        responses:
+          200:
+            description: Counters for the password hashing pool, profile cache, DB connection pool, paper pool, response compression, grading queue, autosave buffer, exam expiry, statistics aggregates, read replicas and the token denylist
+        """
+        return {
+            "password_hasher": password_hasher.stats(),
+            "profile_cache": profile_cache.stats(),
+            "db_pool": pool_metrics.stats(db.engine.pool),
+            "paper_pool": paper_pool.stats(),
+            "compression": compressor.stats(),
+            "grading_queue": grading_queue.stats(),
+            "autosave": answer_buffer.stats(),
+            "exam_expiry": exam_expiry.stats(),
+            "aggregates": aggregates.stats(),
+            "db_replicas": replica_router.stats(),
+            "token_denylist": token_denylist.stats(),
+        }
+
+    @app.get("/metrics")
+    def prometheus_metrics():
+        """
+        Prometheus metrics
+        ---
+        tags:
+          - System
+        responses:
+          200:
+            description: Request latency, SQL and bcrypt metrics in Prometheus text format
+            content:
+              text/plain:
+                schema:
+                  type: string
+        """
+        return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
     
     @app.route("/test")
     def serve_test():
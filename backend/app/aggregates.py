@@ -0,0 +1,407 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+import click
+import numpy as np
+from sqlalchemy import bindparam, case, delete, event, func, insert, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .cli import exam_cli
+from .extensions import db
+from .metrics import metrics
+from .archive import Segment
+from .models import (Answer, ArchivedSession, ArchiveSegment, ExamQuestion, ExamSession, QuestionStats,
+                     UserScoreStats)
+from .regrade import load_key_array, option_codes
+
+log = logging.getLogger(__name__)
+
+QUESTION_COUNTERS = ("graded", "correct", "chosen_a", "chosen_b", "chosen_c", "chosen_d")
+_CHOSEN_SLOT = {"A": 2, "B": 3, "C": 4, "D": 5}
+
+
+class Deltas:
+    """Counter increments for question_stats and user_score_stats.
+
+    ``questions`` maps question id -> increments in QUESTION_COUNTERS order;
+    ``users`` maps user id -> [exams, total_score, best_score,
+    last_session_id, last_score, last_submitted_at].
+    """
+
+    def __init__(self):
+        self.questions = defaultdict(lambda: [0] * len(QUESTION_COUNTERS))
+        self.users = {}
+
+    def __bool__(self):
+        return bool(self.questions or self.users)
+
+    def add_exam(self, user_id, session_id, score, finished_at, question_ids, chosen, key):
+        """Count one graded exam: its questions, the merged answers and the score."""
+        for qid in question_ids:
+            counts = self.questions[qid]
+            counts[0] += 1
+            option = chosen.get(qid)
+            if option is not None:
+                counts[_CHOSEN_SLOT[option]] += 1
+                if key.get(qid) == option:
+                    counts[1] += 1
+        self.add_score(user_id, session_id, score, finished_at)
+
+    def add_score(self, user_id, session_id, score, finished_at):
+        row = self.users.get(user_id)
+        if row is None:
+            self.users[user_id] = [1, score, score, session_id, score, finished_at]
+            return
+        row[0] += 1
+        row[1] += score
+        row[2] = max(row[2], score)
+        if session_id > row[3]:
+            row[3:] = [session_id, score, finished_at]
+
+    def merge(self, other):
+        for qid, counts in other.questions.items():
+            mine = self.questions[qid]
+            for i, n in enumerate(counts):
+                mine[i] += n
+        for user_id, (exams, total, best, last_id, last_score, last_at) in other.users.items():
+            row = self.users.get(user_id)
+            if row is None:
+                self.users[user_id] = [exams, total, best, last_id, last_score, last_at]
+                continue
+            row[0] += exams
+            row[1] += total
+            row[2] = max(row[2], best)
+            if last_id > row[3]:
+                row[3:] = [last_id, last_score, last_at]
+
+
+def _question_increments(table, new):
+    return {name: table.c[name] + getattr(new, name) for name in QUESTION_COUNTERS}
+
+
+def _user_increments(table, new):
+    newer = new.last_session_id > func.coalesce(table.c.last_session_id, 0)
+    # last_session_id goes last: MySQL applies assignments left to right
+    return {
+        "exams": table.c.exams + new.exams,
+        "total_score": table.c.total_score + new.total_score,
+        "best_score": case((new.best_score > table.c.best_score, new.best_score), else_=table.c.best_score),
+        "last_score": case((newer, new.last_score), else_=table.c.last_score),
+        "last_submitted_at": case((newer, new.last_submitted_at), else_=table.c.last_submitted_at),
+        "last_session_id": case((newer, new.last_session_id), else_=table.c.last_session_id),
+    }
+
+
+def _increment(model, key, rows, increments):
+    """Add ``rows`` onto the counters of ``model`` in one executemany upsert.
+
+    ``increments(table, new)`` builds the SET clause from the stored row and
+    the incoming values. Dialects without an upsert get an UPDATE of the
+    existing keys plus an INSERT of the missing ones.
+    """
+    dialect = db.engine.dialect.name
+    table = model.__table__
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (postgresql.insert if dialect == "postgresql" else sqlite.insert)(table)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=[key], set_=increments(table, stmt.excluded)), rows)
+    elif dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table)
+        db.session.execute(stmt.on_duplicate_key_update(list(increments(table, stmt.inserted).items())), rows)
+    else:
+        existing = set(db.session.scalars(select(table.c[key]).where(table.c[key].in_([r[key] for r in rows]))))
+        new = SimpleNamespace(**{name: bindparam("new_" + name) for name in rows[0] if name != key})
+        updates = [{"new_" + k: v for k, v in r.items()} for r in rows if r[key] in existing]
+        if updates:
+            db.session.execute(
+                update(table).where(table.c[key] == bindparam("new_" + key)).values(increments(table, new))
+                .execution_options(synchronize_session=False),
+                updates,
+            )
+        inserts = [r for r in rows if r[key] not in existing]
+        if inserts:
+            db.session.execute(insert(table), inserts)
+
+
+def apply_deltas(deltas: Deltas):
+    """Write ``deltas`` onto the counter tables in the current transaction."""
+    if deltas.questions:
+        _increment(QuestionStats, "question_id", [
+            {"question_id": qid, **dict(zip(QUESTION_COUNTERS, counts))}
+            for qid, counts in sorted(deltas.questions.items())
+        ], _question_increments)
+    if deltas.users:
+        _increment(UserScoreStats, "user_id", [
+            {"user_id": uid, "exams": exams, "total_score": total, "best_score": best,
+             "last_session_id": last_id, "last_score": last_score, "last_submitted_at": last_at}
+            for uid, (exams, total, best, last_id, last_score, last_at) in sorted(deltas.users.items())
+        ], _user_increments)
+
+
+class AggregateBuffer:
+    """Write-behind counters for question statistics and user score totals.
+
+    grade_sessions attaches each batch's increments to the database session;
+    they join the in-memory buffer only once that transaction commits, so a
+    rolled-back grade never counts. A background thread folds the buffer
+    into question_stats and user_score_stats every ``flush_interval``
+    seconds (and once more at exit) with one upsert per table, so hot
+    questions take one row write per flush rather than one per submit.
+    Reads are primary key lookups. A crashed process loses at most one
+    interval of increments; ``flask exam rebuild-stats`` recomputes
+    everything from the graded sessions.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.flush_interval = 5.0
+        self._pending = Deltas()
+        self._lock = threading.Lock()
+        self._flushing = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.exams = 0
+        self.flushes = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = float(app.config.get("AGGREGATES_FLUSH_SECONDS", self.flush_interval))
+        app.extensions["aggregates"] = self
+        metrics.gauge("aggregates_pending_rows", "Counter rows waiting to be flushed, by table.",
+                      lambda: {(("table", "question_stats"),): len(self._pending.questions),
+                               (("table", "user_score_stats"),): len(self._pending.users)})
+
+    def record(self, session, deltas: Deltas):
+        """Queue ``deltas`` to be buffered once ``session`` commits."""
+        if deltas:
+            session.info.setdefault("aggregate_deltas", []).append(deltas)
+
+    def _committed(self, batches):
+        self._ensure_flusher()
+        with self._lock:
+            for deltas in batches:
+                self._pending.merge(deltas)
+                self.exams += sum(row[0] for row in deltas.users.values())
+
+    def _ensure_flusher(self):
+        # the flusher thread does not survive a fork
+        if self._pid == os.getpid() or self.app is None:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pending = Deltas()
+                self._thread = threading.Thread(target=self._flush_loop, name="aggregates-flush", daemon=True)
+                self._thread.start()
+                atexit.register(self._flush_at_exit)
+
+    def flush(self) -> int:
+        """Write the buffered increments; returns how many counter rows changed."""
+        with self._flushing:
+            with self._lock:
+                pending, self._pending = self._pending, Deltas()
+            if not pending:
+                return 0
+            try:
+                apply_deltas(pending)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    pending.merge(self._pending)
+                    self._pending = pending
+                raise
+            self.flushes += 1
+            return len(pending.questions) + len(pending.users)
+
+    def _flush_at_exit(self):
+        if self._pid != os.getpid():
+            return
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception:
+            log.exception("aggregates flush at exit failed")
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception:
+                log.exception("aggregates flush failed")
+
+    def stats(self) -> dict:
+        return {
+            "pending_questions": len(self._pending.questions),
+            "pending_users": len(self._pending.users),
+            "exams": self.exams,
+            "flushes": self.flushes,
+        }
+
+
+aggregates = AggregateBuffer()
+
+
+@event.listens_for(Session, "after_commit")
+def _buffer_committed_deltas(session):
+    batches = session.info.pop("aggregate_deltas", None)
+    if batches:
+        aggregates._committed(batches)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_deltas(session):
+    session.info.pop("aggregate_deltas", None)
+
+
+def user_stats(user_id) -> dict:
+    row = db.session.get(UserScoreStats, user_id)
+    return (row or UserScoreStats(exams=0, total_score=0, best_score=0)).to_public()
+
+
+def question_stats(question_ids) -> list:
+    """Counters for ``question_ids`` in the given order (zeros if never graded)."""
+    rows = {
+        row.question_id: row
+        for row in db.session.scalars(select(QuestionStats).where(QuestionStats.question_id.in_(question_ids)))
+    }
+    empty = dict.fromkeys(QUESTION_COUNTERS, 0)
+    return [(rows.get(qid) or QuestionStats(question_id=qid, **empty)).to_public() for qid in question_ids]
+
+
+def _bincount(values, size):
+    return np.bincount(values, minlength=size) if len(values) else np.zeros(size, dtype=np.int64)
+
+
+def count_questions(deltas, key, served_ids, answer_ids, answer_codes):
+    """Add question counters from flat columns: the question ids of every
+    graded paper, and every stored answer as (question id, option code)."""
+    served_ids = np.asarray(served_ids, dtype=np.int64)
+    ids = np.asarray(answer_ids, dtype=np.int64)
+    codes = np.asarray(answer_codes, dtype=np.int16)
+    size = int(max(len(key), served_ids.max(initial=0) + 1, ids.max(initial=0) + 1))
+    known = ids < len(key)
+    expected = np.full(len(ids), -1, dtype=np.int16)
+    expected[known] = key[ids[known]]
+    counts = np.stack([
+        _bincount(served_ids, size),
+        _bincount(ids[(expected == codes) & (expected >= 0)], size),
+        *(_bincount(ids[codes == code], size) for code in range(4)),
+    ], axis=1)
+    for qid in np.nonzero(counts.any(axis=1))[0]:
+        mine = deltas.questions[int(qid)]
+        for i, n in enumerate(counts[qid]):
+            mine[i] += int(n)
+
+
+def rebuild_chunk(key, chunk) -> Deltas:
+    """Deltas for a chunk of submitted sessions (id, user_id, score, end_time,
+    answer_ids, answer_codes) sorted by id, scored against ``key``."""
+    deltas = Deltas()
+    session_ids = np.asarray([row[0] for row in chunk], dtype=np.int64)
+    for sid, user_id, score, end_time, _, _ in chunk:
+        deltas.add_score(user_id, sid, score or 0, end_time)
+
+    served = db.session.execute(
+        select(ExamQuestion.exam_session_id, ExamQuestion.question_id)
+        .where(ExamQuestion.exam_session_id.between(int(session_ids[0]), int(session_ids[-1])))
+    ).all()
+    served_ids = np.asarray([qid for sid, qid in served], dtype=np.int64)
+    served_ids = served_ids[np.isin(np.asarray([sid for sid, _ in served], dtype=np.int64), session_ids)]
+
+    # packed records are read in place; the rest come from the answers table
+    ids = [np.frombuffer(row[4], dtype="<i4") for row in chunk if row[4]]
+    codes = [np.frombuffer(row[5], dtype=np.uint8) for row in chunk if row[4]]
+    legacy = [row[0] for row in chunk if row[4] is None]
+    if legacy:
+        rows = db.session.execute(
+            select(Answer.exam_session_id, Answer.question_id, Answer.chosen_option)
+            .where(Answer.exam_session_id.between(legacy[0], legacy[-1]))
+        ).all()
+        legacy = set(legacy)
+        rows = [r for r in rows if r[0] in legacy]
+        if rows:
+            ids.append(np.asarray([r[1] for r in rows], dtype=np.int64))
+            codes.append(option_codes([r[2] for r in rows]))
+    count_questions(
+        deltas, key, served_ids,
+        np.concatenate(ids).astype(np.int64) if ids else (),
+        np.concatenate(codes).astype(np.int16) if codes else (),
+    )
+    return deltas
+
+
+def rebuild_segment(key, segment_id, first_session_id, last_session_id, data) -> Deltas:
+    """Deltas for the sessions of one archive segment."""
+    deltas = Deltas()
+    for sid, user_id, score, end_time in db.session.execute(
+        select(ArchivedSession.id, ArchivedSession.user_id, ArchivedSession.score, ArchivedSession.end_time)
+        .where(ArchivedSession.id.between(first_session_id, last_session_id),
+               ArchivedSession.segment_id == segment_id)
+    ):
+        deltas.add_score(user_id, sid, score or 0, end_time)
+    segment = Segment(data)
+    count_questions(deltas, key, segment.column("question_id"),
+                    segment.column("answer_question"), segment.column("answer_code"))
+    return deltas
+
+
+@exam_cli.command("rebuild-stats")
+@click.option("--chunk-size", default=5000, show_default=True, help="Sessions scanned per transaction.")
+def rebuild_stats(chunk_size):
+    """Recompute question statistics and user score totals from scratch.
+
+    Clears both counter tables and re-adds every submitted session in id
+    order, one chunk per transaction, then every archive segment. Sessions
+    graded while it runs may be counted twice, so run it when grading is
+    quiet (e.g. after a regrade).
+    """
+    key = load_key_array()
+    db.session.execute(delete(QuestionStats))
+    db.session.execute(delete(UserScoreStats))
+    db.session.commit()
+
+    last_id = 0
+    total = 0
+    started = time.perf_counter()
+    while True:
+        chunk = db.session.execute(
+            select(ExamSession.id, ExamSession.user_id, ExamSession.score, ExamSession.end_time,
+                   ExamSession.answer_ids, ExamSession.answer_codes)
+            .where(ExamSession.submitted.is_(True), ExamSession.id > last_id)
+            .order_by(ExamSession.id)
+            .limit(chunk_size)
+        ).all()
+        if not chunk:
+            break
+        apply_deltas(rebuild_chunk(key, chunk))
+        db.session.commit()
+        last_id = chunk[-1][0]
+        total += len(chunk)
+        click.echo(f"sessions<={last_id}: {total} sessions ({total / (time.perf_counter() - started):,.0f}/s)")
+
+    last_segment = 0
+    while True:
+        segment = db.session.execute(
+            select(ArchiveSegment.id, ArchiveSegment.first_session_id, ArchiveSegment.last_session_id,
+                   ArchiveSegment.sessions, ArchiveSegment.data)
+            .where(ArchiveSegment.id > last_segment)
+            .order_by(ArchiveSegment.id)
+            .limit(1)
+        ).first()
+        if segment is None:
+            break
+        apply_deltas(rebuild_segment(key, segment.id, segment.first_session_id, segment.last_session_id,
+                                     segment.data))
+        db.session.commit()
+        last_segment = segment.id
+        total += segment.sessions
+        click.echo(f"archive segment {segment.id}: {total} sessions ({total / (time.perf_counter() - started):,.0f}/s)")
+    click.echo(f"rebuilt statistics from {total} sessions in {time.perf_counter() - started:.1f}s")
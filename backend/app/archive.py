@@ -0,0 +1,261 @@
+import json
+import struct
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.exc import DBAPIError
+
+from .cli import exam_cli
+from .extensions import db
+from .models import (Answer, ArchivedSession, ArchiveSegment, ExamQuestion, ExamSession,
+                     ExamSubmission)
+from .packed import CODES, LETTERS, unpack
+
+MAGIC = b"EXA1"
+ZLIB_LEVEL = 9
+# per session: its id and how many questions / answers it has; the paper and
+# the answers themselves are flat columns sliced by those counts
+COLUMNS = {
+    "session_id": "<i4",
+    "question_count": "<i4",
+    "question_id": "<i4",
+    "answer_count": "<i4",
+    "answer_question": "<i4",
+    "answer_code": "u1",
+}
+HOT_TABLES = ("exam_sessions", "exam_questions", "answers", "exam_submissions")
+
+
+def encode_segment(columns: dict) -> tuple:
+    """Serialize ``columns`` (name -> sequence) as one segment blob.
+
+    Layout: MAGIC, each column zlib-compressed on its own, then a JSON
+    footer indexing the columns by (offset, length, raw size), the footer
+    length as little-endian uint32 and MAGIC again. Readers seek to the
+    footer and decompress only the columns they need. Returns
+    ``(blob, raw_bytes)``.
+    """
+    parts = [MAGIC]
+    offset = len(MAGIC)
+    index = {}
+    raw_bytes = 0
+    for name, dtype in COLUMNS.items():
+        raw = np.asarray(columns[name], dtype=dtype).tobytes()
+        data = zlib.compress(raw, ZLIB_LEVEL)
+        index[name] = [offset, len(data), len(raw)]
+        parts.append(data)
+        offset += len(data)
+        raw_bytes += len(raw)
+    footer = json.dumps({"version": 1, "rows": len(columns["session_id"]), "columns": index},
+                        separators=(",", ":")).encode()
+    parts += [footer, struct.pack("<I", len(footer)), MAGIC]
+    return b"".join(parts), raw_bytes
+
+
+class Segment:
+    """Read side of a segment blob; columns are decompressed on first use."""
+
+    def __init__(self, blob):
+        if blob[:4] != MAGIC or blob[-4:] != MAGIC:
+            raise ValueError("not an archive segment")
+        (footer_len,) = struct.unpack_from("<I", blob, len(blob) - 8)
+        footer = json.loads(bytes(blob[len(blob) - 8 - footer_len:len(blob) - 8]))
+        self.rows = footer["rows"]
+        self._index = footer["columns"]
+        self._blob = blob
+        self._columns = {}
+
+    def column(self, name) -> np.ndarray:
+        values = self._columns.get(name)
+        if values is None:
+            offset, length, _ = self._index[name]
+            raw = zlib.decompress(self._blob[offset:offset + length])
+            values = self._columns[name] = np.frombuffer(raw, dtype=COLUMNS[name])
+        return values
+
+    def session(self, session_id):
+        """``(question ids in paper order, question id -> option)`` or None."""
+        ids = self.column("session_id")
+        i = int(np.searchsorted(ids, session_id))
+        if i >= len(ids) or ids[i] != session_id:
+            return None
+        q_end = np.cumsum(self.column("question_count"))
+        a_end = np.cumsum(self.column("answer_count"))
+        q_lo, a_lo = (q_end[i - 1], a_end[i - 1]) if i else (0, 0)
+        questions = self.column("question_id")[q_lo:q_end[i]].tolist()
+        answered = self.column("answer_question")[a_lo:a_end[i]].tolist()
+        codes = self.column("answer_code")[a_lo:a_end[i]]
+        return questions, {qid: LETTERS[code] for qid, code in zip(answered, codes)}
+
+
+def read_archived(archived: ArchivedSession):
+    """Paper and answers of an archived session, from its segment."""
+    data = db.session.scalar(select(ArchiveSegment.data).where(ArchiveSegment.id == archived.segment_id))
+    return Segment(data).session(archived.id)
+
+
+def archive_sessions(rows) -> tuple:
+    """Move submitted sessions (exam_sessions rows sorted by id) into one
+    segment plus their archived_sessions summaries, and delete them and
+    everything hanging off them from the hot tables, in the current
+    transaction. Returns ``(segment, rows deleted per table)``."""
+    ids = [r.id for r in rows]
+    papers = defaultdict(list)
+    for sid, qid in db.session.execute(
+        select(ExamQuestion.exam_session_id, ExamQuestion.question_id)
+        .where(ExamQuestion.exam_session_id.in_(ids))
+        .order_by(ExamQuestion.exam_session_id, ExamQuestion.id)
+    ):
+        papers[sid].append(qid)
+    answers = {r.id: unpack(r.answer_ids, r.answer_codes) for r in rows if r.answer_ids is not None}
+    legacy = [r.id for r in rows if r.answer_ids is None]
+    if legacy:
+        for sid, qid, chosen in db.session.execute(
+            select(Answer.exam_session_id, Answer.question_id, Answer.chosen_option)
+            .where(Answer.exam_session_id.in_(legacy))
+        ):
+            answers.setdefault(sid, {})[qid] = chosen
+
+    columns = defaultdict(list)
+    for sid in ids:
+        paper = papers[sid]
+        chosen = answers.get(sid, {})
+        columns["session_id"].append(sid)
+        columns["question_count"].append(len(paper))
+        columns["question_id"].extend(paper)
+        columns["answer_count"].append(len(chosen))
+        for qid in sorted(chosen):
+            columns["answer_question"].append(qid)
+            columns["answer_code"].append(CODES[chosen[qid]])
+    blob, raw_bytes = encode_segment(columns)
+
+    segment = ArchiveSegment(first_session_id=ids[0], last_session_id=ids[-1], sessions=len(ids),
+                             raw_bytes=raw_bytes, data=blob)
+    db.session.add(segment)
+    db.session.flush()
+    db.session.execute(insert(ArchivedSession), [
+        {"id": r.id, "user_id": r.user_id, "segment_id": segment.id, "start_time": r.start_time,
+         "end_time": r.end_time, "expires_at": r.expires_at, "score": r.score}
+        for r in rows
+    ])
+
+    deleted = {}
+    for model, column in ((Answer, Answer.exam_session_id),
+                          (ExamQuestion, ExamQuestion.exam_session_id),
+                          (ExamSubmission, ExamSubmission.exam_session_id),
+                          (ExamSession, ExamSession.id)):
+        result = db.session.execute(
+            delete(model).where(column.in_(ids)).execution_options(synchronize_session=False)
+        )
+        deleted[model.__tablename__] = result.rowcount
+    return segment, deleted
+
+
+def row_bytes(tables) -> dict:
+    """Average on-disk bytes per row, indexes included, for ``tables``.
+
+    Uses pg_total_relation_size / reltuples on PostgreSQL and the dbstat
+    virtual table on SQLite; empty where neither is available.
+    """
+    dialect = db.engine.dialect.name
+    try:
+        if dialect == "postgresql":
+            stats = db.session.execute(text(
+                "SELECT relname, pg_total_relation_size(oid), reltuples FROM pg_class "
+                "WHERE relkind = 'r' AND relname = ANY(:names)"
+            ), {"names": list(tables)}).all()
+            sizes = {name: size / rows for name, size, rows in stats if rows > 0}
+        elif dialect == "sqlite":
+            pages = dict(db.session.execute(text(
+                "SELECT m.tbl_name, SUM(d.pgsize) FROM dbstat d "
+                "JOIN sqlite_master m ON m.name = d.name GROUP BY m.tbl_name"
+            )).all())
+            sizes = {}
+            for name in tables:
+                rows = db.session.scalar(text(f'SELECT COUNT(*) FROM "{name}"'))
+                if rows and pages.get(name):
+                    sizes[name] = pages[name] / rows
+        else:
+            sizes = {}
+    except DBAPIError:
+        sizes = {}
+    db.session.rollback()
+    return sizes
+
+
+@exam_cli.command("archive")
+@click.option("--older-than-days", type=int, default=None,
+              help="Archive sessions finished before this many days ago [default: EXAM_ARCHIVE_AFTER_DAYS].")
+@click.option("--chunk-size", default=1000, show_default=True, help="Sessions moved per transaction (one segment each).")
+def archive(older_than_days, chunk_size):
+    """Move old submitted sessions out of the hot tables into the archive.
+
+    Walks exam_sessions in id order and stops at the first session started
+    after the cutoff; submitted sessions that finished before it go into a
+    compressed columnar segment per chunk, with a summary row in
+    archived_sessions that keeps them in /api/exam/history. Sessions still
+    open, or finished after the cutoff, stay and are picked up by a later
+    run. Bytes saved are estimated from the tables' average row sizes
+    (PostgreSQL returns the space for reuse after VACUUM).
+    """
+    if older_than_days is None:
+        older_than_days = current_app.config.get("EXAM_ARCHIVE_AFTER_DAYS", 180)
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    hot_bytes = row_bytes(HOT_TABLES)
+
+    last_id = 0
+    moved = written = raw = 0
+    deleted = defaultdict(int)
+    started = time.perf_counter()
+    while True:
+        chunk = db.session.execute(
+            select(ExamSession.id, ExamSession.user_id, ExamSession.start_time, ExamSession.end_time,
+                   ExamSession.expires_at, ExamSession.submitted, ExamSession.score,
+                   ExamSession.answer_ids, ExamSession.answer_codes)
+            .where(ExamSession.id > last_id)
+            .order_by(ExamSession.id)
+            .limit(chunk_size)
+        ).all()
+        # ids are handed out at start, so the first session started after
+        # the cutoff ends the walk
+        newer = next((i for i, r in enumerate(chunk) if r.start_time >= cutoff), None)
+        if newer is not None:
+            chunk = chunk[:newer]
+        if not chunk:
+            break
+        eligible = [r for r in chunk if r.submitted and (r.end_time or r.start_time) < cutoff]
+        if eligible:
+            segment, counts = archive_sessions(eligible)
+            written += len(segment.data)
+            raw += segment.raw_bytes
+            db.session.commit()
+            moved += len(eligible)
+            for table, n in counts.items():
+                deleted[table] += n
+        else:
+            db.session.rollback()
+        last_id = chunk[-1].id
+        elapsed = time.perf_counter() - started
+        click.echo(f"sessions<={last_id}: {moved} archived ({moved / elapsed if elapsed else 0:,.0f}/s), "
+                   f"{written:,} segment bytes")
+        if newer is not None:
+            break
+
+    elapsed = time.perf_counter() - started
+    rows = ", ".join(f"{n} {table}" for table, n in deleted.items())
+    click.echo(f"archived {moved} sessions in {elapsed:.1f}s ({moved / elapsed if elapsed else 0:,.0f}/s); "
+               f"deleted {rows or 'nothing'}")
+    if not moved:
+        return
+    click.echo(f"segments: {written:,} bytes for {raw:,} bytes of column data ({raw / written:.1f}x)")
+    if all(table in hot_bytes for table, n in deleted.items() if n):
+        freed = sum(n * hot_bytes[table] for table, n in deleted.items() if n)
+        summary = row_bytes(("archived_sessions",)).get("archived_sessions", 0) * moved
+        click.echo(f"hot tables: ~{freed:,.0f} bytes freed; archive: {written + summary:,.0f} bytes "
+                   f"incl. summaries; ~{freed - written - summary:,.0f} bytes saved")
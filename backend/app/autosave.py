@@ -0,0 +1,174 @@
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import select
+
+from .extensions import db
+from .grading import lock_open_sessions, save_answers
+from .kvstore import MemoryStore
+from .metrics import metrics
+from .models import ExamQuestion, ExamSession
+
+log = logging.getLogger(__name__)
+
+
+class SessionDirectory:
+    """What autosave needs to know about an open exam session, kept in memory
+    so recording an answer does not touch the database: its owner, its
+    question ids and its deadline (expires_at). Entries are primed by
+    start_exam and loaded on a miss."""
+
+    def __init__(self, max_sessions: int = 50_000, ttl: float = 4 * 3600):
+        self.ttl = ttl
+        self._store = MemoryStore(max_keys=max_sessions)
+
+    def put(self, session_id, user_id, question_ids, expires_at):
+        self._store.set(session_id, (str(user_id), frozenset(question_ids), expires_at), self.ttl)
+
+    def get(self, session_id):
+        entry = self._store.get(session_id)
+        if entry is None:
+            session = db.session.get(ExamSession, session_id)
+            if session is None or session.submitted:
+                return None
+            question_ids = db.session.scalars(
+                select(ExamQuestion.question_id).where(ExamQuestion.exam_session_id == session_id)
+            ).all()
+            self.put(session_id, session.user_id, question_ids, session.expires_at)
+            entry = self._store.get(session_id)
+        return entry
+
+    def close(self, session_id):
+        self._store.delete(session_id)
+
+
+class AnswerBuffer:
+    """Write-behind buffer for autosaved answers.
+
+    Repeated saves of the same (session, question) coalesce in memory; a
+    background thread upserts the buffer in one batch when it reaches
+    ``flush_size`` entries or every ``flush_interval`` seconds. A flush
+    locks the sessions it writes to as grading does, so it either lands
+    before a submit reads the stored answers or finds the session submitted
+    and drops its answers; never after the score was computed.
+    A failed flush keeps its batch for the next one; a crashed process
+    loses at most one interval of autosaves, and the final submit payload
+    still carries every answer.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.flush_size = 500
+        self.flush_interval = 2.0
+        self.sessions = SessionDirectory()
+        self._pending = {}  # (session_id, question_id) -> chosen option
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # held for a whole flush so take() never misses answers in flight
+        self._flushing = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.recorded = 0
+        self.flushed = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_size = int(app.config.get("AUTOSAVE_FLUSH_SIZE", self.flush_size))
+        self.flush_interval = float(app.config.get("AUTOSAVE_FLUSH_SECONDS", self.flush_interval))
+        app.extensions["answer_buffer"] = self
+        metrics.gauge("autosave_buffered_answers", "Autosaved answers waiting to be flushed.",
+                      lambda: {(): len(self._pending)})
+        metrics.gauge("autosave_answers", "Autosaved answers by stage.",
+                      lambda: {(("stage", "recorded"),): self.recorded, (("stage", "flushed"),): self.flushed})
+
+    def _ensure_flusher(self):
+        # the flusher thread does not survive a fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pending = {}
+                self._thread = threading.Thread(target=self._flush_loop, name="autosave-flush", daemon=True)
+                self._thread.start()
+
+    def record(self, session_id, question_id, chosen):
+        self._ensure_flusher()
+        with self._lock:
+            self._pending[(session_id, question_id)] = chosen
+            self.recorded += 1
+            if len(self._pending) >= self.flush_size:
+                self._wakeup.notify()
+
+    def take(self, session_id) -> list:
+        """Remove and return the buffered answers of one session (at submit)."""
+        with self._flushing, self._lock:
+            keys = [k for k in self._pending if k[0] == session_id]
+            return [{"question_id": k[1], "chosen_option": self._pending.pop(k)} for k in keys]
+
+    def drop(self, session_ids):
+        """Forget buffered answers of sessions that were just graded."""
+        session_ids = set(session_ids)
+        with self._lock:
+            for key in [k for k in self._pending if k[0] in session_ids]:
+                del self._pending[key]
+        for sid in session_ids:
+            self.sessions.close(sid)
+
+    def restore(self, session_id, taken):
+        """Put back answers from take() when the submit was rejected."""
+        with self._lock:
+            for ans in taken:
+                self._pending.setdefault((session_id, ans["question_id"]), ans["chosen_option"])
+
+    def flush(self) -> int:
+        with self._flushing:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        session_ids = {sid for sid, _ in pending}
+        try:
+            open_ids = set(lock_open_sessions(session_ids))
+            rows = [
+                {"exam_session_id": sid, "question_id": qid, "chosen_option": chosen}
+                for (sid, qid), chosen in pending.items()
+                if sid in open_ids
+            ]
+            if rows:
+                save_answers(rows)
+            db.session.commit()
+        except Exception:
+            # keep the batch for the next flush; answers recorded meanwhile win
+            db.session.rollback()
+            with self._lock:
+                pending.update(self._pending)
+                self._pending = pending
+            raise
+        for sid in session_ids - open_ids:
+            self.sessions.close(sid)  # graded elsewhere: stop taking its autosaves
+        self.flushed += len(rows)
+        return len(rows)
+
+    def stats(self) -> dict:
+        return {"buffered": len(self._pending), "recorded": self.recorded, "flushed": self.flushed}
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                if len(self._pending) < self.flush_size:
+                    self._wakeup.wait(self.flush_interval)
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception:
+                log.exception("autosave flush failed")
+                time.sleep(self.flush_interval)  # a full buffer would retry at once
+
+
+answer_buffer = AnswerBuffer()
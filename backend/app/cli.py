@@ -0,0 +1,4 @@
+from flask.cli import AppGroup
+
+exam_cli = AppGroup("exam", help="Exam maintenance commands.")
+questions_cli = AppGroup("questions", help="Question bank commands.")
@@ -0,0 +1,169 @@
+import struct
+import zlib
+
+from flask import current_app, request
+
+from .kvstore import MemoryStore
+from .metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+COMPRESSIBLE = ("application/json", "text/html", "text/plain", "text/css", "application/javascript")
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+CACHE_TTL = 24 * 3600
+
+
+def deflate_block(data: bytes, level: int) -> bytes:
+    """Raw deflate of ``data`` ending on a full flush: byte aligned, not
+    final and without back-references, so blocks from separate calls can be
+    concatenated into one valid stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH)
+
+
+def stored_block(data: bytes) -> bytes:
+    """``data`` as uncompressed deflate blocks: no compressor state to set
+    up, which is cheaper than deflating the few bytes of a per-response
+    head or tail."""
+    out = []
+    for i in range(0, len(data), 0xFFFF):
+        chunk = data[i:i + 0xFFFF]
+        out.append(struct.pack("<BHH", 0, len(chunk), len(chunk) ^ 0xFFFF) + chunk)
+    return b"".join(out)
+
+
+_FINAL_BLOCK = zlib.compressobj(6, zlib.DEFLATED, -15).flush(zlib.Z_FINISH)
+
+
+def gzip_join(pieces) -> bytes:
+    """Assemble a gzip member from ``(plain, deflated block)`` pairs."""
+    out = [GZIP_HEADER]
+    crc = size = 0
+    for plain, block in pieces:
+        crc = zlib.crc32(plain, crc)
+        size += len(plain)
+        out.append(block)
+    out.append(_FINAL_BLOCK)
+    out.append(struct.pack("<II", crc & 0xFFFFFFFF, size & 0xFFFFFFFF))
+    return b"".join(out)
+
+
+class ResponseCompressor:
+    """gzip (and brotli, when installed) for responses above a size threshold.
+
+    Bodies with a strong ETag are cached compressed, keyed by tag and
+    encoding, so a refresh is not recompressed. Exam papers go through
+    ``json_array_response``: every question fragment is deflated once into
+    an independent block and cached, and a response only frames its small
+    per-session head and tail as stored blocks before joining them, so
+    shared question content is not recompressed for every student.
+    """
+
+    def __init__(self):
+        self.min_size = 1024
+        self.level = 6
+        self.encodings = ("gzip",)
+        self._bodies = MemoryStore(max_keys=2048)
+        self._blocks = MemoryStore(max_keys=100_000)
+        self.compressed = 0
+        self.cache_hits = 0
+
+    def init_app(self, app):
+        cfg = app.config
+        self.min_size = int(cfg.get("COMPRESS_MIN_SIZE", self.min_size))
+        self.level = int(cfg.get("COMPRESS_LEVEL", self.level))
+        self._bodies = MemoryStore(max_keys=int(cfg.get("COMPRESS_CACHE_SIZE", 2048)))
+        use_brotli = cfg.get("COMPRESS_BROTLI", "auto")
+        if use_brotli == "true" and brotli is None:
+            raise RuntimeError("COMPRESS_BROTLI=true but brotli is not installed")
+        self.encodings = ("br", "gzip") if use_brotli in ("auto", "true") and brotli is not None else ("gzip",)
+        app.after_request(self._compress)
+        app.extensions["compressor"] = self
+        metrics.gauge("http_compressed_responses", "Responses compressed by this process, and compressed-body cache hits.",
+                      lambda: {(("source", "compressed"),): self.compressed, (("source", "cache"),): self.cache_hits})
+
+    @staticmethod
+    def etag_matches(tag: str):
+        """The variant of ``tag`` (itself or an encoded one) that If-None-Match
+        holds, to be echoed on the 304; None if it holds none."""
+        inm = request.if_none_match
+        return next((variant for variant in (tag, tag + "-gzip", tag + "-br") if inm.contains(variant)), None)
+
+    def _encode(self, body: bytes, encoding: str) -> bytes:
+        self.compressed += 1
+        if encoding == "br":
+            return brotli.compress(body, quality=min(self.level, 11))
+        return gzip_join([(body, deflate_block(body, self.level))])
+
+    def _compress(self, response):
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE
+        ):
+            return response
+        response.vary.add("Accept-Encoding")
+        body = response.get_data()
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if len(body) < self.min_size or not encoding:
+            return response
+        tag, weak = response.get_etag()
+        key = (tag, encoding) if tag and not weak else None
+        data = self._bodies.get(key) if key else None
+        if data is None:
+            data = self._encode(body, encoding)
+            if key:
+                self._bodies.set(key, data, CACHE_TTL)
+        else:
+            self.cache_hits += 1
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        if tag:
+            response.set_etag(f"{tag}-{encoding}", weak)
+        return response
+
+    def _block(self, fragment: bytes, prefix: bytes) -> bytes:
+        # bytes cache their hash, so keying on the fragment itself is cheap;
+        # fragments of unchanged questions survive question bank reloads
+        key = (prefix, fragment)
+        block = self._blocks.get(key)
+        if block is None:
+            block = deflate_block(prefix + fragment, self.level)
+            self._blocks.set(key, block, CACHE_TTL)
+            self.compressed += 1
+        else:
+            self.cache_hits += 1
+        return block
+
+    def json_array_response(self, head: bytes, fragments, tail: bytes, etag: str = None):
+        """Response for ``head + [fragment, ...] + tail``, gzip-assembled
+        from cached per-fragment blocks when the client accepts gzip."""
+        size = len(head) + len(tail) + 2 + sum(len(f) + 1 for f in fragments)
+        if size >= self.min_size and request.accept_encodings["gzip"]:
+            head, tail = head + b"[", b"]" + tail
+            pieces = [(head, stored_block(head))]
+            for i, fragment in enumerate(fragments):
+                prefix = b"," if i else b""
+                pieces.append((prefix + fragment, self._block(fragment, prefix)))
+            pieces.append((tail, stored_block(tail)))
+            response = current_app.response_class(gzip_join(pieces), mimetype="application/json")
+            response.headers["Content-Encoding"] = "gzip"
+            if etag:
+                response.set_etag(etag + "-gzip")
+        else:
+            body = head + b"[" + b",".join(fragments) + b"]" + tail
+            response = current_app.response_class(body, mimetype="application/json")
+            if etag:
+                response.set_etag(etag)
+        response.vary.add("Accept-Encoding")
+        return response
+
+    def stats(self) -> dict:
+        return {"encodings": list(self.encodings), "compressed": self.compressed, "cache_hits": self.cache_hits}
+
+
+compressor = ResponseCompressor()
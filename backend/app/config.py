@@ -1,16 +1,147 @@
 import os
 
+
+def _engine_options():
+    url = os.getenv("DATABASE_URL") or ""
+    options = {
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+    }
+    # in-memory SQLite is pinned to a StaticPool, which takes no sizing options
+    if url.startswith("sqlite") and (url.endswith(":memory:") or url.rstrip("/") in ("sqlite:", "sqlite+pysqlite:")):
+        return options
+    options.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        pool_use_lifo=os.getenv("DB_POOL_USE_LIFO", "true").lower() == "true",
+    )
+    statement_timeout_ms = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+    if statement_timeout_ms and url.startswith("postgresql"):
+        options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout_ms}"}
+    return options
+
+
 class Config:
     SECRET_KEY = os.getenv("FLASK_SECRET")
     DEBUG = os.getenv("FLASK_DEBUG", "true").lower() == "true"
 
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options()
+    # optional read replicas, comma separated; each becomes a replica_<n> bind
+    # that app.routing sends GET-request reads to
+    DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+    SQLALCHEMY_BINDS = {f"replica_{i}": url for i, url in enumerate(DATABASE_REPLICA_URLS)}
+    # after a write, that user's reads stay on the primary this long
+    REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+    REPLICA_HEALTH_INTERVAL_SECONDS = float(os.getenv("REPLICA_HEALTH_INTERVAL_SECONDS", "5"))
+    # skip a PostgreSQL replica replaying more than this far behind (0: no lag check)
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "0"))
+    # create missing tables at startup; set to false where migrations/ manages the schema
+    DB_CREATE_ALL = os.getenv("DB_CREATE_ALL", "true").lower() == "true"
+    # /apidocs and /apispec_1.json; off in production skips importing flasgger
+    SWAGGER_ENABLED = os.getenv("SWAGGER_ENABLED", "true").lower() == "true"
 
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:5173,http://127.0.0.1:5173")
 
     JWT_SECRET_KEY = os.getenv("JWT_SECRET")
     JWT_ACCESS_TOKEN_EXPIRES_MIN = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES_MIN", "60"))
     JWT_REFRESH_TOKEN_EXPIRES_DAYS = int(os.getenv("JWT_REFRESH_TOKEN_EXPIRES_DAYS", "7"))
+    # revoked tokens (logout, revoke-all): per-process Bloom filter sized for
+    # this many live entries, LRU of looked-up entries, and how often each
+    # process picks up other processes' revocations / prunes expired ones
+    REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+    REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.01"))
+    REVOCATION_LRU_SIZE = int(os.getenv("REVOCATION_LRU_SIZE", "10000"))
+    REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "2"))
+    REVOCATION_PRUNE_SECONDS = float(os.getenv("REVOCATION_PRUNE_SECONDS", "3600"))
 
     EMAIL_ENC_KEY = os.getenv("EMAIL_ENC_KEY")
+    # comma-separated retired keys, still accepted for decryption
+    EMAIL_ENC_OLD_KEYS = os.getenv("EMAIL_ENC_OLD_KEYS", "")
+
+    # "thread", "process" or "inline" (hash on the request thread)
+    PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "16"))
+    PASSWORD_HASH_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_HASH_TIMEOUT_SECONDS", "10"))
+    PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+    PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "12"))
+
+    # memory:// (per process) or sqlite:///path.db shared by all workers on a host
+    SHARED_STORE_URL = os.getenv("SHARED_STORE_URL", "memory://")
+
+    # reverse proxies in front of the app (load balancer, nginx) whose
+    # X-Forwarded-For/-Proto/-Host are trusted; 0 = clients connect directly.
+    # The login limiter and sticky replica reads key on the address they report
+    PROXY_FIX_HOPS = int(os.getenv("PROXY_FIX_HOPS", "0"))
+
+    LOGIN_RATE_LIMIT_ENABLED = os.getenv("LOGIN_RATE_LIMIT_ENABLED", "true").lower() == "true"
+    LOGIN_RATE_LIMIT_PER_EMAIL = os.getenv("LOGIN_RATE_LIMIT_PER_EMAIL", "10/60")
+    # only a ceiling on one address cycling through many accounts: a whole
+    # cohort behind one campus NAT logs in at exam start (twice each, the
+    # first login always fails)
+    LOGIN_RATE_LIMIT_PER_IP = os.getenv("LOGIN_RATE_LIMIT_PER_IP", "1000/60")
+
+    PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+    PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "60"))
+    # also keep profiles in SHARED_STORE_URL so workers share hits
+    PROFILE_CACHE_SHARED = os.getenv("PROFILE_CACHE_SHARED", "false").lower() == "true"
+
+    QUESTION_BANK_TTL_SECONDS = float(os.getenv("QUESTION_BANK_TTL_SECONDS", "300"))
+    EXAM_QUESTION_COUNT = int(os.getenv("EXAM_QUESTION_COUNT", "10"))
+    # fixed paper mix as "topic/difficulty:count,...", "*" matching anything,
+    # e.g. "*/1:3,*/2:4,*/3:3"; overrides EXAM_QUESTION_COUNT when set
+    EXAM_PAPER_MIX = os.getenv("EXAM_PAPER_MIX", "")
+    # papers kept ready by the background generator (0 draws on every request)
+    PAPER_POOL_SIZE = int(os.getenv("PAPER_POOL_SIZE", "200"))
+    PAPER_POOL_LOW_WATER = int(os.getenv("PAPER_POOL_LOW_WATER", "50"))
+
+    # "auto" uses orjson for JSON responses when it is installed, "default"
+    # keeps Flask's json module
+    JSON_PROVIDER = os.getenv("JSON_PROVIDER", "auto")
+
+    # gzip (plus brotli when installed, with "auto") for responses of at
+    # least COMPRESS_MIN_SIZE bytes
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+    COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+    COMPRESS_BROTLI = os.getenv("COMPRESS_BROTLI", "auto")
+    COMPRESS_CACHE_SIZE = int(os.getenv("COMPRESS_CACHE_SIZE", "2048"))
+
+    # server-side deadline; late submits are rejected and abandoned sessions
+    # are auto-submitted with their stored answers
+    EXAM_DURATION_SECONDS = int(os.getenv("EXAM_DURATION_SECONDS", "1800"))
+    EXAM_GRACE_SECONDS = int(os.getenv("EXAM_GRACE_SECONDS", "30"))
+    EXAM_EXPIRY_ENABLED = os.getenv("EXAM_EXPIRY_ENABLED", "true").lower() == "true"
+    EXAM_EXPIRY_BATCH_SIZE = int(os.getenv("EXAM_EXPIRY_BATCH_SIZE", "500"))
+
+    # "rows" keeps one answers row per answer; "packed" keeps each session's
+    # answers as one packed record on exam_sessions (see flask exam pack-answers)
+    ANSWER_STORAGE = os.getenv("ANSWER_STORAGE", "rows")
+
+    # "sync" grades on the request thread; "async" stores the sheet, returns 202
+    # and grades in batches on background workers
+    EXAM_SUBMIT_MODE = os.getenv("EXAM_SUBMIT_MODE", "sync")
+    EXAM_SUBMIT_LONG_POLL_MAX_SECONDS = float(os.getenv("EXAM_SUBMIT_LONG_POLL_MAX_SECONDS", "25"))
+    GRADING_WORKERS = int(os.getenv("GRADING_WORKERS", "2"))
+    GRADING_BATCH_SIZE = int(os.getenv("GRADING_BATCH_SIZE", "200"))
+    GRADING_POLL_SECONDS = float(os.getenv("GRADING_POLL_SECONDS", "1"))
+    GRADING_CLAIM_TIMEOUT_SECONDS = float(os.getenv("GRADING_CLAIM_TIMEOUT_SECONDS", "60"))
+
+    # /api/exam/answer buffers autosaves and upserts them in batches
+    AUTOSAVE_FLUSH_SIZE = int(os.getenv("AUTOSAVE_FLUSH_SIZE", "500"))
+    AUTOSAVE_FLUSH_SECONDS = float(os.getenv("AUTOSAVE_FLUSH_SECONDS", "2"))
+
+    # graded exams update question_stats / user_score_stats through an
+    # in-memory buffer written out this often
+    AGGREGATES_FLUSH_SECONDS = float(os.getenv("AGGREGATES_FLUSH_SECONDS", "5"))
+
+    # `flask exam archive` moves submitted sessions older than this out of
+    # the hot tables
+    EXAM_ARCHIVE_AFTER_DAYS = int(os.getenv("EXAM_ARCHIVE_AFTER_DAYS", "180"))
+
+    # dump collapsed stacks for requests slower than this (0 disables profiling)
+    PROFILE_SLOW_REQUEST_MS = int(os.getenv("PROFILE_SLOW_REQUEST_MS", "0"))
+    PROFILE_SAMPLE_INTERVAL_MS = int(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+    PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR")
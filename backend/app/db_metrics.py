@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.pool import QueuePool
+
+from .metrics import metrics
+
+
+class PoolMetrics:
+    """Checkout wait and hold times for the engine's connection pool."""
+
+    def __init__(self, window: int = 2048):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)
+        self._holds = deque(maxlen=window)
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.invalidations = 0
+        self.wait_max = 0.0
+        self.hold_max = 0.0
+
+    def init_app(self, app):
+        # must run before db.init_app so the engine is built with the timed pool
+        options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+        if "pool_size" in options:
+            options.setdefault("poolclass", InstrumentedQueuePool)
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+        app.extensions["pool_metrics"] = self
+        metrics.gauge("db_pool_checkouts", "Connections handed out by the pool.", lambda: {(): self.checkouts})
+        metrics.gauge("db_pool_timeouts", "Checkouts that timed out waiting for a connection.", lambda: {(): self.timeouts})
+        metrics.gauge("db_pool_wait_max_seconds", "Longest checkout wait seen.", lambda: {(): self.wait_max})
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self._waits.append(seconds)
+            self.wait_max = max(self.wait_max, seconds)
+
+    def record_hold(self, seconds):
+        with self._lock:
+            self._holds.append(seconds)
+            self.hold_max = max(self.hold_max, seconds)
+
+    def stats(self, pool=None) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            holds = list(self._holds)
+            out = {
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "timeouts": self.timeouts,
+                "invalidations": self.invalidations,
+                "wait_ms": {
+                    "p50": _ms(waits[len(waits) // 2]) if waits else 0.0,
+                    "p95": _ms(waits[int(len(waits) * 0.95) - 1]) if waits else 0.0,
+                    "max": _ms(self.wait_max),
+                },
+                "hold_ms": {
+                    "mean": _ms(sum(holds) / len(holds)) if holds else 0.0,
+                    "max": _ms(self.hold_max),
+                },
+            }
+        if isinstance(pool, QueuePool):
+            out.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+        return out
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long callers wait for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            with pool_metrics._lock:
+                pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - started)
+
+
+@event.listens_for(InstrumentedQueuePool, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    with pool_metrics._lock:
+        pool_metrics.connects += 1
+
+
+@event.listens_for(InstrumentedQueuePool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info["checked_out_at"] = time.perf_counter()
+    with pool_metrics._lock:
+        pool_metrics.checkouts += 1
+
+
+@event.listens_for(InstrumentedQueuePool, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    started = connection_record.info.pop("checked_out_at", None)
+    if started is not None:
+        pool_metrics.record_hold(time.perf_counter() - started)
+
+
+@event.listens_for(InstrumentedQueuePool, "invalidate")
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    with pool_metrics._lock:
+        pool_metrics.invalidations += 1
@@ -0,0 +1,218 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import exists, select, update
+
+from .autosave import answer_buffer
+from .cli import exam_cli
+from .extensions import db
+from .grading import InvalidSubmission, grade_sessions
+from .metrics import metrics
+from .models import ExamSession, ExamSubmission
+
+log = logging.getLogger(__name__)
+
+
+class ExpiryScheduler:
+    """Server-side exam deadlines.
+
+    ``start_exam`` stores the deadline on the session and pushes it onto an
+    in-memory min-heap; a background thread sleeps until the earliest
+    deadline (plus the grace period) and auto-submits every due session in
+    one batch, grading whatever answers were stored or autosaved. Submitted
+    sessions are dropped from the ``_deadlines`` map and their heap entries
+    skipped lazily. On startup the heap is rebuilt from the partial index on
+    open sessions. Finalizing is idempotent, so several processes may race
+    on the same deadlines without harm; a batch that fails to grade goes
+    back on the heap, its buffered answers back into the autosave buffer.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.duration = timedelta(minutes=30)
+        self.grace = timedelta(seconds=30)
+        self.batch_size = 500
+        self.enabled = True
+        self._heap = []  # (deadline, session_id), may hold stale entries
+        self._deadlines = {}  # session_id -> deadline of still-open sessions
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._pid = None
+        self.expired = 0
+
+    def init_app(self, app):
+        cfg = app.config
+        self.app = app
+        self.duration = timedelta(seconds=float(cfg.get("EXAM_DURATION_SECONDS", 1800)))
+        self.grace = timedelta(seconds=float(cfg.get("EXAM_GRACE_SECONDS", 30)))
+        self.batch_size = int(cfg.get("EXAM_EXPIRY_BATCH_SIZE", self.batch_size))
+        self.enabled = cfg.get("EXAM_EXPIRY_ENABLED", True)
+        app.extensions["exam_expiry"] = self
+        if self.enabled:
+            app.before_request(self.ensure_started)
+        metrics.gauge("exam_sessions_open", "Open exam sessions with a pending deadline in this process.",
+                      lambda: {(): len(self._deadlines)})
+        metrics.gauge("exam_sessions_expired", "Sessions auto-submitted at their deadline by this process.",
+                      lambda: {(): self.expired})
+
+    # -- request side -------------------------------------------------------
+
+    def deadline_for(self, started_at: datetime) -> datetime:
+        return started_at + self.duration
+
+    def schedule(self, session_id, deadline: datetime):
+        with self._lock:
+            self._deadlines[session_id] = deadline
+            heapq.heappush(self._heap, (deadline, session_id))
+            if self._heap[0][1] == session_id:
+                self._wakeup.notify()
+
+    def discard(self, session_id):
+        with self._lock:
+            self._deadlines.pop(session_id, None)
+
+    def is_late(self, session_id, deadline: datetime = None) -> bool:
+        """True once the deadline plus grace has passed. Uses the in-memory
+        map, falling back to ``deadline`` (the session's expires_at) when the
+        session is not scheduled in this process."""
+        deadline = self._deadlines.get(session_id, deadline)
+        return deadline is not None and datetime.utcnow() > deadline + self.grace
+
+    # -- scheduler side -----------------------------------------------------
+
+    def ensure_started(self):
+        # the scheduler thread does not survive a fork
+        if self._pid == os.getpid() or not self.enabled:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._heap, self._deadlines = [], {}
+            self._thread = threading.Thread(target=self._run, name="exam-expiry", daemon=True)
+            self._thread.start()
+
+    def rebuild(self) -> int:
+        """Load the deadlines of every open session (via the partial index)."""
+        rows = db.session.execute(
+            select(ExamSession.id, ExamSession.expires_at)
+            .where(ExamSession.submitted.is_(False), ExamSession.expires_at.is_not(None))
+        ).all()
+        db.session.rollback()
+        with self._lock:
+            for sid, deadline in rows:
+                self._deadlines.setdefault(sid, deadline)
+            self._heap = [(deadline, sid) for sid, deadline in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        return len(rows)
+
+    def _pop_due(self, now) -> list:
+        due = []
+        cutoff = now - self.grace
+        while self._heap and len(due) < self.batch_size and self._heap[0][0] <= cutoff:
+            deadline, sid = heapq.heappop(self._heap)
+            if self._deadlines.get(sid) == deadline:
+                del self._deadlines[sid]
+                due.append((sid, deadline))
+        return due
+
+    def expire_due(self) -> int:
+        """Auto-submit one batch of sessions past their deadline; returns how
+        many deadlines were taken off the heap."""
+        with self._lock:
+            due = self._pop_due(datetime.utcnow())
+        if due:
+            try:
+                self.finalize([sid for sid, _ in due])
+            except Exception:
+                # back on the heap, so the next pass tries them again
+                for sid, deadline in due:
+                    self.schedule(sid, deadline)
+                raise
+        return len(due)
+
+    def finalize(self, session_ids) -> int:
+        # skip sessions that were submitted meanwhile, or whose sheet is
+        # already queued for asynchronous grading; a rejected sheet left the
+        # session open, so it is graded from its stored answers like any other
+        open_ids = db.session.scalars(
+            select(ExamSession.id).where(
+                ExamSession.id.in_(session_ids),
+                ExamSession.submitted.is_(False),
+                ~exists().where(ExamSubmission.exam_session_id == ExamSession.id,
+                                ExamSubmission.status != "rejected"),
+            )
+        ).all()
+        if not open_ids:
+            db.session.rollback()
+            return 0
+        taken = {sid: answer_buffer.take(sid) for sid in open_ids}
+        try:
+            results = grade_sessions(taken)
+            rejected = [sid for sid, result in results.items() if isinstance(result, InvalidSubmission)]
+            if rejected:
+                # stored answers can only be invalid if the exam changed under
+                # them; sessions another grader got to first are left as they are
+                db.session.execute(
+                    update(ExamSession).where(ExamSession.id.in_(rejected), ExamSession.submitted.is_(False))
+                    .values(submitted=True, end_time=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for sid, answers in taken.items():
+                answer_buffer.restore(sid, answers)
+            raise
+        for sid in open_ids:
+            answer_buffer.sessions.close(sid)
+        self.expired += len(open_ids)
+        return len(open_ids)
+
+    def stats(self) -> dict:
+        return {"open": len(self._deadlines), "expired": self.expired}
+
+    def _run(self):
+        try:
+            with self.app.app_context():
+                log.info("exam expiry: %d open sessions scheduled", self.rebuild())
+        except Exception:
+            log.exception("exam expiry: rebuilding deadlines failed")
+        while True:
+            try:
+                with self.app.app_context():
+                    processed = self.expire_due()
+            except Exception:
+                log.exception("exam expiry batch failed")
+                time.sleep(1)  # the failed deadlines are due again at once
+                processed = 0
+            if processed:
+                continue
+            with self._lock:
+                if self._heap:
+                    wait = (self._heap[0][0] + self.grace - datetime.utcnow()).total_seconds()
+                else:
+                    wait = None
+                if wait is None or wait > 0:
+                    # cap the sleep so wall-clock jumps cannot stall expiry
+                    self._wakeup.wait(min(wait, 60) if wait is not None else 60)
+
+
+exam_expiry = ExpiryScheduler()
+
+
+@exam_cli.command("expire")
+def expire_sessions():
+    """Auto-submit every open session past its deadline, then exit."""
+    started = time.perf_counter()
+    exam_expiry.rebuild()
+    before = exam_expiry.expired
+    while exam_expiry.expire_due():
+        pass
+    click.echo(f"expired {exam_expiry.expired - before} sessions in {time.perf_counter() - started:.2f}s")
@@ -1,9 +1,29 @@
+import time
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 
-db = SQLAlchemy()
+from .routing import RoutingSession
+
+# reads may go to DATABASE_REPLICA_URLS, see app.routing
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 jwt = JWTManager()
 
+
+@jwt.token_in_blocklist_loader
+def _token_revoked(jwt_header, jwt_payload):
+    # Bloom filter + LRU in front of revoked_tokens, see app.revocation
+    from .revocation import token_denylist
+    return token_denylist.is_revoked(jwt_payload)
+
+
+@jwt.additional_claims_loader
+def _issued_at_us(identity):
+    # iat has whole seconds; a revoke-all cutoff needs to tell apart the
+    # tokens issued just before it from a login in the same second after it
+    return {"iat_us": time.time_ns() // 1000}
+
+
 def init_cors(app, origins: list[str]):
     CORS(app, resources={r"/api/*": {"origins": origins}}, supports_credentials=True)
@@ -0,0 +1,229 @@
+from collections import defaultdict
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, insert, select, tuple_, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from .aggregates import Deltas, aggregates
+from .extensions import db
+from .models import Answer, ExamQuestion, ExamSession, Question
+from .packed import pack, unpack
+from .question_bank import question_bank
+
+VALID_OPTIONS = frozenset("ABCD")
+
+
+class InvalidSubmission(ValueError):
+    pass
+
+
+def load_answer_key(question_ids) -> dict:
+    """Correct option per question id, served from the question bank cache.
+
+    Ids the cached snapshot does not know yet (added since it was built) are
+    fetched together in a single query.
+    """
+    cached = question_bank.snapshot().answer_key
+    key = {}
+    missing = []
+    for qid in question_ids:
+        if qid in cached:
+            key[qid] = cached[qid]
+        else:
+            missing.append(qid)
+    if missing:
+        key.update(db.session.execute(
+            select(Question.id, Question.correct_option).where(Question.id.in_(missing))
+        ).all())
+    return key
+
+
+def normalize_answers(answers) -> dict:
+    """Validate the shape of a submitted answer list; returns question id ->
+    chosen option. A repeated question id keeps the last answer given."""
+    if not isinstance(answers, list):
+        raise InvalidSubmission("answers must be a list")
+    chosen_by_question = {}
+    for ans in answers:
+        try:
+            qid = int(ans["question_id"])
+            chosen = ans["chosen_option"]
+        except (KeyError, TypeError, ValueError):
+            raise InvalidSubmission("malformed answer")
+        if chosen not in VALID_OPTIONS:
+            raise InvalidSubmission(f"invalid option for question {qid}")
+        chosen_by_question[qid] = chosen
+    return chosen_by_question
+
+
+def score_answers(chosen_by_question: dict, answer_key: dict) -> int:
+    """Count correct answers; ``answer_key`` only holds the session's own
+    questions, so the same pass rejects answers outside the exam."""
+    score = 0
+    for qid, chosen in chosen_by_question.items():
+        if qid not in answer_key:
+            raise InvalidSubmission(f"question {qid} is not part of this exam")
+        if answer_key[qid] == chosen:
+            score += 1
+    return score
+
+
+def upsert_answers(rows):
+    """Insert answers, overwriting the chosen option of any (session, question)
+    pair that is already stored. One executemany statement for all rows."""
+    dialect = db.engine.dialect.name
+    table = Answer.__table__
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (postgresql.insert if dialect == "postgresql" else sqlite.insert)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["exam_session_id", "question_id"],
+            set_={"chosen_option": stmt.excluded.chosen_option},
+        )
+    elif dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update(chosen_option=stmt.inserted.chosen_option)
+    else:
+        db.session.execute(
+            delete(table).where(
+                tuple_(table.c.exam_session_id, table.c.question_id).in_(
+                    [(r["exam_session_id"], r["question_id"]) for r in rows]
+                )
+            )
+        )
+        stmt = insert(table)
+    db.session.execute(stmt, rows)
+
+
+def packed_storage() -> bool:
+    return current_app.config.get("ANSWER_STORAGE", "rows") == "packed"
+
+
+def load_stored_answers(session_ids) -> dict:
+    """Stored answers per session as question id -> option. In packed mode
+    sessions whose record is still NULL (not migrated yet) are read from
+    the answers table."""
+    stored = defaultdict(dict)
+    legacy = list(session_ids)
+    if packed_storage():
+        legacy = []
+        for sid, ids, codes in db.session.execute(
+            select(ExamSession.id, ExamSession.answer_ids, ExamSession.answer_codes)
+            .where(ExamSession.id.in_(list(session_ids)))
+        ):
+            if ids is None:
+                legacy.append(sid)
+            else:
+                stored[sid] = unpack(ids, codes)
+    if legacy:
+        for sid, qid, chosen in db.session.execute(
+            select(Answer.exam_session_id, Answer.question_id, Answer.chosen_option)
+            .where(Answer.exam_session_id.in_(legacy))
+            .order_by(Answer.id)
+        ):
+            stored[sid][qid] = chosen
+    return stored
+
+
+def save_answers(rows):
+    """Persist answer rows (dicts as for upsert_answers) in the configured
+    storage: an upsert into answers, or a read-modify-write of each
+    session's packed record in one executemany UPDATE."""
+    if not packed_storage():
+        upsert_answers(rows)
+        return
+    changes = defaultdict(dict)
+    for row in rows:
+        changes[row["exam_session_id"]][row["question_id"]] = row["chosen_option"]
+    stored = load_stored_answers(changes)
+    records = []
+    for sid, chosen in changes.items():
+        ids, codes = pack({**stored[sid], **chosen})
+        records.append({"id": sid, "answer_ids": ids, "answer_codes": codes})
+    db.session.execute(update(ExamSession), records)
+
+
+def lock_open_sessions(session_ids) -> dict:
+    """Lock the still-open sessions among ``session_ids`` until the current
+    transaction ends; returns their id -> user id. A concurrent grader
+    waits for the lock and then finds them submitted, so every exam is
+    graded (and counted) once."""
+    stmt = select(ExamSession.id, ExamSession.user_id).where(
+        ExamSession.id.in_(list(session_ids)), ExamSession.submitted.is_(False)
+    )
+    if db.engine.dialect.name == "sqlite":
+        # no row locks: a no-op write takes the database write lock before
+        # the read, so no other connection can submit them until we commit
+        db.session.execute(
+            update(ExamSession).where(ExamSession.id.in_(list(session_ids)), ExamSession.submitted.is_(False))
+            .values(submitted=False).execution_options(synchronize_session=False)
+        )
+    else:
+        stmt = stmt.order_by(ExamSession.id).with_for_update()
+    return dict(db.session.execute(stmt).all())
+
+
+def grade_sessions(submissions: dict) -> dict:
+    """Grade and persist a batch of submissions in the current transaction.
+
+    ``submissions`` maps exam session id to its list of answers; they are
+    merged over whatever is already stored for the session (autosaved
+    answers), later answers winning. Every session's questions and stored
+    answers are loaded with one query each, changed answers go out in one
+    upsert and all scores in one executemany UPDATE, whatever the batch size.
+    With ANSWER_STORAGE=packed the merged answers are written as packed
+    records in that same UPDATE instead. The question and score counters
+    of the graded sessions are handed to the aggregates buffer, which picks
+    them up when the transaction commits. Sessions that are no longer open
+    once locked (see lock_open_sessions) are left alone.
+    Returns session id -> score, or the InvalidSubmission raised for a
+    rejected payload or a session already submitted (nothing is written
+    for those).
+    """
+    owners = lock_open_sessions(submissions)
+    questions = defaultdict(list)
+    for sid, qid in db.session.execute(
+        select(ExamQuestion.exam_session_id, ExamQuestion.question_id)
+        .where(ExamQuestion.exam_session_id.in_(list(owners)))
+    ):
+        questions[sid].append(qid)
+    stored = load_stored_answers(owners)
+    packed = packed_storage()
+    key = load_answer_key({qid for qids in questions.values() for qid in qids})
+
+    finished_at = datetime.utcnow()
+    results = {}
+    answer_rows = []
+    score_rows = []
+    deltas = Deltas()
+    for sid, answers in submissions.items():
+        if sid not in owners:
+            results[sid] = InvalidSubmission("exam already submitted")
+            continue
+        session_key = {qid: key[qid] for qid in questions[sid] if qid in key}
+        try:
+            chosen = normalize_answers(answers)
+            merged = {**stored[sid], **chosen}
+            score = score_answers(merged, session_key)
+        except InvalidSubmission as e:
+            results[sid] = e
+            continue
+        results[sid] = score
+        row = {"id": sid, "score": score, "submitted": True, "end_time": finished_at}
+        if packed:
+            row["answer_ids"], row["answer_codes"] = pack(merged)
+        else:
+            answer_rows.extend(
+                {"exam_session_id": sid, "question_id": qid, "chosen_option": option}
+                for qid, option in chosen.items()
+                if stored[sid].get(qid) != option
+            )
+        score_rows.append(row)
+        deltas.add_exam(owners[sid], sid, score, finished_at, questions[sid], merged, session_key)
+
+    if answer_rows:
+        upsert_answers(answer_rows)
+    if score_rows:
+        db.session.execute(update(ExamSession), score_rows)
+    aggregates.record(db.session, deltas)
+    return results
@@ -0,0 +1,200 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import delete, select, update
+
+from .autosave import answer_buffer
+from .cli import exam_cli
+from .expiry import exam_expiry
+from .extensions import db
+from .grading import InvalidSubmission, grade_sessions
+from .metrics import metrics
+from .models import ExamSession, ExamSubmission
+
+log = logging.getLogger(__name__)
+
+
+class GradingQueue:
+    """Durable submission queue backed by the exam_submissions table.
+
+    The request thread only stores the answer sheet and returns a ticket.
+    Worker threads claim queued rows in batches (a conditional UPDATE, so
+    several workers or processes never grade the same row), grade the whole
+    batch with bulk writes and mark the tickets done. The table doubles as the
+    broker: ``flask exam grade-worker`` drains it from a separate process,
+    and rows left claimed by a crashed worker are reclaimed after a timeout.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.workers = 2
+        self.batch_size = 200
+        self.poll_interval = 1.0
+        self.claim_timeout = 60.0
+        self._wakeup = threading.Condition()
+        self._done = threading.Condition()
+        self._threads = []
+        self._pid = None
+        self.graded = 0
+        self.rejected = 0
+        self.batches = 0
+
+    def init_app(self, app):
+        cfg = app.config
+        self.app = app
+        self.workers = int(cfg.get("GRADING_WORKERS", self.workers))
+        self.batch_size = int(cfg.get("GRADING_BATCH_SIZE", self.batch_size))
+        self.poll_interval = float(cfg.get("GRADING_POLL_SECONDS", self.poll_interval))
+        self.claim_timeout = float(cfg.get("GRADING_CLAIM_TIMEOUT_SECONDS", self.claim_timeout))
+        app.extensions["grading_queue"] = self
+        metrics.gauge("grading_submissions", "Submissions processed by this process's grading workers.",
+                      lambda: {(("result", "graded"),): self.graded, (("result", "rejected"),): self.rejected})
+
+    # -- request side -------------------------------------------------------
+
+    def enqueue(self, session, answers) -> ExamSubmission:
+        # a rejected sheet does not count as submitted: a corrected one replaces it
+        db.session.execute(
+            delete(ExamSubmission)
+            .where(ExamSubmission.exam_session_id == session.id, ExamSubmission.status == "rejected")
+            .execution_options(synchronize_session=False)
+        )
+        submission = ExamSubmission(exam_session_id=session.id, user_id=session.user_id, answers=answers)
+        db.session.add(submission)
+        db.session.commit()
+        self.ensure_workers()
+        with self._wakeup:
+            self._wakeup.notify()
+        return submission
+
+    def wait(self, ticket, timeout: float):
+        """Return the submission once graded, or as it stands after ``timeout``."""
+        deadline = time.monotonic() + timeout
+        while True:
+            submission = db.session.get(ExamSubmission, ticket, populate_existing=True)
+            remaining = deadline - time.monotonic()
+            if submission is None or submission.status in ("graded", "rejected") or remaining <= 0:
+                return submission
+            db.session.rollback()  # release the connection while waiting
+            with self._done:
+                # woken by local workers; the cap covers workers in other processes
+                self._done.wait(min(remaining, self.poll_interval))
+
+    # -- worker side --------------------------------------------------------
+
+    def ensure_workers(self):
+        # worker threads do not survive a fork, so each process starts its own
+        if self._pid == os.getpid() or not self.workers:
+            return
+        with self._wakeup:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._worker_loop, name=f"grading-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for t in self._threads:
+                t.start()
+
+    def _worker_loop(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    processed = self.process_batch()
+            except Exception:
+                log.exception("grading batch failed")
+                processed = 0
+            if not processed:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+
+    def _claim(self):
+        token = uuid.uuid4().hex
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.claim_timeout)
+        candidates = select(ExamSubmission.id).where(
+            (ExamSubmission.status == "queued")
+            | ((ExamSubmission.status == "grading") & (ExamSubmission.claimed_at < stale))
+        ).order_by(ExamSubmission.id).limit(self.batch_size)
+        ids = db.session.scalars(candidates).all()
+        if not ids:
+            db.session.rollback()
+            return []
+        db.session.execute(
+            update(ExamSubmission)
+            .where(ExamSubmission.id.in_(ids), ExamSubmission.status.in_(("queued", "grading")),
+                   (ExamSubmission.claim_token.is_(None)) | (ExamSubmission.claimed_at < stale))
+            .values(status="grading", claim_token=token, claimed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return db.session.scalars(select(ExamSubmission).where(ExamSubmission.claim_token == token)).all()
+
+    def process_batch(self) -> int:
+        """Claim, grade and persist one batch; returns how many were processed."""
+        claimed = self._claim()
+        if not claimed:
+            return 0
+
+        results = grade_sessions({s.exam_session_id: s.answers for s in claimed})
+        now = datetime.utcnow()
+        rows = []
+        for s in claimed:
+            result = results[s.exam_session_id]
+            if isinstance(result, InvalidSubmission):
+                rows.append({"id": s.id, "status": "rejected", "error": str(result)[:255], "graded_at": now})
+                self.rejected += 1
+            else:
+                rows.append({"id": s.id, "status": "graded", "score": result, "graded_at": now})
+                self.graded += 1
+        db.session.execute(update(ExamSubmission), rows)
+        rejected = [s.exam_session_id for s in claimed if isinstance(results[s.exam_session_id], InvalidSubmission)]
+        deadlines = db.session.execute(
+            select(ExamSession.id, ExamSession.expires_at)
+            .where(ExamSession.id.in_(rejected), ExamSession.expires_at.is_not(None))
+        ).all() if rejected else []
+        db.session.commit()
+        self.batches += 1
+        # the sessions stay open: put their deadlines back so expiry grades
+        # the stored answers if no corrected sheet arrives in time
+        for sid, deadline in deadlines:
+            exam_expiry.schedule(sid, deadline)
+        answer_buffer.drop(s.exam_session_id for s in claimed if s.exam_session_id not in rejected)
+
+        with self._done:
+            self._done.notify_all()
+        return len(claimed)
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._threads) if self._pid == os.getpid() else 0,
+            "batches": self.batches,
+            "graded": self.graded,
+            "rejected": self.rejected,
+        }
+
+
+grading_queue = GradingQueue()
+
+
+@exam_cli.command("grade-worker")
+@click.option("--once", is_flag=True, help="Drain the queue and exit instead of polling forever.")
+def grade_worker(once):
+    """Grade queued exam submissions from this process."""
+    started = time.perf_counter()
+    total = 0
+    while True:
+        processed = grading_queue.process_batch()
+        total += processed
+        if processed:
+            click.echo(f"graded {total} submissions ({total / (time.perf_counter() - started):,.0f}/s)")
+        elif once:
+            break
+        else:
+            time.sleep(grading_queue.poll_interval)
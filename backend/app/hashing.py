@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from flask import jsonify
+
+from .metrics import metrics, record_password_hash
+from .security import hash_password, verify_password
+
+
+class HashingPoolSaturated(Exception):
+    pass
+
+
+class PasswordHasher:
+    """Runs bcrypt off the request thread on a bounded executor.
+
+    ``thread`` relies on the bcrypt backend releasing the GIL, ``process``
+    sidesteps the GIL entirely and ``inline`` keeps the old behaviour. At most
+    ``workers + queue_size`` calls are admitted at once; anything beyond that
+    is rejected immediately with HashingPoolSaturated (a 503 to the client).
+    """
+
+    def __init__(self):
+        self.kind = "thread"
+        self.workers = 4
+        self.queue_size = 16
+        self.timeout = 10.0
+        self.retry_after = 1
+        self.rounds = 12
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def init_app(self, app):
+        self.configure(app.config)
+        app.extensions["password_hasher"] = self
+        app.register_error_handler(HashingPoolSaturated, self._saturated_response)
+        metrics.gauge("password_hash_in_flight", "bcrypt calls queued or running.",
+                      lambda: {(): self.stats()["in_flight"]})
+        metrics.gauge("password_hash_queue_depth", "bcrypt calls waiting for a worker.",
+                      lambda: {(): self.stats()["queue_depth"]})
+        metrics.gauge("password_hash_rejected", "bcrypt calls rejected because the pool was full.",
+                      lambda: {(): self.stats()["rejected"]})
+
+    def configure(self, cfg):
+        self.kind = cfg.get("PASSWORD_HASH_EXECUTOR", self.kind)
+        self.workers = int(cfg.get("PASSWORD_HASH_WORKERS", self.workers))
+        self.queue_size = int(cfg.get("PASSWORD_HASH_QUEUE_SIZE", self.queue_size))
+        self.timeout = float(cfg.get("PASSWORD_HASH_TIMEOUT_SECONDS", self.timeout))
+        self.retry_after = int(cfg.get("PASSWORD_HASH_RETRY_AFTER", self.retry_after))
+        self.rounds = int(cfg.get("PASSWORD_HASH_ROUNDS", self.rounds))
+        if self.kind not in ("thread", "process", "inline"):
+            raise ValueError(f"unknown PASSWORD_HASH_EXECUTOR {self.kind!r}")
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._executor = None
+
+    def _saturated_response(self, e):
+        resp = jsonify({"error": "server busy, retry shortly"})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = str(self.retry_after)
+        return resp
+
+    def _get_executor(self):
+        # executors do not survive a fork, so pre-fork workers build their own
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    if self.kind == "process":
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.workers,
+                            mp_context=multiprocessing.get_context("spawn"),
+                        )
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.workers, thread_name_prefix="bcrypt"
+                        )
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+        self._slots.release()
+
+    def _timed(self, op, fn, *args):
+        started = time.perf_counter()
+        try:
+            return self._run(fn, *args)
+        finally:
+            record_password_hash(op, time.perf_counter() - started)
+
+    def _run(self, fn, *args):
+        if self.kind == "inline":
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingPoolSaturated()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HashingPoolSaturated()
+
+    def hash(self, plain: str) -> str:
+        return self._timed("hash", hash_password, plain, self.rounds)
+
+    def verify(self, plain: str, hashed: str) -> bool:
+        return self._timed("verify", verify_password, plain, hashed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = self._in_flight
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "queue_capacity": self.queue_size,
+                "in_flight": in_flight,
+                "queue_depth": max(0, in_flight - self.workers),
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+
+password_hasher = PasswordHasher()
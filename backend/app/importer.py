@@ -0,0 +1,232 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+from datetime import datetime
+from itertools import islice
+
+import click
+from sqlalchemy import insert, select, update
+
+from .cli import questions_cli
+from .extensions import db
+from .models import Question
+
+OPTION_FIELDS = ("option_a", "option_b", "option_c", "option_d")
+COLUMNS = ("question_text", *OPTION_FIELDS, "correct_option", "topic", "difficulty", "content_hash", "created_at",
+           "updated_at")
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def content_hash(text: str, options) -> str:
+    """Identity of a question for deduplication: whitespace-normalized text
+    and options, so re-imports and reformatted copies collapse."""
+    digest = hashlib.sha256()
+    for part in (text, *options):
+        digest.update(" ".join(part.split()).encode())
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+def _limit(column):
+    return Question.__table__.c[column].type.length
+
+
+def read_records(fh, fmt):
+    """Yield ``(line number, record dict)`` from a CSV or JSONL stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(fh)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for lineno, line in enumerate(fh, 1):
+        if line.strip():
+            try:
+                yield lineno, json.loads(line)
+            except ValueError as e:
+                yield lineno, InvalidRow(f"bad JSON: {e}")
+
+
+def validate(record) -> dict:
+    """Turn an input record into a ``questions`` row, enforcing the model's
+    column limits. Accepts ``text`` for question_text and, in JSONL, an
+    ``options`` object keyed A-D."""
+    if isinstance(record, InvalidRow):
+        raise record
+    if not isinstance(record, dict):
+        raise InvalidRow("record is not an object")
+    text = (record.get("question_text") or record.get("text") or "").strip()
+    if not text:
+        raise InvalidRow("question_text is empty")
+    nested = record.get("options") if isinstance(record.get("options"), dict) else {}
+    options = []
+    for field, letter in zip(OPTION_FIELDS, "ABCD"):
+        value = str(record.get(field) or nested.get(letter) or "").strip()
+        if not value:
+            raise InvalidRow(f"{field} is empty")
+        if len(value) > _limit(field):
+            raise InvalidRow(f"{field} is longer than {_limit(field)} characters")
+        options.append(value)
+    correct = str(record.get("correct_option") or "").strip().upper()
+    if correct not in ("A", "B", "C", "D"):
+        raise InvalidRow(f"correct_option must be A, B, C or D, got {correct!r}")
+    topic = str(record.get("topic") or "").strip() or None
+    if topic and len(topic) > _limit("topic"):
+        raise InvalidRow(f"topic is longer than {_limit('topic')} characters")
+    difficulty = record.get("difficulty")
+    if difficulty in (None, ""):
+        difficulty = None
+    else:
+        try:
+            difficulty = int(difficulty)
+        except (TypeError, ValueError):
+            difficulty = 0
+        if difficulty not in (1, 2, 3):
+            raise InvalidRow("difficulty must be 1, 2 or 3")
+    return {
+        "question_text": text,
+        **dict(zip(OPTION_FIELDS, options)),
+        "correct_option": correct,
+        "topic": topic,
+        "difficulty": difficulty,
+        "content_hash": content_hash(text, options),
+    }
+
+
+def _copy(rows):
+    # COPY ... FROM STDIN streams the whole chunk in one round trip
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(["" if row[c] is None else row[c] for c in COLUMNS])
+    buf.seek(0)
+    cursor = db.session.connection().connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY questions ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cursor.close()
+
+
+def insert_chunk(rows) -> int:
+    """Insert the rows whose content hash is not stored yet; returns how many."""
+    fresh = {}
+    for row in rows:
+        fresh.setdefault(row["content_hash"], row)
+    existing = db.session.scalars(select(Question.content_hash).where(Question.content_hash.in_(list(fresh))))
+    for digest in existing:
+        fresh.pop(digest, None)
+    if not fresh:
+        return 0
+    now = datetime.utcnow()
+    rows = [{**row, "created_at": now, "updated_at": now} for row in fresh.values()]
+    if db.engine.dialect.name == "postgresql":
+        _copy(rows)
+    else:
+        db.session.execute(insert(Question), rows)
+    return len(rows)
+
+
+def backfill_hashes(chunk_size: int) -> int:
+    """Hash questions stored before content_hash existed, in keyset chunks."""
+    done = 0
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            select(Question.id, Question.question_text, *(getattr(Question, f) for f in OPTION_FIELDS))
+            .where(Question.id > last_id, Question.content_hash.is_(None))
+            .order_by(Question.id).limit(chunk_size)
+        ).all()
+        if not batch:
+            return done
+        db.session.execute(update(Question), [
+            {"id": qid, "content_hash": content_hash(text, options)} for qid, text, *options in batch
+        ])
+        db.session.commit()
+        done += len(batch)
+        last_id = batch[-1][0]
+
+
+class Checkpoint:
+    """Records processed per input file, kept next to it so an interrupted
+    import resumes after the last committed chunk."""
+
+    def __init__(self, path):
+        self.path = path + ".import-state"
+        stat = os.stat(path)
+        self.identity = {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def load(self) -> int:
+        try:
+            with open(self.path) as fh:
+                state = json.load(fh)
+        except (OSError, ValueError):
+            return 0
+        return state["records"] if state.get("file") == self.identity else 0
+
+    def save(self, records: int):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump({"file": self.identity, "records": records}, fh)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+@questions_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default=None,
+              help="Input format; inferred from the file extension by default.")
+@click.option("--chunk-size", type=int, default=5000, show_default=True, help="Rows per INSERT/COPY and commit.")
+@click.option("--resume/--restart", default=True, show_default=True,
+              help="Skip records already committed by an interrupted run of the same file.")
+@click.option("--show-errors", type=int, default=20, show_default=True, help="Rejected rows to print.")
+def import_questions(path, fmt, chunk_size, resume, show_errors):
+    """Stream questions from a CSV or JSONL file into the questions table.
+
+    Rows are validated, deduplicated by content hash (against the table and
+    within the file) and inserted in chunks with COPY on PostgreSQL or a
+    batched executemany elsewhere. Memory stays flat however big the file is.
+    """
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    checkpoint = Checkpoint(path)
+    skip = checkpoint.load() if resume else 0
+
+    hashed = backfill_hashes(chunk_size)
+    if hashed:
+        click.echo(f"hashed {hashed:,} existing questions")
+    if skip:
+        click.echo(f"resuming after {skip:,} records")
+
+    started = time.perf_counter()
+    read = inserted = rejected = 0
+    with open(path, newline="", encoding="utf-8") as fh:
+        records = islice(read_records(fh, fmt), skip, None)
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            rows = []
+            for lineno, record in chunk:
+                try:
+                    rows.append(validate(record))
+                except InvalidRow as e:
+                    rejected += 1
+                    if rejected <= show_errors:
+                        click.echo(f"line {lineno}: {e}", err=True)
+            inserted += insert_chunk(rows) if rows else 0
+            db.session.commit()
+            read += len(chunk)
+            checkpoint.save(skip + read)
+            elapsed = time.perf_counter() - started
+            click.echo(f"{skip + read:,} records: {inserted:,} inserted, {read - inserted - rejected:,} duplicates,"
+                       f" {rejected:,} rejected ({read / elapsed:,.0f} rows/s)")
+
+    checkpoint.clear()
+    click.echo(f"done: {inserted:,} questions imported in {time.perf_counter() - started:.1f}s")
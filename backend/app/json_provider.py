@@ -0,0 +1,45 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    Output matches the default provider (sorted keys, HTTP dates for
+    datetimes, the same ``default`` hook for other types) except that
+    non-ASCII text is emitted as UTF-8 instead of escapes. Calls that pass
+    json.dumps keyword arguments fall back to the default implementation.
+    """
+
+    def _options(self, indent=False):
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        return option | orjson.OPT_INDENT_2 if indent else option
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = not (self.compact or (self.compact is None and not self._app.debug))
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json(app):
+    """Install the orjson provider when JSON_PROVIDER allows it and orjson is importable."""
+    choice = app.config.get("JSON_PROVIDER", "auto")
+    if choice == "orjson" and orjson is None:
+        raise RuntimeError("JSON_PROVIDER=orjson but orjson is not installed")
+    if choice in ("auto", "orjson") and orjson is not None:
+        app.json = OrjsonProvider(app)
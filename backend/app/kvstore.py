@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryStore:
+    """Per-process key/value store with TTLs and a bounded LRU key set.
+
+    Every write also drops a few expired keys from the cold end, so idle keys
+    are evicted without a background sweeper.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return item
+
+    def _evict(self, now):
+        for _ in range(2):
+            if not self._data:
+                break
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            del self._data[key]
+        while len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key, time.time())
+            return item[1] if item else None
+
+    def set(self, key, value, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._data[key] = (now + ttl, value)
+            self._data.move_to_end(key)
+            self._evict(now)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, ttl: float) -> int:
+        """Increment a counter, starting it at 1 with ``ttl`` if absent."""
+        now = time.time()
+        with self._lock:
+            item = self._live(key, now)
+            if item is None:
+                self._data[key] = (now + ttl, 1)
+                self._evict(now)
+                return 1
+            self._data[key] = (item[0], item[1] + 1)
+            return item[1] + 1
+
+
+class SQLiteStore:
+    """Key/value store in a local SQLite file, shared by every worker process
+    on the host. A stand-in for a networked cache when running several workers.
+    """
+
+    _PURGE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB, expires_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _after_write(self, now):
+        self._writes += 1
+        if self._writes % self._PURGE_EVERY == 0:
+            self._conn().execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl: float):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, value, now + ttl)
+        )
+        self._after_write(now)
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key, ttl: float) -> int:
+        now = time.time()
+        (value,) = self._conn().execute(
+            """
+            INSERT INTO kv (key, value, expires_at) VALUES (?, 1, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                value = CASE WHEN kv.expires_at <= ? THEN 1 ELSE kv.value + 1 END,
+                expires_at = CASE WHEN kv.expires_at <= ? THEN excluded.expires_at ELSE kv.expires_at END
+            RETURNING value
+            """,
+            (key, now + ttl, now, now),
+        ).fetchone()
+        self._after_write(now)
+        return value
+
+
+def make_store(url: str):
+    """Build a store from ``memory://`` or ``sqlite:///path/to/file.db``."""
+    if not url or url.startswith("memory://"):
+        return MemoryStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    raise ValueError(f"unsupported SHARED_STORE_URL {url!r}")
+
+
+def init_store(app):
+    app.extensions["shared_store"] = make_store(app.config.get("SHARED_STORE_URL", "memory://"))
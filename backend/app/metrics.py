@@ -0,0 +1,189 @@
+import bisect
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class MetricsRegistry:
+    """Counters and histograms with one shard per thread.
+
+    Writers only touch their own thread's dict, so the hot path takes no
+    lock; a scrape copies every shard and sums them, folding shards of
+    finished threads into one retired shard. Gauges are callbacks evaluated
+    at scrape time.
+    """
+
+    def __init__(self):
+        self._meta = {}  # name -> (kind, help, buckets)
+        self._gauges = {}  # name -> (help, fn returning {labels: value})
+        self._local = threading.local()
+        self._shards = []  # (thread, shard)
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text):
+        self._meta[name] = ("counter", help_text, None)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self._meta[name] = ("histogram", help_text, tuple(buckets))
+
+    def gauge(self, name, help_text, fn):
+        self._gauges[name] = (help_text, fn)
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def inc(self, name, labels=(), amount=1.0):
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0.0) + amount
+
+    def observe(self, name, value, labels=()):
+        shard = self._shard()
+        key = (name, labels)
+        hist = shard.get(key)
+        if hist is None:
+            hist = shard[key] = [[0] * (len(self._meta[name][2]) + 1), 0.0, 0]
+        hist[0][bisect.bisect_left(self._meta[name][2], value)] += 1
+        hist[1] += value
+        hist[2] += 1
+
+    @staticmethod
+    def _merge_into(merged, shard):
+        for key, value in shard.copy().items():
+            if isinstance(value, list):
+                buckets, total, count = merged.get(key) or [[0] * len(value[0]), 0.0, 0]
+                merged[key] = [[a + b for a, b in zip(buckets, value[0])], total + value[1], count + value[2]]
+            else:
+                merged[key] = merged.get(key, 0.0) + value
+
+    def collect(self) -> dict:
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    self._merge_into(self._retired, shard)
+            self._shards = live
+            merged = {}
+            self._merge_into(merged, self._retired)
+        for _, shard in live:
+            self._merge_into(merged, shard)
+        return merged
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        merged = self.collect()
+        by_name = {}
+        for (name, labels), value in merged.items():
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, (kind, help_text, buckets) in self._meta.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(by_name.get(name, ())):
+                if kind == "counter":
+                    lines.append(f"{name}{_labels(labels)} {_num(value)}")
+                    continue
+                counts, total, count = value
+                running = 0
+                for bound, n in zip((*buckets, "+Inf"), counts):
+                    running += n
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _num(bound)),))} {running}")
+                lines.append(f"{name}_sum{_labels(labels)} {_num(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        for name, (help_text, fn) in self._gauges.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(fn().items()):
+                lines.append(f"{name}{_labels(labels)} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + inner + "}"
+
+
+def _num(value):
+    if isinstance(value, str):
+        return value
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+metrics = MetricsRegistry()
+metrics.counter("http_requests_total", "Requests by endpoint, method and status.")
+metrics.histogram("http_request_duration_seconds", "Request latency by endpoint.")
+metrics.histogram("http_response_size_bytes", "Response body size by endpoint.", SIZE_BUCKETS)
+metrics.histogram("db_statements_per_request", "SQL statements executed per request.", COUNT_BUCKETS)
+metrics.counter("db_statements_total", "SQL statements executed, by endpoint.")
+metrics.counter("db_time_seconds_total", "Time spent in SQL statements, by endpoint.")
+metrics.histogram("password_hash_duration_seconds", "bcrypt hash/verify time including queueing.")
+
+
+def _endpoint():
+    return request.endpoint or "unmatched"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g._sql_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        started = g.pop("_sql_started", None)
+        g._sql_count = g.get("_sql_count", 0) + 1
+        if started is not None:
+            g._sql_time = g.get("_sql_time", 0.0) + time.perf_counter() - started
+
+
+def record_password_hash(op, seconds):
+    metrics.observe("password_hash_duration_seconds", seconds, (("op", op),))
+
+
+def init_metrics(app):
+    @app.before_request
+    def _start_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get("_request_started")
+        if started is None:
+            return response
+        endpoint = _endpoint()
+        labels = (("endpoint", endpoint),)
+        metrics.inc("http_requests_total", labels + (("method", request.method), ("status", response.status_code)))
+        metrics.observe("http_request_duration_seconds", time.perf_counter() - started, labels)
+        if not response.direct_passthrough:
+            metrics.observe("http_response_size_bytes", response.calculate_content_length() or 0, labels)
+        sql_count = g.get("_sql_count", 0)
+        metrics.observe("db_statements_per_request", sql_count, labels)
+        if sql_count:
+            metrics.inc("db_statements_total", labels, sql_count)
+            metrics.inc("db_time_seconds_total", labels, g.get("_sql_time", 0.0))
+        return response
+
+    app.extensions["metrics"] = metrics
@@ -1,20 +1,21 @@
 from datetime import datetime
-from sqlalchemy import Index
+from sqlalchemy import Index, event
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Session, object_session
 from .extensions import db
+from .profiles import profile_cache
 
 class User(db.Model):
     __tablename__ = "users"
     id = db.Column(db.Integer, primary_key=True)
     email_enc = db.Column(db.LargeBinary, nullable=False)
-    email_hash = db.Column(db.String(64), nullable=False, unique=True)
+    email_hash = db.Column(db.String(64), nullable=False, unique=True)  # the unique constraint is its index
     password_hash = db.Column(db.String(255), nullable=False)
     full_name = db.Column(db.String(120), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     first_login_attempted = db.Column(db.Boolean, default=False, nullable=False)
 
-    __table_args__ = (Index("ix_users_email_hash", "email_hash"),)
-
     def to_public(self, email_plain=None):
         return {
             "id": self.id,
@@ -26,6 +27,25 @@ class User(db.Model):
             # "first_login_attempted": self.first_login_attempted  
         }
 
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("users_changed", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_profiles(session):
+    for user_id in session.info.pop("users_changed", ()):
+        profile_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_profile_changes(session):
+    session.info.pop("users_changed", None)
+
 class Question(db.Model):
     __tablename__ = "questions"
     id = db.Column(db.Integer, primary_key=True)
@@ -35,8 +55,16 @@ class Question(db.Model):
     option_c = db.Column(db.String(255), nullable=False)
     option_d = db.Column(db.String(255), nullable=False)
     correct_option = db.Column(db.String(1), nullable=False)  # "A", "B", "C", "D"
+    topic = db.Column(db.String(64), nullable=True)
+    difficulty = db.Column(db.SmallInteger, nullable=True)  # 1 easy, 2 medium, 3 hard
+    # sha256 of the normalized text and options; the importer dedupes on it
+    content_hash = db.Column(db.String(64), nullable=True)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # version of the content; cached payload fragments are keyed on it
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
+
+    __table_args__ = (Index("ix_questions_content_hash", "content_hash"),)
 
 
 class ExamSession(db.Model):
@@ -45,8 +73,23 @@ class ExamSession(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     start_time = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     end_time = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)  # submit deadline, set at start
     submitted = db.Column(db.Boolean, default=False)
     score = db.Column(db.Integer, nullable=True)
+    # ANSWER_STORAGE=packed: question ids as little-endian int32 and one
+    # option code (0-3 for A-D) per answer; NULL means the answers live in
+    # the answers table
+    answer_ids = db.Column(db.LargeBinary, nullable=True)
+    answer_codes = db.Column(db.LargeBinary, nullable=True)
+
+    # only open sessions are indexed: the expiry scheduler's recovery scan
+    # reads this and stays small however many finished sessions pile up
+    __table_args__ = (
+        Index("ix_exam_sessions_open_expires_at", expires_at,
+              postgresql_where=submitted.is_(False), sqlite_where=submitted.is_(False)),
+        # a user's sessions, newest first: history pages seek on (user_id, id)
+        Index("ix_exam_sessions_user_id_id", user_id, id),
+    )
 
     user = db.relationship("User", backref="exam_sessions")
 
@@ -58,6 +101,10 @@ class Answer(db.Model):
     question_id = db.Column(db.Integer, db.ForeignKey("questions.id"), nullable=False)
     chosen_option = db.Column(db.String(1), nullable=False)  # "A", "B", "C", "D"
 
+    # one answer per question; autosave and submit upsert on this pair, and
+    # its index also serves lookups by exam_session_id alone
+    __table_args__ = (db.UniqueConstraint("exam_session_id", "question_id", name="uq_answers_session_question"),)
+
     exam_session = db.relationship("ExamSession", backref="answers")
     question = db.relationship("Question")
 
@@ -67,5 +114,127 @@ class ExamQuestion(db.Model):
     exam_session_id = db.Column(db.Integer, db.ForeignKey("exam_sessions.id"), nullable=False)
     question_id = db.Column(db.Integer, db.ForeignKey("questions.id"), nullable=False)
 
+    # a session's questions in paper order
+    __table_args__ = (Index("ix_exam_questions_session_id_id", "exam_session_id", "id"),)
+
     exam_session = db.relationship("ExamSession", backref="exam_questions")
     question = db.relationship("Question")
+
+
+class ExamSubmission(db.Model):
+    """A submitted answer sheet waiting for (or done with) asynchronous grading."""
+    __tablename__ = "exam_submissions"
+    id = db.Column(db.Integer, primary_key=True)
+    exam_session_id = db.Column(db.Integer, db.ForeignKey("exam_sessions.id"), nullable=False, unique=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    answers = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="queued")  # queued, grading, graded, rejected
+    score = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+    claim_token = db.Column(db.String(32), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    graded_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_exam_submissions_status_id", "status", "id"),)
+
+    def to_public(self):
+        return {
+            "ticket": self.id,
+            "session_id": self.exam_session_id,
+            "status": self.status,
+            "score": self.score,
+            "error": self.error,
+        }
+
+
+class QuestionStats(db.Model):
+    """Running per-question counters, maintained by app.aggregates."""
+    __tablename__ = "question_stats"
+    question_id = db.Column(db.Integer, db.ForeignKey("questions.id"), primary_key=True)
+    graded = db.Column(db.Integer, nullable=False, default=0)  # graded exams that contained the question
+    correct = db.Column(db.Integer, nullable=False, default=0)
+    chosen_a = db.Column(db.Integer, nullable=False, default=0)
+    chosen_b = db.Column(db.Integer, nullable=False, default=0)
+    chosen_c = db.Column(db.Integer, nullable=False, default=0)
+    chosen_d = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_public(self):
+        answered = self.chosen_a + self.chosen_b + self.chosen_c + self.chosen_d
+        return {
+            "question_id": self.question_id,
+            "graded": self.graded,
+            "answered": answered,
+            "percent_correct": round(100 * self.correct / self.graded, 1) if self.graded else None,
+            "chosen": {"A": self.chosen_a, "B": self.chosen_b, "C": self.chosen_c, "D": self.chosen_d},
+        }
+
+
+class UserScoreStats(db.Model):
+    """Running per-user score totals, maintained by app.aggregates."""
+    __tablename__ = "user_score_stats"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    exams = db.Column(db.Integer, nullable=False, default=0)
+    total_score = db.Column(db.Integer, nullable=False, default=0)
+    best_score = db.Column(db.Integer, nullable=False, default=0)
+    last_score = db.Column(db.Integer, nullable=True)
+    last_session_id = db.Column(db.Integer, nullable=True)
+    last_submitted_at = db.Column(db.DateTime, nullable=True)
+
+    def to_public(self):
+        return {
+            "exams": self.exams,
+            "average_score": round(self.total_score / self.exams, 2) if self.exams else None,
+            "best_score": self.best_score if self.exams else None,
+            "last_score": self.last_score,
+            "last_session_id": self.last_session_id,
+            "last_submitted_at": self.last_submitted_at.isoformat() + "Z" if self.last_submitted_at else None,
+        }
+
+
+class ArchiveSegment(db.Model):
+    """One archived chunk of sessions: their papers and answers as
+    compressed columns (see app.archive for the layout)."""
+    __tablename__ = "archive_segments"
+    id = db.Column(db.Integer, primary_key=True)
+    first_session_id = db.Column(db.Integer, nullable=False)
+    last_session_id = db.Column(db.Integer, nullable=False)
+    sessions = db.Column(db.Integer, nullable=False)
+    raw_bytes = db.Column(db.Integer, nullable=False)  # uncompressed column bytes
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ArchivedSession(db.Model):
+    """Summary row of a session moved out of exam_sessions by ``flask exam
+    archive``; history reads seek on (user_id, id) as for hot sessions."""
+    __tablename__ = "archived_sessions"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # the original exam_sessions.id
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    segment_id = db.Column(db.Integer, db.ForeignKey("archive_segments.id"), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+    score = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (Index("ix_archived_sessions_user_id_id", user_id, id),)
+
+
+class RevokedToken(db.Model):
+    """JWT denylist entry (see app/revocation.py): one revoked token by its
+    ``jti``, or, with ``jti`` NULL, every token of ``user_id`` issued up to
+    ``revoked_at``. Kept until ``expires_at``, when the tokens it covers have
+    expired anyway."""
+    __tablename__ = "revoked_tokens"
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), nullable=True, unique=True)  # the unique constraint is its index
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    # microseconds: the revoke-all cutoff (MySQL DATETIME drops them otherwise)
+    revoked_at = db.Column(db.DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql", "mariadb"),
+                           default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_revoked_tokens_user_id_revoked_at", user_id, revoked_at),
+        Index("ix_revoked_tokens_expires_at", expires_at),
+    )
@@ -0,0 +1,105 @@
+import sys
+import time
+from array import array
+
+import click
+import numpy as np
+from sqlalchemy import delete, select, update
+
+from .cli import exam_cli
+from .extensions import db
+from .models import Answer, ExamSession
+
+LETTERS = "ABCD"
+CODES = {letter: code for code, letter in enumerate(LETTERS)}
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def pack(chosen_by_question: dict) -> tuple:
+    """Encode question id -> option as ``(ids, codes)`` blobs, sorted by id."""
+    qids = sorted(chosen_by_question)
+    ids = array("i", qids)
+    if not _LITTLE_ENDIAN:
+        ids.byteswap()
+    return ids.tobytes(), bytes([CODES[chosen_by_question[qid]] for qid in qids])
+
+
+def question_ids(ids_blob):
+    """The id column of a packed record; a zero-copy view on little-endian hosts."""
+    if _LITTLE_ENDIAN:
+        return memoryview(ids_blob).cast("i")
+    ids = array("i", ids_blob)
+    ids.byteswap()
+    return ids
+
+
+def unpack(ids_blob, codes_blob) -> dict:
+    if not ids_blob:
+        return {}
+    return {qid: LETTERS[code] for qid, code in zip(question_ids(ids_blob), codes_blob)}
+
+
+def score_packed(key, records):
+    """Vectorized scores for packed ``(ids, codes)`` records against a dense
+    answer key array (see regrade.load_key_array). The blobs are read in
+    place with np.frombuffer and concatenated once."""
+    lengths = np.fromiter((len(codes) for _, codes in records), dtype=np.int64, count=len(records))
+    if not lengths.sum():
+        return np.zeros(len(records), dtype=np.int64)
+    ids = np.concatenate([np.frombuffer(blob, dtype="<i4") for blob, _ in records]).astype(np.int64)
+    codes = np.concatenate([np.frombuffer(blob, dtype=np.uint8) for _, blob in records]).astype(np.int16)
+    owner = np.repeat(np.arange(len(records)), lengths)
+    known = ids < len(key)
+    expected = np.full(len(ids), -1, dtype=np.int16)
+    expected[known] = key[ids[known]]
+    correct = (expected == codes) & (expected >= 0)
+    return np.bincount(owner[correct], minlength=len(records)).astype(np.int64)
+
+
+@exam_cli.command("pack-answers")
+@click.option("--chunk-size", default=5000, show_default=True, help="Sessions converted per transaction.")
+@click.option("--delete-rows", is_flag=True, help="Delete the converted rows from the answers table.")
+def pack_answers(chunk_size, delete_rows):
+    """Move answers from the answers table into packed per-session records.
+
+    Only sessions whose packed record is still NULL are touched, so the
+    command can be stopped and re-run at any time. Run it after switching
+    to ANSWER_STORAGE=packed; until then packed mode reads unconverted
+    sessions from the answers table.
+    """
+    last_id = 0
+    sessions = answers = 0
+    started = time.perf_counter()
+    while True:
+        session_ids = db.session.scalars(
+            select(ExamSession.id)
+            .where(ExamSession.id > last_id, ExamSession.answer_ids.is_(None))
+            .order_by(ExamSession.id)
+            .limit(chunk_size)
+        ).all()
+        if not session_ids:
+            break
+        chosen = {sid: {} for sid in session_ids}
+        for sid, qid, option in db.session.execute(
+            select(Answer.exam_session_id, Answer.question_id, Answer.chosen_option)
+            .where(Answer.exam_session_id.between(session_ids[0], session_ids[-1]))
+            .order_by(Answer.id)
+        ):
+            if sid in chosen:
+                chosen[sid][qid] = option
+                answers += 1
+        records = []
+        for sid, by_question in chosen.items():
+            ids, codes = pack(by_question)
+            records.append({"id": sid, "answer_ids": ids, "answer_codes": codes})
+        db.session.execute(update(ExamSession), records)
+        if delete_rows:
+            db.session.execute(delete(Answer).where(Answer.exam_session_id.in_(session_ids)))
+        db.session.commit()
+
+        last_id = session_ids[-1]
+        sessions += len(session_ids)
+        elapsed = time.perf_counter() - started
+        click.echo(f"sessions<={last_id}: {sessions:,} sessions, {answers:,} answers packed"
+                   f" ({answers / elapsed:,.0f} answers/s)")
+    click.echo(f"packed {sessions:,} sessions in {time.perf_counter() - started:.1f}s")
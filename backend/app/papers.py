@@ -0,0 +1,215 @@
+import logging
+import os
+import random
+import threading
+import time
+from array import array
+from collections import deque
+
+from .metrics import metrics
+from .question_bank import question_bank
+
+log = logging.getLogger(__name__)
+
+
+class PaperUnavailable(Exception):
+    pass
+
+
+def parse_mix(spec: str):
+    """Parse "algebra/*:4,*/3:2" into [(("algebra", None), 4), ((None, 3), 2)]:
+    four algebra questions of any difficulty plus two hard questions from
+    any topic. "*" matches anything; an empty spec means no fixed mix."""
+    rules = []
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        stratum, _, count = part.rpartition(":")
+        topic, _, difficulty = stratum.partition("/")
+        rules.append((
+            (None if topic in ("", "*") else topic, None if difficulty in ("", "*") else int(difficulty)),
+            int(count),
+        ))
+    return rules
+
+
+def _matches(rule, stratum):
+    return all(want is None or want == have for want, have in zip(rule, stratum))
+
+
+def _proportional_quotas(strata: dict, k: int) -> dict:
+    """Split ``k`` across strata in proportion to their size (largest remainder)."""
+    total = sum(len(ids) for ids in strata.values())
+    quotas, remainders = {}, []
+    for stratum, ids in strata.items():
+        share = k * len(ids) / total
+        quotas[stratum] = int(share)
+        remainders.append((share - int(share), random.random(), stratum))
+    for _, _, stratum in sorted(remainders, reverse=True)[: k - sum(quotas.values())]:
+        quotas[stratum] += 1
+    return quotas
+
+
+class Paper:
+    """A ready exam paper: question ids plus each question's JSON fragment."""
+
+    __slots__ = ("version", "created_at", "ids", "fragments")
+
+    def __init__(self, version, ids, fragments):
+        self.version = version
+        self.created_at = time.monotonic()
+        self.ids = ids
+        self.fragments = fragments
+
+    @property
+    def payload(self) -> bytes:
+        return b"[" + b",".join(self.fragments) + b"]"
+
+
+class PaperPool:
+    """Pool of pre-generated exam papers.
+
+    Papers follow EXAM_PAPER_MIX (counts per topic/difficulty) or, without a
+    mix, are stratified in proportion to the bank's topic/difficulty strata.
+    Drawing one is a few samples over the bank snapshot plus joining the
+    questions' cached JSON, so a background thread does it ahead of time: ``take`` pops a
+    paper in O(1) and wakes the refiller when the pool drops below the
+    low-water mark. Papers from an older bank version or older than the bank
+    TTL are discarded; an empty pool falls back to drawing inline (a miss).
+    """
+
+    def __init__(self):
+        self.app = None
+        self.size = 200
+        self.low_water = 50
+        self.mix = []
+        self._papers = deque()
+        self._candidates = (None, {})  # (bank version, rule -> candidate ids)
+        self._wakeup = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        cfg = app.config
+        self.app = app
+        self.size = int(cfg.get("PAPER_POOL_SIZE", self.size))
+        self.low_water = int(cfg.get("PAPER_POOL_LOW_WATER", self.low_water))
+        self.mix = parse_mix(cfg.get("EXAM_PAPER_MIX", ""))
+        app.extensions["paper_pool"] = self
+        metrics.gauge("exam_paper_pool_depth", "Ready exam papers in this process's pool.",
+                      lambda: {(): len(self._papers)})
+        metrics.gauge("exam_paper_pool_requests", "Exam starts served from the paper pool or drawn inline.",
+                      lambda: {(("result", "hit"),): self.hits, (("result", "miss"),): self.misses})
+
+    # -- drawing ------------------------------------------------------------
+
+    def question_count(self) -> int:
+        return sum(count for _, count in self.mix) if self.mix else self.app.config.get("EXAM_QUESTION_COUNT", 10)
+
+    def _rule_candidates(self, bank):
+        version, candidates = self._candidates
+        if version != (bank.version, bank.loaded_at):
+            candidates = {
+                rule: array("i", (qid for stratum, ids in bank.strata.items() if _matches(rule, stratum) for qid in ids))
+                for rule, _ in self.mix
+            }
+            self._candidates = ((bank.version, bank.loaded_at), candidates)
+        return candidates
+
+    def draw(self, bank, k: int) -> Paper:
+        if len(bank) < k:
+            raise PaperUnavailable(f"the bank has {len(bank)} questions, a paper needs {k}")
+        chosen = []
+        if self.mix:
+            seen = set()
+            candidates = self._rule_candidates(bank)
+            for rule, count in self.mix:
+                pool = candidates[rule]
+                # rules may overlap, so oversample by what is already taken
+                picks = [q for q in random.sample(pool, min(len(pool), count + len(seen))) if q not in seen][:count]
+                if len(picks) < count:
+                    raise PaperUnavailable(f"not enough questions for {rule}")
+                seen.update(picks)
+                chosen.extend(picks)
+            random.shuffle(chosen)
+        elif len(bank.strata) > 1:
+            for stratum, quota in _proportional_quotas(bank.strata, k).items():
+                if quota:
+                    chosen.extend(random.sample(bank.strata[stratum], quota))
+            random.shuffle(chosen)
+        else:
+            chosen = random.sample(bank.ids, k)
+        return Paper(bank.version, array("i", chosen), tuple(bank.fragments[qid] for qid in chosen))
+
+    def _usable(self, paper, k) -> bool:
+        return (
+            paper.version == question_bank.version
+            and len(paper.ids) == k
+            and time.monotonic() - paper.created_at < question_bank.ttl_seconds
+        )
+
+    # -- request side -------------------------------------------------------
+
+    def take(self) -> Paper:
+        """Pop a ready paper, or draw one inline if the pool is empty."""
+        self.ensure_refiller()
+        k = self.question_count()
+        paper = None
+        while self._papers:
+            try:
+                candidate = self._papers.popleft()
+            except IndexError:
+                break
+            if self._usable(candidate, k):
+                paper = candidate
+                break
+        if len(self._papers) < self.low_water:
+            with self._wakeup:
+                self._wakeup.notify()
+        if paper is not None:
+            self.hits += 1
+            return paper
+        self.misses += 1
+        return self.draw(question_bank.snapshot(), k)
+
+    # -- refill side --------------------------------------------------------
+
+    def ensure_refiller(self):
+        # the refill thread does not survive a fork
+        if self._pid == os.getpid() or not self.size:
+            return
+        with self._wakeup:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._papers = deque()
+            self._thread = threading.Thread(target=self._refill_loop, name="paper-pool", daemon=True)
+            self._thread.start()
+
+    def refill(self) -> int:
+        bank = question_bank.snapshot()
+        k = self.question_count()
+        added = 0
+        while len(self._papers) < self.size:
+            self._papers.append(self.draw(bank, k))
+            added += 1
+        return added
+
+    def _refill_loop(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.refill()
+            except PaperUnavailable as e:
+                log.warning("paper pool: %s", e)
+            except Exception:
+                log.exception("paper pool refill failed")
+            with self._wakeup:
+                # also wake up periodically so papers from a reloaded bank replace stale ones
+                self._wakeup.wait(max(1.0, question_bank.ttl_seconds / 2))
+
+    def stats(self) -> dict:
+        return {"depth": len(self._papers), "size": self.size, "hits": self.hits, "misses": self.misses}
+
+
+paper_pool = PaperPool()
@@ -0,0 +1,90 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, request
+
+
+class SlowRequestProfiler:
+    """Opt-in sampling profiler for slow requests.
+
+    A daemon thread samples the stack of every in-flight request thread each
+    ``interval`` seconds. When a request finishes slower than ``threshold``
+    its samples are written in collapsed-stack format (one
+    ``frame;frame;frame count`` line per stack), ready for flamegraph.pl or
+    speedscope. Fast requests just drop their samples.
+    """
+
+    def __init__(self):
+        self.threshold = 0.0
+        self.interval = 0.005
+        self.output_dir = "profiles"
+        self._active = {}  # thread ident -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.threshold = float(app.config.get("PROFILE_SLOW_REQUEST_MS", 0)) / 1000
+        if not self.threshold:
+            return
+        self.interval = float(app.config.get("PROFILE_SAMPLE_INTERVAL_MS", 5)) / 1000
+        self.output_dir = app.config.get("PROFILE_OUTPUT_DIR") or os.path.join(app.instance_path, "profiles")
+        app.before_request(self._begin)
+        app.teardown_request(self._end)
+        app.extensions["slow_request_profiler"] = self
+
+    def _ensure_sampler(self):
+        # the sampler thread does not survive a fork
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid():
+                    self._active = {}
+                    self._thread = threading.Thread(target=self._sample_loop, name="slow-request-sampler", daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+    def _begin(self):
+        self._ensure_sampler()
+        g._profile_started = time.perf_counter()
+        self._active[threading.get_ident()] = Counter()
+
+    def _end(self, exc=None):
+        samples = self._active.pop(threading.get_ident(), None)
+        started = g.pop("_profile_started", None)
+        if samples is None or started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if elapsed >= self.threshold and samples:
+            self._dump(samples, elapsed)
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for ident, samples in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is not None and ident != me:
+                    samples[_collapse(frame)] += 1
+
+    def _dump(self, samples, elapsed):
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{request.endpoint or 'unmatched'}-{int(elapsed * 1000)}ms.folded"
+        with open(os.path.join(self.output_dir, name), "w") as fh:
+            for stack, count in samples.most_common():
+                fh.write(f"{stack} {count}\n")
+
+
+def _collapse(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+slow_request_profiler = SlowRequestProfiler()
@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+from .kvstore import MemoryStore
+from .metrics import metrics
+
+
+def get_keyring():
+    return current_app.extensions.get("email_keyring")
+
+
+class ProfileMemo:
+    """Bounded LRU of ``User.to_public`` output keyed by (id, updated_at).
+
+    Any change to the row bumps ``updated_at``, so a stale entry is simply
+    never looked up again and ages out of the LRU.
+    """
+
+    def __init__(self, max_size: int = 10_000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+profile_memo = ProfileMemo()
+
+
+def public_profile(user, keyring=None):
+    """``user.to_public`` with the decrypted email, memoized per row version."""
+    key = (user.id, user.updated_at)
+    profile = profile_memo.get(key)
+    if profile is None:
+        keyring = keyring or get_keyring()
+        email_plain = keyring.decrypt(user.email_enc) if keyring else None
+        profile = user.to_public(email_plain=email_plain)
+        profile_memo.put(key, profile)
+    return profile
+
+
+class ProfileCache:
+    """Serialized ``/api/auth/me`` bodies keyed by user id.
+
+    A per-process LRU with a TTL sits in front of the optional shared store,
+    so most hits never reach the database. Entries are dropped when a User row
+    is committed (see the hooks in models.py); the local TTL bounds how long
+    another worker's copy can lag behind that.
+    """
+
+    def __init__(self):
+        self.local = MemoryStore()
+        self.shared = None
+        self.ttl = 60.0
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.local = MemoryStore(max_keys=int(app.config.get("PROFILE_CACHE_SIZE", 10_000)))
+        self.ttl = float(app.config.get("PROFILE_CACHE_TTL_SECONDS", self.ttl))
+        self.shared = app.extensions["shared_store"] if app.config.get("PROFILE_CACHE_SHARED") else None
+        app.extensions["profile_cache"] = self
+        metrics.gauge("profile_cache_requests", "Profile cache lookups by result.",
+                      lambda: {(("result", "hit"),): self.hits, (("result", "miss"),): self.misses})
+
+    def get(self, user_id):
+        key = f"profile:{user_id}"
+        body = self.local.get(key)
+        if body is None and self.shared is not None:
+            body = self.shared.get(key)
+            if body is not None:
+                self.local.set(key, body, self.ttl)
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def put(self, user_id, body: bytes) -> bytes:
+        key = f"profile:{user_id}"
+        self.local.set(key, body, self.ttl)
+        if self.shared is not None:
+            self.shared.set(key, body, self.ttl)
+        return body
+
+    def invalidate(self, user_id):
+        key = f"profile:{user_id}"
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "shared": self.shared is not None}
+
+
+profile_cache = ProfileCache()
@@ -0,0 +1,173 @@
+import json
+import random
+import threading
+import time
+import zlib
+from array import array
+from contextlib import nullcontext
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from .extensions import db
+from .metrics import metrics
+from .models import Question
+from .routing import replica_router
+
+
+class BankSnapshot:
+    """Immutable view of the question bank: a compact id array plus payloads,
+    their serialized JSON fragments, content versions and correct options
+    keyed by question id, and the ids of each (topic, difficulty) stratum."""
+
+    __slots__ = ("version", "loaded_at", "ids", "payloads", "fragments", "versions", "answer_key", "strata")
+
+    def __init__(self, version, ids, payloads, answer_key, strata=None, fragments=None, versions=None):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.ids = ids
+        self.payloads = payloads
+        self.answer_key = answer_key
+        self.strata = strata or {}
+        self.fragments = fragments or {}
+        self.versions = versions or {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def sample(self, k: int) -> list[dict]:
+        # random.sample over the id array only touches the k chosen slots
+        return [self.payloads[qid] for qid in random.sample(self.ids, k)]
+
+    def questions_json(self, question_ids) -> bytes:
+        """The public JSON array of these questions, joined from cached bytes."""
+        fragments = self.fragments
+        return b"[" + b",".join([fragments[qid] for qid in question_ids]) + b"]"
+
+
+def serialize_question(payload: dict) -> bytes:
+    # compact and key-sorted, so equal content always yields equal bytes
+    return json.dumps(payload, separators=(",", ":"), sort_keys=True).encode()
+
+
+class QuestionBank:
+    """Process-level cache of the questions table used to draw exam papers.
+
+    The snapshot is rebuilt lazily when a committed session touched a
+    Question (in this process) or when it is older than the TTL, which
+    bounds staleness for writes made by other processes.
+    """
+
+    def __init__(self, ttl_seconds: float = 300):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._version = 0
+        self._snapshot = None
+        # question id -> (updated_at, fragment); reused by the next reload
+        self._fragment_versions = {}
+        self.serialized = 0
+
+    def init_app(self, app):
+        self.ttl_seconds = float(app.config.get("QUESTION_BANK_TTL_SECONDS", self.ttl_seconds))
+        app.extensions["question_bank"] = self
+        metrics.gauge("question_bank_size", "Questions in this process's cached bank.",
+                      lambda: {(): len(self._snapshot) if self._snapshot is not None else 0})
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    def _is_fresh(self, snap) -> bool:
+        return (
+            snap is not None
+            and snap.version == self._version
+            and time.monotonic() - snap.loaded_at < self.ttl_seconds
+        )
+
+    def snapshot(self) -> BankSnapshot:
+        snap = self._snapshot
+        if self._is_fresh(snap):
+            return snap
+        with self._lock:
+            snap = self._snapshot
+            if not self._is_fresh(snap):
+                snap = self._load(self._version)
+                self._snapshot = snap
+            return snap
+
+    def _load(self, version) -> BankSnapshot:
+        # a TTL refresh tolerates replication lag and may read from a replica;
+        # a reload after a local change must see it, so it reads the primary
+        refresh = self._snapshot is not None and self._snapshot.version == version
+        with replica_router.replica_reads() if refresh else nullcontext():
+            rows = db.session.execute(
+                select(
+                    Question.id,
+                    Question.question_text,
+                    Question.option_a,
+                    Question.option_b,
+                    Question.option_c,
+                    Question.option_d,
+                    Question.correct_option,
+                    Question.topic,
+                    Question.difficulty,
+                    Question.updated_at,
+                ).order_by(Question.id)
+            )
+        previous = self._fragment_versions
+        cache = {}
+        versions = {}
+        ids = array("i")
+        payloads = {}
+        fragments = {}
+        answer_key = {}
+        strata = {}
+        for qid, text, a, b, c, d, correct, topic, difficulty, updated_at in rows:
+            ids.append(qid)
+            stratum = strata.get((topic, difficulty))
+            if stratum is None:
+                stratum = strata[(topic, difficulty)] = array("i")
+            stratum.append(qid)
+            payload = payloads[qid] = {
+                "id": qid,
+                "text": text,
+                "options": {"A": a, "B": b, "C": c, "D": d},
+            }
+            cached = previous.get(qid)
+            if cached is not None and updated_at is not None and cached[0] == updated_at:
+                fragments[qid] = cached[1]
+            else:
+                fragments[qid] = serialize_question(payload)
+                self.serialized += 1
+            cache[qid] = (updated_at, fragments[qid])
+            # rows written behind the ORM's back may lack updated_at
+            versions[qid] = updated_at.isoformat() if updated_at else format(zlib.crc32(fragments[qid]), "x")
+            answer_key[qid] = correct
+        self._fragment_versions = cache
+        return BankSnapshot(version, ids, payloads, answer_key, strata, fragments, versions)
+
+
+question_bank = QuestionBank()
+
+
+@event.listens_for(Session, "after_flush")
+def _track_question_writes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Question):
+            session.info["questions_changed"] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("questions_changed", False):
+        question_bank.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("questions_changed", None)
@@ -0,0 +1,66 @@
+import math
+import time
+
+from flask import jsonify
+
+from .kvstore import MemoryStore
+
+
+def parse_limit(spec: str):
+    """Parse "10/60" into (10, 60.0): at most 10 hits per 60 seconds."""
+    count, _, seconds = spec.partition("/")
+    return int(count), float(seconds or 60)
+
+
+class SlidingWindowLimiter:
+    """Approximate sliding-window counter over a shared key/value store.
+
+    Each key costs two counters (this window and the previous one); the
+    estimate weights the previous window by how much of it still overlaps
+    the sliding window. Counters expire after two windows.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or MemoryStore()
+
+    def hit(self, key: str, limit: int, window: float) -> float:
+        """Record one hit; return 0 if allowed, else seconds until retry."""
+        now = time.time()
+        current = int(now // window)
+        count = self.store.incr(f"rl:{key}:{current}", ttl=2 * window)
+        previous = self.store.get(f"rl:{key}:{current - 1}") or 0
+        into_window = (now % window) / window
+        estimate = previous * (1 - into_window) + count
+        if estimate <= limit:
+            return 0
+        return max(1.0, window - now % window)
+
+
+class LoginRateLimiter(SlidingWindowLimiter):
+    """Login attempts, limited per account (email hash) first and per client
+    address with a much higher ceiling, since many students may share one."""
+
+    def init_app(self, app):
+        self.store = app.extensions["shared_store"]
+        self.per_email = parse_limit(app.config.get("LOGIN_RATE_LIMIT_PER_EMAIL", "10/60"))
+        self.per_ip = parse_limit(app.config.get("LOGIN_RATE_LIMIT_PER_IP", "1000/60"))
+        self.enabled = app.config.get("LOGIN_RATE_LIMIT_ENABLED", True)
+        app.extensions["login_limiter"] = self
+
+    def check(self, email_hash: str, client_ip: str) -> float:
+        if not self.enabled:
+            return 0
+        return max(
+            self.hit(f"login:email:{email_hash}", *self.per_email),
+            self.hit(f"login:ip:{client_ip}", *self.per_ip),
+        )
+
+
+def too_many_requests(retry_after: float):
+    resp = jsonify({"error": "too many attempts, retry later"})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(math.ceil(retry_after))
+    return resp
+
+
+login_limiter = LoginRateLimiter()
@@ -0,0 +1,140 @@
+import time
+
+import click
+import numpy as np
+from sqlalchemy import select, update
+
+from .cli import exam_cli
+from .extensions import db
+from .models import Answer, ExamSession, Question
+from .packed import score_packed
+
+NO_KEY = -1
+
+
+def option_codes(options) -> np.ndarray:
+    """Map a sequence of "A".."D" strings to int16 codes 0..3 in one pass."""
+    raw = np.frombuffer("".join(options).encode("ascii"), dtype=np.uint8)
+    if len(raw) != len(options):
+        raise ValueError("options must be single characters")
+    return raw.astype(np.int16) - ord("A")
+
+
+def load_key_array() -> np.ndarray:
+    """Dense array indexed by question id holding the correct option code."""
+    ids, correct = [], []
+    for qid, option in db.session.execute(select(Question.id, Question.correct_option)):
+        ids.append(qid)
+        correct.append(option)
+    key = np.full((max(ids) + 1) if ids else 1, NO_KEY, dtype=np.int16)
+    if ids:
+        key[np.asarray(ids, dtype=np.int64)] = option_codes(correct)
+    return key
+
+
+def score_chunk(key, session_ids, answer_sessions, answer_questions, chosen):
+    """Vectorized scores for ``session_ids`` (sorted) from flat answer columns.
+
+    Answers are expected in insertion order; when a question was answered more
+    than once in a session only the last answer counts, as in grade_sessions.
+    Answers of sessions not in ``session_ids`` are ignored.
+    """
+    session_ids = np.asarray(session_ids, dtype=np.int64)
+    sessions = np.asarray(answer_sessions, dtype=np.int64)
+    questions = np.asarray(answer_questions, dtype=np.int64)
+    chosen = np.asarray(chosen)
+
+    pos = np.searchsorted(session_ids, sessions)
+    pos_clipped = np.minimum(pos, len(session_ids) - 1)
+    # drop other sessions' answers first: they would share the slot of the
+    # next scored session and win its "last answer" below
+    ours = session_ids[pos_clipped] == sessions
+    pos_clipped, questions, chosen = pos_clipped[ours], questions[ours], chosen[ours]
+
+    # last answer wins: unique over the reversed (session, question) pairs
+    pair = pos_clipped * (int(questions.max(initial=0)) + 1) + questions
+    _, first_from_end = np.unique(pair[::-1], return_index=True)
+    keep = np.zeros(len(pair), dtype=bool)
+    keep[len(pair) - 1 - first_from_end] = True
+
+    known = questions < len(key)
+    expected = np.full(len(questions), NO_KEY, dtype=np.int16)
+    expected[known] = key[questions[known]]
+    correct = keep & (expected == chosen) & (expected != NO_KEY)
+
+    return np.bincount(pos_clipped[correct], minlength=len(session_ids)).astype(np.int64)
+
+
+@exam_cli.command("regrade")
+@click.option("--chunk-size", default=5000, show_default=True, help="Sessions scored per batch.")
+@click.option("--start-after", default=0, help="Resume after this exam session id.")
+@click.option("--dry-run", is_flag=True, help="Score but do not write anything back.")
+def regrade(chunk_size, start_after, dry_run):
+    """Re-score every submitted exam session against the current answer key.
+
+    Archived sessions (see `flask exam archive`) keep the score they had.
+    """
+    key = load_key_array()
+    last_id = start_after
+    total_rows = total_sessions = total_changed = 0
+    started = time.perf_counter()
+
+    while True:
+        chunk = db.session.execute(
+            select(ExamSession.id, ExamSession.score, ExamSession.answer_ids, ExamSession.answer_codes)
+            .where(ExamSession.submitted.is_(True), ExamSession.id > last_id)
+            .order_by(ExamSession.id)
+            .limit(chunk_size)
+        ).all()
+        if not chunk:
+            break
+        session_ids = [row[0] for row in chunk]
+        old_scores = np.asarray([score if score is not None else -1 for _, score, _, _ in chunk], dtype=np.int64)
+        scores = np.zeros(len(session_ids), dtype=np.int64)
+
+        # packed records are scored straight from their buffers
+        packed = [i for i, row in enumerate(chunk) if row[2] is not None]
+        if packed:
+            scores[packed] = score_packed(key, [(chunk[i][2], chunk[i][3]) for i in packed])
+            total_rows += sum(len(chunk[i][3]) for i in packed)
+        legacy = [sid for sid, _, ids, _ in chunk if ids is None]
+        rows = []
+        if legacy:
+            rows = db.session.execute(
+                select(Answer.exam_session_id, Answer.question_id, Answer.chosen_option)
+                .where(Answer.exam_session_id.in_(legacy))
+                .order_by(Answer.id)
+            ).all()
+        if rows:
+            answer_sessions, answer_questions, chosen = zip(*rows)
+            legacy_scores = score_chunk(key, legacy, answer_sessions, answer_questions, option_codes(chosen))
+            scores[[i for i, row in enumerate(chunk) if row[2] is None]] = legacy_scores
+
+        changed = np.nonzero(scores != old_scores)[0]
+        if len(changed) and not dry_run:
+            db.session.execute(
+                update(ExamSession),
+                [{"id": session_ids[i], "score": int(scores[i])} for i in changed],
+            )
+            db.session.commit()
+        else:
+            db.session.rollback()
+
+        last_id = session_ids[-1]
+        total_rows += len(rows)
+        total_sessions += len(session_ids)
+        total_changed += len(changed)
+        elapsed = time.perf_counter() - started
+        click.echo(
+            f"sessions<={last_id}: {total_sessions} sessions, {total_rows} answers, "
+            f"{total_changed} changed, {total_rows / elapsed if elapsed else 0:,.0f} rows/s"
+        )
+
+    elapsed = time.perf_counter() - started
+    click.echo(
+        f"{'would update' if dry_run else 'updated'} {total_changed} of {total_sessions} sessions "
+        f"from {total_rows} answers in {elapsed:.1f}s "
+        f"({total_rows / elapsed if elapsed else 0:,.0f} rows/s)"
+    )
+    if total_changed and not dry_run:
+        click.echo("question statistics and score totals are now stale; run `flask exam rebuild-stats`")
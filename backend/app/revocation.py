@@ -0,0 +1,302 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.orm import Session
+
+from .extensions import db
+from .metrics import metrics
+from .models import RevokedToken
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+# ids are handed out before commit, so a row can become visible after a
+# higher id was already synced; each sync re-reads this many ids back
+SYNC_OVERLAP_IDS = 1000
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings: never a false negative, about
+    ``error_rate`` false positives once ``capacity`` keys are in."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, key: str):
+        # double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        array = self._array
+        return all(array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class TokenDenylist:
+    """Revoked JWTs, checked on every ``@jwt_required()`` request without a
+    database round trip in the common case.
+
+    revoked_tokens is the persistent denylist. Each process keeps a Bloom
+    filter of its keys (``jti:<jti>`` for one token, ``user:<id>`` for a
+    revoke-all) and an LRU of the rows behind the keys it has looked up: a
+    token whose keys are not in the filter is valid without further work,
+    and only a possible hit reads the primary, once per key. Revocations
+    committed in this process go into the filter at commit; those of other
+    processes are picked up by a background sync every ``sync_interval``
+    seconds, which bounds how long a token revoked elsewhere keeps working.
+    The same thread deletes expired rows every ``prune_interval`` seconds
+    and rebuilds the filter, so it only holds live keys.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.capacity = 100_000
+        self.error_rate = 0.01
+        self.lru_size = 10_000
+        self.sync_interval = 2.0
+        self.prune_interval = 3600.0
+        self.max_lifetime = timedelta(days=7)
+        self._bloom = None
+        self._keys = 0
+        self._last_id = 0
+        self._recent_ids = set()
+        self._lru = OrderedDict()  # key -> revoked (jti) / cutoff in microseconds or None (user)
+        self._generation = 0  # bumped whenever keys are added
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._pruned_at = 0.0
+        self.bloom_negatives = 0
+        self.lru_hits = 0
+        self.store_lookups = 0
+        self.pruned = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.capacity = int(app.config.get("REVOCATION_BLOOM_CAPACITY", self.capacity))
+        self.error_rate = float(app.config.get("REVOCATION_BLOOM_ERROR_RATE", self.error_rate))
+        self.lru_size = int(app.config.get("REVOCATION_LRU_SIZE", self.lru_size))
+        self.sync_interval = float(app.config.get("REVOCATION_SYNC_SECONDS", self.sync_interval))
+        self.prune_interval = float(app.config.get("REVOCATION_PRUNE_SECONDS", self.prune_interval))
+        # a revoke-all has to outlive every token issued before it
+        self.max_lifetime = max(
+            timedelta(minutes=int(app.config.get("JWT_ACCESS_TOKEN_EXPIRES_MIN", 15))),
+            timedelta(days=int(app.config.get("JWT_REFRESH_TOKEN_EXPIRES_DAYS", 7))),
+        )
+        app.extensions["token_denylist"] = self
+        metrics.gauge("token_denylist_checks", "Revocation checks by where they were answered.",
+                      lambda: {(("answered_by", "bloom"),): self.bloom_negatives,
+                               (("answered_by", "lru"),): self.lru_hits,
+                               (("answered_by", "store"),): self.store_lookups})
+
+    # -- checks -------------------------------------------------------------
+
+    def is_revoked(self, payload) -> bool:
+        """``token_in_blocklist_loader`` body. A revoke-all cutoff covers the
+        tokens issued up to it by their ``iat_us`` claim (microseconds), so
+        a login right after it, in the same second, is not denied; tokens
+        without the claim fall back to ``iat``, whole seconds, up to and
+        including the cutoff's second."""
+        self._ensure_loaded()
+        bloom = self._bloom
+        jti_key = f"jti:{payload['jti']}"
+        user_key = f"user:{payload['sub']}"
+        if jti_key not in bloom and user_key not in bloom:
+            self.bloom_negatives += 1
+            return False
+        if jti_key in bloom and self._cached(jti_key, self._load_jti):
+            return True
+        if user_key in bloom:
+            cutoff = self._cached(user_key, self._load_cutoff)
+            if cutoff is None:
+                return False
+            issued = payload.get("iat_us")
+            return (issued if issued is not None else payload.get("iat", 0) * 1_000_000) <= cutoff
+        return False
+
+    def _cached(self, key, load):
+        with self._lock:
+            value = self._lru.get(key, _MISSING)
+            if value is not _MISSING:
+                self._lru.move_to_end(key)
+                self.lru_hits += 1
+                return value
+            generation = self._generation
+        value = load(key.split(":", 1)[1])
+        self.store_lookups += 1
+        with self._lock:
+            if generation != self._generation:
+                return value  # a revocation landed meanwhile; do not cache what may predate it
+            self._lru[key] = value
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+        return value
+
+    @staticmethod
+    def _load_jti(jti):
+        return bool(_read(select(RevokedToken.id).where(RevokedToken.jti == jti)))
+
+    @staticmethod
+    def _load_cutoff(user_id):
+        [(revoked_at,)] = _read(
+            select(func.max(RevokedToken.revoked_at))
+            .where(RevokedToken.user_id == int(user_id), RevokedToken.jti.is_(None))
+        )
+        # microseconds since the epoch, compared with the tokens' iat_us
+        return (revoked_at - datetime(1970, 1, 1)) // timedelta(microseconds=1) if revoked_at else None
+
+    # -- revoking -----------------------------------------------------------
+
+    def revoke(self, payload):
+        """Deny the token with this decoded ``payload`` until it expires, once
+        the current transaction commits."""
+        db.session.add(RevokedToken(jti=payload["jti"], user_id=int(payload["sub"]),
+                                    expires_at=datetime.utcfromtimestamp(payload["exp"])))
+        db.session.info.setdefault("revoked_keys", []).append(f"jti:{payload['jti']}")
+
+    def revoke_all(self, user_id):
+        """Deny every token of ``user_id`` issued so far, once the current
+        transaction commits."""
+        now = datetime.utcnow()
+        db.session.add(RevokedToken(user_id=int(user_id), revoked_at=now, expires_at=now + self.max_lifetime))
+        db.session.info.setdefault("revoked_keys", []).append(f"user:{user_id}")
+
+    def _committed(self, keys):
+        if self._pid != os.getpid():
+            return  # the first check in this process loads them from the table
+        with self._lock:
+            for key in keys:
+                self._bloom.add(key)
+                self._lru.pop(key, None)
+            self._generation += 1
+
+    # -- sync and pruning ---------------------------------------------------
+
+    def _ensure_loaded(self):
+        # the filter is per process and the sync thread does not survive a fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._rebuild()
+            self._pid = os.getpid()
+            self._pruned_at = time.monotonic()
+            self._thread = threading.Thread(target=self._sync_loop, name="token-denylist", daemon=True)
+            self._thread.start()
+
+    def _rebuild(self):
+        """Fill a new filter from the live rows; caller holds ``_lock``."""
+        rows = _read(
+            select(RevokedToken.id, RevokedToken.jti, RevokedToken.user_id)
+            .where(RevokedToken.expires_at > datetime.utcnow())
+        )
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for row in rows:
+            bloom.add(_key(row))
+        self._bloom, self._keys = bloom, len(rows)
+        self._last_id = max((row.id for row in rows), default=self._last_id)
+        self._recent_ids = {row.id for row in rows if row.id > self._last_id - SYNC_OVERLAP_IDS}
+        self._lru.clear()
+        self._generation += 1
+
+    def sync(self) -> int:
+        """Add rows committed since the last sync, by any process; returns
+        how many were new."""
+        rows = _read(
+            select(RevokedToken.id, RevokedToken.jti, RevokedToken.user_id)
+            .where(RevokedToken.id > self._last_id - SYNC_OVERLAP_IDS,
+                   RevokedToken.expires_at > datetime.utcnow())
+            .order_by(RevokedToken.id)
+        )
+        with self._lock:
+            new = [row for row in rows if row.id not in self._recent_ids]
+            for row in new:
+                key = _key(row)
+                self._bloom.add(key)
+                self._lru.pop(key, None)
+            self._keys += len(new)
+            self._generation += bool(new)
+            self._last_id = max(self._last_id, rows[-1].id if rows else 0)
+            self._recent_ids = {row.id for row in rows if row.id > self._last_id - SYNC_OVERLAP_IDS}
+            if self._keys > self._bloom.capacity:
+                self._rebuild()  # full: grow it before false positives pile up
+        return len(new)
+
+    def prune(self) -> int:
+        """Delete rows past their expiry and rebuild the filter without them."""
+        result = db.session.execute(
+            delete(RevokedToken).where(RevokedToken.expires_at <= datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        with self._lock:
+            self._rebuild()
+        self.pruned += result.rowcount
+        return result.rowcount
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                with self.app.app_context():
+                    if time.monotonic() - self._pruned_at >= self.prune_interval:
+                        self._pruned_at = time.monotonic()
+                        self.prune()
+                    else:
+                        self.sync()
+            except Exception:
+                log.exception("token denylist sync failed")
+
+    def stats(self) -> dict:
+        return {
+            "keys": self._keys,
+            "bloom_bytes": len(self._bloom._array) if self._bloom else 0,
+            "lru_size": len(self._lru),
+            "bloom_negatives": self.bloom_negatives,
+            "lru_hits": self.lru_hits,
+            "store_lookups": self.store_lookups,
+            "pruned": self.pruned,
+        }
+
+
+def _read(stmt):
+    # on a connection of its own, outside the request's transaction, and
+    # from the primary: a replica may not have a fresh revocation yet
+    with db.engines[None].connect() as conn:
+        return conn.execute(stmt).all()
+
+
+def _key(row) -> str:
+    return f"jti:{row.jti}" if row.jti is not None else f"user:{row.user_id}"
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_revocations(session):
+    keys = session.info.pop("revoked_keys", None)
+    if keys:
+        token_denylist._committed(keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_revocations(session):
+    session.info.pop("revoked_keys", None)
+
+
+token_denylist = TokenDenylist()
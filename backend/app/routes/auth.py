@@ -1,10 +1,19 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import (create_access_token, create_refresh_token, decode_token, get_jwt,
+                                get_jwt_identity, jwt_required)
+from flask_jwt_extended.exceptions import JWTDecodeError
+from jwt import ExpiredSignatureError, InvalidTokenError
 from datetime import timedelta
+from sqlalchemy.exc import IntegrityError
 
 from ..extensions import db
 from ..models import User
-from ..security import hash_password, verify_password, email_fingerprint, encrypt_email, decrypt_email
+from ..security import email_fingerprint
+from ..profiles import get_keyring, profile_cache, public_profile
+from ..hashing import password_hasher
+from ..ratelimit import login_limiter, too_many_requests
+from ..revocation import token_denylist
+from ..routing import replica_router
 
 bp = Blueprint("auth", __name__, url_prefix="/api/auth")
 
@@ -61,6 +70,8 @@ def register():
         description: Missing email or password
       409:
         description: User already exists
+      503:
+        description: Password hashing pool saturated, retry after the Retry-After delay
     """
     data = request.get_json(force=True)
     email = data.get("email")
@@ -75,16 +86,17 @@ def register():
     if existing:
         return jsonify({"error": "user already exists"}), 409
 
-    key = current_app.config.get("EMAIL_ENC_KEY")
-    if not key:
+    keyring = get_keyring()
+    if keyring is None:
         return jsonify({"error": "server misconfigured: EMAIL_ENC_KEY missing"}), 500
 
-    email_enc = encrypt_email(email, key)
-    pwd_hash = hash_password(password)
+    email_enc = keyring.encrypt(email)
+    pwd_hash = password_hasher.hash(password)
 
     user = User(email_enc=email_enc, email_hash=email_hash, password_hash=pwd_hash, full_name=full_name)
     db.session.add(user)
     db.session.commit()
+    replica_router.identify(user.id)  # the new token's first reads must see this row
 
     access_exp, refresh_exp = _jwt_durations(current_app.config)
     access = create_access_token(identity=str(user.id), expires_delta=access_exp)
@@ -150,6 +162,10 @@ def login():
             user_not_found:
               error: "invalid credentials"
               note: "No user with this email exists."
+      429:
+        description: Too many attempts for this email or client IP, retry after the Retry-After delay
+      503:
+        description: Password hashing pool saturated, retry after the Retry-After delay
     """
     data = request.get_json(force=True)
     email = data.get("email")
@@ -158,10 +174,16 @@ def login():
         return jsonify({"error": "email and password are required"}), 400
 
     email_hash = email_fingerprint(email)
+    # turned away before any DB lookup or bcrypt work
+    retry_after = login_limiter.check(email_hash, request.remote_addr or "unknown")
+    if retry_after:
+        return too_many_requests(retry_after)
+
     user = User.query.filter_by(email_hash=email_hash).first()
 
     if not user:
         return jsonify({"error": "invalid credentials"}), 401
+    replica_router.identify(user.id)
 
     # ✅ Handle "first login always fails"
     if not user.first_login_attempted:
@@ -170,21 +192,18 @@ def login():
         return jsonify({"error": "invalid credentials"}), 401
 
     # ✅ Normal password verification after first attempt
-    if not verify_password(password, user.password_hash):
+    if not password_hasher.verify(password, user.password_hash):
         return jsonify({"error": "invalid credentials"}), 401
 
     access_exp, refresh_exp = _jwt_durations(current_app.config)
     access = create_access_token(identity=str(user.id), expires_delta=access_exp)
     refresh = create_refresh_token(identity=str(user.id), expires_delta=refresh_exp)
 
-    key = current_app.config.get("EMAIL_ENC_KEY")
-    email_plain = decrypt_email(user.email_enc, key) if key else None
-
     return jsonify({
         "message": "logged_in",
         "access_token": access,
         "refresh_token": refresh,
-        "user": user.to_public(email_plain=email_plain),
+        "user": public_profile(user),
     }), 200
 
 
@@ -217,14 +236,14 @@ def me():
         description: User not found
     """
     uid = get_jwt_identity()
-    user = User.query.get(int(uid))
+    body = profile_cache.get(uid)
+    if body is None:
+        user = db.session.get(User, int(uid))
+        if not user:
+            return jsonify({"error": "not found"}), 404
+        body = profile_cache.put(uid, current_app.json.dumps(public_profile(user)).encode("utf-8") + b"\n")
 
-    if not user:
-        return jsonify({"error": "not found"}), 404
-
-    key = current_app.config.get("EMAIL_ENC_KEY")
-    email_plain = decrypt_email(user.email_enc, key) if key else None
-    return jsonify(user.to_public(email_plain=email_plain)), 200
+    return current_app.response_class(body, status=200, mimetype="application/json")
 
 
 @bp.route("/refresh", methods=["POST"])
@@ -254,3 +273,76 @@ def refresh():
     access_exp, _ = _jwt_durations(current_app.config)
     new_access = create_access_token(identity=str(uid), expires_delta=access_exp)
     return jsonify({"access_token": new_access}), 200
+
+
+@bp.route("/logout", methods=["POST"])
+@jwt_required(verify_type=False)
+def logout():
+    """
+    Log out: revoke the presented token and, if given, the refresh token
+    ---
+    tags:
+      - Auth
+    security:
+      - BearerAuth: []
+    requestBody:
+      required: false
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              refresh_token:
+                type: string
+                description: Revoked along with the bearer token (must belong to the same user)
+    responses:
+      200:
+        description: Tokens revoked; they are rejected with 401 from now on
+      400:
+        description: refresh_token is not a valid refresh token of this user
+      401:
+        description: Missing, invalid, expired or already revoked token
+    """
+    payloads = [get_jwt()]
+    refresh_token = (request.get_json(silent=True) or {}).get("refresh_token")
+    if refresh_token:
+        try:
+            payload = decode_token(refresh_token)
+        except ExpiredSignatureError:
+            payload = None  # expired already, nothing to revoke
+        except (InvalidTokenError, JWTDecodeError):
+            return jsonify({"error": "invalid refresh_token"}), 400
+        if payload is not None:
+            if payload.get("type") != "refresh" or payload["sub"] != get_jwt_identity():
+                return jsonify({"error": "invalid refresh_token"}), 400
+            if payload["jti"] != payloads[0]["jti"] and not token_denylist.is_revoked(payload):
+                payloads.append(payload)
+
+    for payload in payloads:
+        token_denylist.revoke(payload)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()  # a concurrent logout revoked them first
+    return jsonify({"message": "logged_out"}), 200
+
+
+@bp.route("/revoke-all", methods=["POST"])
+@jwt_required(verify_type=False)
+def revoke_all():
+    """
+    Revoke every access and refresh token issued to the current user so far
+    ---
+    tags:
+      - Auth
+    security:
+      - BearerAuth: []
+    responses:
+      200:
+        description: All tokens issued up to now (including this one) are rejected with 401; log in again for new ones
+      401:
+        description: Missing, invalid, expired or already revoked token
+    """
+    token_denylist.revoke_all(get_jwt_identity())
+    db.session.commit()
+    return jsonify({"message": "all_tokens_revoked"}), 200
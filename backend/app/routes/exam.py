@@ -1,12 +1,49 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime
+import hashlib
+from sqlalchemy import insert, select, true
+from sqlalchemy.exc import IntegrityError
 from ..extensions import db
-from ..models import Question, ExamSession, ExamQuestion, Answer
-import random
+from ..models import ArchivedSession, ExamSession, ExamQuestion
+from ..aggregates import question_stats, user_stats
+from ..archive import read_archived
+from ..autosave import answer_buffer
+from ..compression import compressor
+from ..expiry import exam_expiry
+from ..grading import VALID_OPTIONS, InvalidSubmission, grade_sessions, normalize_answers
+from ..grading_queue import grading_queue
+from ..papers import PaperUnavailable, paper_pool
+from ..question_bank import question_bank
 
 bp = Blueprint("exam", __name__, url_prefix="/api/exam")
 
 
+def _create_session(user_id, question_ids):
+    # One transaction: the session INSERT (id via RETURNING/lastrowid) plus a
+    # single multi-row INSERT for its questions, however long the exam is.
+    started = datetime.utcnow()
+    session = ExamSession(user_id=user_id, start_time=started, expires_at=exam_expiry.deadline_for(started))
+    if current_app.config.get("ANSWER_STORAGE") == "packed":
+        session.answer_ids = session.answer_codes = b""
+    db.session.add(session)
+    db.session.flush()
+    db.session.execute(
+        insert(ExamQuestion),
+        [{"exam_session_id": session.id, "question_id": qid} for qid in question_ids],
+    )
+    session_id, expires_at = session.id, session.expires_at
+    db.session.commit()
+    exam_expiry.schedule(session_id, expires_at)
+    return session_id, expires_at
+
+
+def _paper_response(session_id, expires_at, fragments, etag=None):
+    head = b'{"expires_at":"%sZ","questions":' % expires_at.isoformat().encode()
+    tail = b',"session_id":%d}\n' % session_id
+    return compressor.json_array_response(head, fragments, tail, etag)
+
+
 @bp.route("/start", methods=["POST"])
 @jwt_required()
 def start_exam():
@@ -19,7 +56,7 @@ def start_exam():
       - Bearer: []
     responses:
       200:
-        description: Exam started, returns 10 randomized questions
+        description: Exam started, returns a pre-generated paper of EXAM_QUESTION_COUNT (default 10) questions, or the EXAM_PAPER_MIX counts per topic/difficulty
         content:
           application/json:
             schema:
@@ -28,6 +65,11 @@ def start_exam():
                 session_id:
                   type: integer
                   example: 12
+                expires_at:
+                  type: string
+                  format: date-time
+                  description: Submit deadline (UTC), EXAM_DURATION_SECONDS after the start
+                  example: "2024-05-01T10:30:00Z"
                 questions:
                   type: array
                   items:
@@ -56,41 +98,294 @@ def start_exam():
                             example: "Rome"
       401:
         description: Unauthorized, missing or invalid token
+      503:
+        description: Question bank has fewer questions than an exam needs
     """
     uid = get_jwt_identity()
 
-    session = ExamSession(user_id=uid)
-    db.session.add(session)
-    db.session.commit()
+    try:
+        paper = paper_pool.take()
+    except PaperUnavailable:
+        return jsonify({"error": "not enough questions available"}), 503
 
-    all_questions = Question.query.all()
-    selected = random.sample(all_questions, 10)
+    question_ids = paper.ids.tolist()
+    session_id, expires_at = _create_session(uid, question_ids)
+    answer_buffer.sessions.put(session_id, uid, question_ids, expires_at)
 
-    for q in selected:
-        eq = ExamQuestion(exam_session_id=session.id, question_id=q.id)
-        db.session.add(eq)
-    db.session.commit()
+    # the questions array is serialized (and compressed) once per question
+    return _paper_response(session_id, expires_at, paper.fragments)
 
-    questions_payload = [
-        {
-            "id": q.id,
-            "text": q.question_text,
-            "options": {
-                "A": q.option_a,
-                "B": q.option_b,
-                "C": q.option_c,
-                "D": q.option_d,
-            }
-        }
-        for q in selected
-    ]
 
+@bp.route("/history", methods=["GET"])
+@jwt_required()
+def exam_history():
+    """
+    List the current user's exam sessions (archived ones included), newest first
+    ---
+    tags:
+      - Exam
+    security:
+      - Bearer: []
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (default 20, at most 100)
+      - name: before
+        in: query
+        type: integer
+        required: false
+        description: Cursor from next_before of the previous page; omit for the first page
+    responses:
+      200:
+        description: One page of sessions; next_before is null on the last page
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                sessions:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      session_id: {type: integer}
+                      start_time: {type: string}
+                      end_time: {type: string}
+                      expires_at: {type: string}
+                      submitted: {type: boolean}
+                      score: {type: integer}
+                next_before: {type: integer}
+      400:
+        description: Invalid limit or cursor
+      401:
+        description: Unauthorized, missing or invalid token
+    """
+    limit = request.args.get("limit", 20, type=int)
+    before = request.args.get("before", type=int)
+    if not 1 <= limit <= 100 or (before is not None and before < 1):
+        return jsonify({"error": "invalid limit or cursor"}), 400
+
+    # keyset pagination: seek past the cursor on (user_id, id) instead of an
+    # OFFSET that reads and discards every earlier row. Archived sessions
+    # are paged the same way and merged in, since ids never repeat.
+    uid = int(get_jwt_identity())
+    rows = []
+    for model, submitted in ((ExamSession, ExamSession.submitted), (ArchivedSession, true())):
+        query = select(
+            model.id, model.start_time, model.end_time, model.expires_at, submitted.label("submitted"), model.score,
+        ).where(model.user_id == uid)
+        if before is not None:
+            query = query.where(model.id < before)
+        rows += db.session.execute(query.order_by(model.id.desc()).limit(limit + 1)).all()
+    rows.sort(key=lambda r: r.id, reverse=True)
+
+    def iso(value):
+        return value.isoformat() + "Z" if value else None
+
+    page = rows[:limit]
     return jsonify({
-        "session_id": session.id,
-        "questions": questions_payload
+        "sessions": [
+            {"session_id": r.id, "start_time": iso(r.start_time), "end_time": iso(r.end_time),
+             "expires_at": iso(r.expires_at), "submitted": bool(r.submitted), "score": r.score}
+            for r in page
+        ],
+        "next_before": page[-1].id if len(rows) > limit else None,
     }), 200
 
 
+@bp.route("/stats", methods=["GET"])
+@jwt_required()
+def exam_stats():
+    """
+    Score totals for the current user, and optionally how everyone did on the questions of one of their exams
+    ---
+    tags:
+      - Exam
+    security:
+      - Bearer: []
+    parameters:
+      - name: session_id
+        in: query
+        type: integer
+        required: false
+        description: A submitted (or archived) session of this user; adds per-question statistics in paper order
+    responses:
+      200:
+        description: Counters maintained as exams are graded (they lag grading by up to AGGREGATES_FLUSH_SECONDS)
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                user:
+                  type: object
+                  properties:
+                    exams: {type: integer}
+                    average_score: {type: number}
+                    best_score: {type: integer}
+                    last_score: {type: integer}
+                    last_session_id: {type: integer}
+                    last_submitted_at: {type: string}
+                questions:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      question_id: {type: integer}
+                      graded: {type: integer}
+                      answered: {type: integer}
+                      percent_correct: {type: number}
+                      chosen: {type: object}
+      401:
+        description: Unauthorized, missing or invalid token
+      404:
+        description: No such submitted session for this user
+    """
+    uid = int(get_jwt_identity())
+    body = {"user": user_stats(uid)}
+    session_id = request.args.get("session_id", type=int)
+    if session_id is not None:
+        # only questions the user has already been graded on, so the answer
+        # distribution never leaks ahead of an exam
+        session = db.session.get(ExamSession, session_id)
+        if session is None:
+            archived = db.session.get(ArchivedSession, session_id)
+            if not archived or archived.user_id != uid:
+                return jsonify({"error": "not found"}), 404
+            question_ids = read_archived(archived)[0]
+        elif session.user_id != uid or not session.submitted:
+            return jsonify({"error": "not found"}), 404
+        else:
+            question_ids = db.session.scalars(
+                select(ExamQuestion.question_id)
+                .where(ExamQuestion.exam_session_id == session_id)
+                .order_by(ExamQuestion.id)
+            ).all()
+        body["questions"] = question_stats(question_ids)
+    return jsonify(body), 200
+
+
+@bp.route("/<int:session_id>", methods=["GET"])
+@jwt_required()
+def get_exam(session_id):
+    """
+    Fetch the questions of an exam session again (e.g. after a page refresh)
+    ---
+    tags:
+      - Exam
+    security:
+      - Bearer: []
+    parameters:
+      - name: session_id
+        in: path
+        type: integer
+        required: true
+      - name: If-None-Match
+        in: header
+        type: string
+        required: false
+        description: ETag from an earlier response; answered with 304 while the paper is unchanged
+    responses:
+      200:
+        description: Same body as /start; carries a strong ETag and is gzip-encoded when accepted and large enough
+        headers:
+          ETag:
+            type: string
+          Cache-Control:
+            type: string
+      304:
+        description: The cached copy identified by If-None-Match is still current
+      401:
+        description: Unauthorized, missing or invalid token
+      404:
+        description: No such session for this user
+    """
+    session = db.session.get(ExamSession, session_id)
+    if not session or str(session.user_id) != get_jwt_identity():
+        return jsonify({"error": "not found"}), 404
+    question_ids = db.session.scalars(
+        select(ExamQuestion.question_id)
+        .where(ExamQuestion.exam_session_id == session_id)
+        .order_by(ExamQuestion.id)
+    ).all()
+
+    bank = question_bank.snapshot()
+    question_ids = [qid for qid in question_ids if qid in bank.fragments]
+    # strong validator: same session, deadline and question versions
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(b"%d|%s|" % (session_id, session.expires_at.isoformat().encode() if session.expires_at else b""))
+    for qid in question_ids:
+        digest.update(b"%d:%s;" % (qid, bank.versions[qid].encode()))
+    etag = digest.hexdigest()
+    headers = {"Cache-Control": "private, no-cache", "Vary": "Authorization, Accept-Encoding"}
+
+    matched = compressor.etag_matches(etag)
+    if matched:
+        # the validator of the variant the client holds, not the bare tag
+        response = current_app.response_class(status=304, headers=headers)
+        response.set_etag(matched)
+        return response
+    expires_at = session.expires_at or exam_expiry.deadline_for(session.start_time)
+    response = _paper_response(session_id, expires_at, [bank.fragments[qid] for qid in question_ids], etag)
+    response.headers.update(headers)
+    return response
+
+
+@bp.route("/answer", methods=["POST"])
+@jwt_required()
+def save_answer():
+    """
+    Autosave a single answer during an exam
+    ---
+    tags:
+      - Exam
+    security:
+      - Bearer: []
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              session_id:
+                type: integer
+                example: 12
+              question_id:
+                type: integer
+                example: 3
+              chosen_option:
+                type: string
+                enum: [A, B, C, D]
+                example: "A"
+    responses:
+      202:
+        description: Answer accepted; it is written in the next batch (AUTOSAVE_FLUSH_SECONDS) and overwrites any earlier answer to the question
+      400:
+        description: Invalid or already submitted session, a question outside the exam, or past the deadline
+      401:
+        description: Unauthorized, missing or invalid token
+    """
+    data = request.get_json(force=True)
+    session_id = data.get("session_id")
+    question_id = data.get("question_id")
+    chosen = data.get("chosen_option")
+
+    entry = answer_buffer.sessions.get(session_id) if isinstance(session_id, int) else None
+    if not entry or entry[0] != get_jwt_identity():
+        return jsonify({"error": "invalid or already submitted"}), 400
+    if not isinstance(question_id, int) or question_id not in entry[1] or chosen not in VALID_OPTIONS:
+        return jsonify({"error": "invalid answer"}), 400
+    # the deadline from the entry: this worker may not have scheduled the session
+    if exam_expiry.is_late(session_id, entry[2]):
+        return jsonify({"error": "exam time is over"}), 400
+
+    answer_buffer.record(session_id, question_id, chosen)
+    return jsonify({"message": "saved"}), 202
+
+
 @bp.route("/submit", methods=["POST"])
 @jwt_required()
 def submit_exam():
@@ -125,7 +420,7 @@ def submit_exam():
                       example: "A"
     responses:
       200:
-        description: Exam submitted successfully with calculated score
+        description: Exam submitted successfully with calculated score (EXAM_SUBMIT_MODE=sync). Answers saved through /answer count too; answers in this payload override them
         content:
           application/json:
             schema:
@@ -137,36 +432,122 @@ def submit_exam():
                 score:
                   type: integer
                   example: 8
+      202:
+        description: Submission stored and queued for grading (EXAM_SUBMIT_MODE=async); poll status_url for the score
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: "queued"
+                ticket:
+                  type: integer
+                  example: 41
+                status_url:
+                  type: string
+                  example: "/api/exam/submissions/41"
       400:
-        description: Invalid or already submitted session
+        description: Invalid or already submitted session, an answer outside the exam, or past the deadline (expires_at plus EXAM_GRACE_SECONDS)
       401:
         description: Unauthorized, missing or invalid token
     """
     data = request.get_json(force=True)
     session_id = data.get("session_id")
-    answers = data.get("answers")
+    answers = data.get("answers") or []
 
-    session = ExamSession.query.get(session_id)
-    if not session or session.submitted:
+    session = db.session.get(ExamSession, session_id) if session_id else None
+    if not session or session.submitted or str(session.user_id) != get_jwt_identity():
         return jsonify({"error": "invalid or already submitted"}), 400
+    if exam_expiry.is_late(session.id, session.expires_at):
+        return jsonify({"error": "exam time is over"}), 400
+    # autosaved answers still in the buffer; the payload wins on conflicts
+    buffered = answer_buffer.take(session.id)
+    if isinstance(answers, list):
+        answers = buffered + answers
 
-    score = 0
-    for ans in answers:
-        q = Question.query.get(ans["question_id"])
-        chosen = ans["chosen_option"]
+    if current_app.config.get("EXAM_SUBMIT_MODE") == "async":
+        try:
+            chosen = normalize_answers(answers)
+        except InvalidSubmission as e:
+            answer_buffer.restore(session.id, buffered)
+            return jsonify({"error": str(e)}), 400
+        # reject answers outside the exam now, as the sync path does, rather
+        # than in the worker after the ticket has been handed out
+        paper = set(db.session.scalars(
+            select(ExamQuestion.question_id).where(ExamQuestion.exam_session_id == session.id)
+        ))
+        outside = next((qid for qid in chosen if qid not in paper), None)
+        if outside is not None:
+            answer_buffer.restore(session.id, buffered)
+            return jsonify({"error": f"question {outside} is not part of this exam"}), 400
+        try:
+            submission = grading_queue.enqueue(
+                session, [{"question_id": q, "chosen_option": c} for q, c in chosen.items()]
+            )
+        except IntegrityError:
+            db.session.rollback()
+            answer_buffer.restore(session.id, buffered)
+            return jsonify({"error": "invalid or already submitted"}), 400
+        answer_buffer.sessions.close(session.id)
+        exam_expiry.discard(session.id)
+        status_url = url_for("exam.submission_status", ticket=submission.id)
+        return jsonify({"message": "queued", "ticket": submission.id, "status_url": status_url}), 202, {
+            "Location": status_url,
+        }
 
-        answer = Answer(
-            exam_session_id=session.id,
-            question_id=q.id,
-            chosen_option=chosen
-        )
-        db.session.add(answer)
+    result = grade_sessions({session.id: answers})[session.id]
+    if isinstance(result, InvalidSubmission):
+        db.session.rollback()
+        answer_buffer.restore(session.id, buffered)
+        return jsonify({"error": str(result)}), 400
+    db.session.commit()
+    answer_buffer.sessions.close(session.id)
+    exam_expiry.discard(session.id)
 
-        if q.correct_option == chosen:
-            score += 1
+    return jsonify({"message": "submitted", "score": result}), 200
 
-    session.score = score
-    session.submitted = True
-    db.session.commit()
 
-    return jsonify({"message": "submitted", "score": score}), 200
+@bp.route("/submissions/<int:ticket>", methods=["GET"])
+@jwt_required()
+def submission_status(ticket):
+    """
+    Grading status of a queued submission
+    ---
+    tags:
+      - Exam
+    security:
+      - Bearer: []
+    parameters:
+      - name: ticket
+        in: path
+        type: integer
+        required: true
+      - name: wait
+        in: query
+        type: number
+        required: false
+        description: Long-poll for up to this many seconds until grading finishes
+    responses:
+      200:
+        description: Current status; score is set once status is "graded"
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                ticket: {type: integer}
+                session_id: {type: integer}
+                status: {type: string, enum: [queued, grading, graded, rejected]}
+                score: {type: integer}
+                error: {type: string}
+      404:
+        description: No such submission for this user
+    """
+    max_wait = current_app.config.get("EXAM_SUBMIT_LONG_POLL_MAX_SECONDS", 25)
+    wait = min(max(request.args.get("wait", 0, type=float), 0), max_wait)
+    submission = grading_queue.wait(ticket, wait)
+    if not submission or str(submission.user_id) != get_jwt_identity():
+        return jsonify({"error": "not found"}), 404
+    return jsonify(submission.to_public()), 200
@@ -0,0 +1,245 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+
+from .metrics import metrics
+
+log = logging.getLogger(__name__)
+
+READ_METHODS = frozenset(("GET", "HEAD"))
+_forced_reads = contextvars.ContextVar("replica_reads", default=False)
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends plain SELECTs to a read replica
+    when ``replica_router`` allows it and everything else to the primary.
+
+    A transaction that has written anything reads from the primary from
+    then on, so it always sees its own changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or not replica_router.replicas or engine is not self._db.engines.get(None):
+            return engine
+        if self._flushing or clause is None or not getattr(clause, "is_select", False) \
+                or getattr(clause, "_for_update_arg", None) is not None:
+            if self._flushing or getattr(clause, "is_dml", False):
+                self.info["db_wrote"] = True
+            return engine
+        if self.info.get("db_wrote") or not replica_router.read_mode():
+            return engine
+        replica = self.info.get("db_replica")
+        if replica is None:
+            replica = self.info["db_replica"] = replica_router.pin(self) or engine
+        return replica
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _stick_to_primary(session):
+    if session.info.pop("db_wrote", False):
+        replica_router.wrote()
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_writes(session):
+    session.info.pop("db_wrote", None)
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _unpin_replica(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("db_replica", None)
+
+
+class ReplicaRouter:
+    """Read/write split across the primary and DATABASE_REPLICA_URLS.
+
+    Reads go to a replica only for GET/HEAD requests (and inside
+    ``replica_reads()`` blocks); one replica is pinned per transaction so a
+    request sees a single snapshot. After a commit that wrote something,
+    reads stay on the primary for the rest of the request and, for
+    ``sticky_seconds``, for later requests of the same user (the JWT
+    identity) or client address, tracked in the shared store so every
+    worker sees it. A replica that fails to connect, fails
+    its periodic ``SELECT 1`` or lags more than ``max_lag`` seconds is
+    skipped until a health check passes again; with none left, reads fall
+    back to the primary.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.replicas = []  # (name, engine)
+        self.sticky_seconds = 5.0
+        self.health_interval = 5.0
+        self.max_lag = 0.0
+        self._down = {}  # name -> reason
+        self._next = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.replica_reads_started = 0
+        self.failovers = 0
+
+    def init_app(self, app, db):
+        # after db.init_app: replicas are the replica_* binds
+        self.app = app
+        self.sticky_seconds = float(app.config.get("REPLICA_STICKY_SECONDS", self.sticky_seconds))
+        self.health_interval = float(app.config.get("REPLICA_HEALTH_INTERVAL_SECONDS", self.health_interval))
+        self.max_lag = float(app.config.get("REPLICA_MAX_LAG_SECONDS", self.max_lag))
+        with app.app_context():
+            self.replicas = sorted(
+                (key, engine) for key, engine in db.engines.items() if key and key.startswith("replica_")
+            )
+        app.extensions["replica_router"] = self
+        metrics.gauge("db_replica_healthy", "1 while a read replica takes reads, 0 while it is skipped.",
+                      lambda: {(("replica", name),): int(name not in self._down) for name, _ in self.replicas})
+
+    # -- routing ------------------------------------------------------------
+
+    def read_mode(self) -> bool:
+        if _forced_reads.get():
+            return True
+        if not has_request_context() or request.method not in READ_METHODS:
+            return False
+        sticky = g.get("_db_sticky")
+        if sticky is None:
+            store = self._store()
+            sticky = g._db_sticky = any(store.get(key) for key in self._sticky_keys())
+        return not sticky
+
+    def pin(self, session):
+        """Connect ``session`` to the next healthy replica; None if none is up."""
+        self._ensure_checker()
+        with self._lock:
+            healthy = [(name, engine) for name, engine in self.replicas if name not in self._down]
+            self._next += 1
+            start = self._next
+        for i in range(len(healthy)):
+            name, engine = healthy[(start + i) % len(healthy)]
+            try:
+                session.connection(bind_arguments={"bind": engine})
+            except DBAPIError as e:
+                self.mark_down(name, f"connect failed: {e.orig!r}")
+                continue
+            self.replica_reads_started += 1
+            return engine
+        return None
+
+    def wrote(self):
+        if not has_request_context():
+            return
+        g._db_sticky = g._db_wrote = True
+        if self.sticky_seconds > 0:
+            store = self._store()
+            for key in self._sticky_keys():
+                store.set(key, 1, self.sticky_seconds)
+
+    def identify(self, user_id):
+        """Name the user of a request that has no token yet (register,
+        login): writes it made, or makes later, keep that user's next
+        requests on the primary, not just this client address's."""
+        if not has_request_context():
+            return
+        g._db_identity = str(user_id)
+        if g.get("_db_wrote") and self.sticky_seconds > 0:
+            self._store().set(f"db:sticky:user:{user_id}", 1, self.sticky_seconds)
+
+    @contextmanager
+    def replica_reads(self):
+        """Let reads in this block use a replica outside GET requests (e.g.
+        the question bank load, which tolerates replication lag)."""
+        token = _forced_reads.set(True)
+        try:
+            yield
+        finally:
+            _forced_reads.reset(token)
+
+    def _sticky_keys(self):
+        # the user (token identity, or one named by identify()) and the
+        # client address: a write made before login still counts once the
+        # same client reads with its new token
+        try:
+            who = get_jwt_identity()
+        except RuntimeError:  # no verified token in this request
+            who = g.get("_db_identity")
+        keys = [f"db:sticky:addr:{request.remote_addr}"]
+        if who is not None:
+            keys.insert(0, f"db:sticky:user:{who}")
+        return keys
+
+    def _store(self):
+        return current_app.extensions["shared_store"]
+
+    # -- health -------------------------------------------------------------
+
+    def mark_down(self, name, reason):
+        with self._lock:
+            if name not in self._down:
+                self.failovers += 1
+                log.warning("read replica %s skipped: %s", name, reason)
+            self._down[name] = reason
+
+    def check(self):
+        """Probe every replica once; returns name -> problem or None."""
+        results = {}
+        for name, engine in self.replicas:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                    lag = self._lag(conn) if self.max_lag else 0.0
+                problem = f"lagging {lag:.1f}s" if lag > self.max_lag else None
+            except DBAPIError as e:
+                problem = f"health check failed: {e.orig!r}"
+            results[name] = problem
+            if problem:
+                self.mark_down(name, problem)
+            else:
+                with self._lock:
+                    if self._down.pop(name, None) is not None:
+                        log.info("read replica %s is back", name)
+        return results
+
+    @staticmethod
+    def _lag(conn) -> float:
+        if conn.dialect.name != "postgresql":
+            return 0.0
+        lag = conn.execute(text("SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())")).scalar()
+        return float(lag or 0.0)  # NULL when the server is not replaying
+
+    def _ensure_checker(self):
+        # the checker thread does not survive a fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._check_loop, name="replica-health", daemon=True)
+                self._thread.start()
+
+    def _check_loop(self):
+        while True:
+            time.sleep(self.health_interval)
+            try:
+                self.check()
+            except Exception:
+                log.exception("replica health check failed")
+
+    def stats(self) -> dict:
+        return {
+            "replicas": {name: self._down.get(name, "ok") for name, _ in self.replicas},
+            "replica_transactions": self.replica_reads_started,
+            "failovers": self.failovers,
+        }
+
+
+replica_router = ReplicaRouter()
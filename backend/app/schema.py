@@ -0,0 +1,44 @@
+import zlib
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from .extensions import db
+
+LOCK_NAME = "exam_backend_schema"
+LOCK_KEY = zlib.crc32(LOCK_NAME.encode())  # pg_advisory_xact_lock takes a bigint
+
+
+def init_schema():
+    """Create missing tables on the primary (DB_CREATE_ALL), under a
+    database-wide lock so processes booting at once do not race on the DDL.
+
+    Replicas (replica_* binds) are never touched. Deployments that run
+    ``flask --app manage db upgrade`` as a release step set DB_CREATE_ALL=false
+    and skip this entirely.
+    """
+    from . import models  # noqa: registers the tables
+
+    with db.engines[None].connect() as conn:
+        with _schema_lock(conn):
+            db.metadata.create_all(conn)
+            conn.commit()
+
+
+@contextmanager
+def _schema_lock(conn):
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        # held until the DDL's transaction commits
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+        yield
+    elif dialect == "mysql":
+        # DDL commits implicitly in MySQL, so take a session lock instead
+        conn.execute(text("SELECT GET_LOCK(:name, 60)"), {"name": LOCK_NAME})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+    else:
+        # SQLite serializes writers on the file itself
+        yield
@@ -1,10 +1,11 @@
 import hashlib
+from functools import lru_cache
 from typing import Optional
 from passlib.hash import bcrypt
-from cryptography.fernet import Fernet, InvalidToken
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 
-def hash_password(plain: str) -> str:
-    return bcrypt.using(rounds=12).hash(plain)
+def hash_password(plain: str, rounds: int = 12) -> str:
+    return bcrypt.using(rounds=rounds).hash(plain)
 
 def verify_password(plain: str, hashed: str) -> bool:
     try:
@@ -16,13 +17,57 @@ def email_fingerprint(email: str) -> str:
     canon = email.strip().lower().encode("utf-8")
     return hashlib.sha256(canon).hexdigest()
 
+@lru_cache(maxsize=8)
+def _fernet(key) -> Fernet:
+    return Fernet(key.encode() if isinstance(key, str) else key)
+
 def encrypt_email(email: str, key: str) -> bytes:
-    f = Fernet(key.encode() if isinstance(key, str) else key)
-    return f.encrypt(email.encode("utf-8"))
+    return _fernet(key).encrypt(email.encode("utf-8"))
 
 def decrypt_email(token: bytes, key: str) -> Optional[str]:
     try:
-        f = Fernet(key.encode() if isinstance(key, str) else key)
-        return f.decrypt(token).decode("utf-8")
+        return _fernet(key).decrypt(token).decode("utf-8")
     except (InvalidToken, Exception):
         return None
+
+
+class EmailKeyRing:
+    """Fernet keys for email encryption, built once per app.
+
+    The first key encrypts; every key (current first, then retired ones) is
+    tried on decrypt, so EMAIL_ENC_KEY can be rotated by moving the old value
+    to EMAIL_ENC_OLD_KEYS and re-encrypting rows with ``rotate``.
+    """
+
+    def __init__(self, keys):
+        self._fernet = MultiFernet([_fernet(k) for k in keys])
+
+    def encrypt(self, email: str) -> bytes:
+        return self._fernet.encrypt(email.encode("utf-8"))
+
+    def decrypt(self, token: bytes) -> Optional[str]:
+        try:
+            return self._fernet.decrypt(token).decode("utf-8")
+        except (InvalidToken, Exception):
+            return None
+
+    def decrypt_many(self, tokens) -> list[Optional[str]]:
+        decrypt = self._fernet.decrypt
+        out = []
+        for token in tokens:
+            try:
+                out.append(decrypt(token).decode("utf-8"))
+            except (InvalidToken, Exception):
+                out.append(None)
+        return out
+
+    def rotate(self, token: bytes) -> bytes:
+        return self._fernet.rotate(token)
+
+
+def init_keyring(app):
+    key = app.config.get("EMAIL_ENC_KEY")
+    if not key:
+        return
+    old = [k.strip() for k in (app.config.get("EMAIL_ENC_OLD_KEYS") or "").split(",") if k.strip()]
+    app.extensions["email_keyring"] = EmailKeyRing([key, *old])
@@ -0,0 +1,78 @@
+"""Shared helpers for the benchmark scripts.
+
+Run the scripts from the backend directory, e.g.
+``python -m benchmarks.bench_exam_start``. They build the real app
+against a throwaway SQLite database, so no .env is needed.
+"""
+import importlib.util
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def load_app(db_url=None, **config):
+    """Import app.py with a local database and return the Flask app."""
+    if db_url is None:
+        db_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    os.environ.setdefault("JWT_SECRET", "bench-secret-bench-secret-bench-secret")
+    os.environ.setdefault("FLASK_SECRET", "bench-secret")
+    os.environ.setdefault("EMAIL_ENC_KEY", "q4u0CPzVyqx0W1C8X0bH1l6bJQ1rG3zqg7m6Kx5bZ8c=")
+    os.environ["DATABASE_URL"] = db_url
+    for key, value in config.items():
+        os.environ[key] = str(value)
+
+    spec = importlib.util.spec_from_file_location("app_main", BACKEND_DIR / "app.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def seed_questions(n, start=0):
+    from sqlalchemy import insert
+    from app.extensions import db
+    from app.models import Question
+
+    rows = [
+        {
+            "question_text": f"Question {i}: what is {i} + {i}?",
+            "option_a": str(2 * i),
+            "option_b": str(2 * i + 1),
+            "option_c": str(2 * i - 1),
+            "option_d": str(i),
+            "correct_option": "A",
+            "topic": f"topic-{i % 5}",
+            "difficulty": 1 + i % 3,
+        }
+        for i in range(start, start + n)
+    ]
+    for lo in range(0, len(rows), 5000):
+        db.session.execute(insert(Question), rows[lo:lo + 5000])
+    db.session.commit()
+
+
+def auth_header(user_id):
+    from flask_jwt_extended import create_access_token
+
+    return {"Authorization": "Bearer " + create_access_token(identity=str(user_id))}
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
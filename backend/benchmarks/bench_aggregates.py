@@ -0,0 +1,96 @@
+"""Question statistics and score totals: GROUP BY over the raw tables
+versus the incrementally maintained counter tables. Grades synthetic
+submissions (which feeds the aggregates buffer), then times the flush,
+both ways of answering the stats endpoint's reads, and a full rebuild:
+
+    python -m benchmarks.bench_aggregates --sessions 20000 --questions 30 --users 2000
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import case, func, insert, select
+
+from benchmarks._common import load_app, seed_questions, summarize, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--questions", type=int, default=30, help="Questions per session.")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=500, help="Sessions graded per transaction.")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = load_app(EXAM_EXPIRY_ENABLED="false", AGGREGATES_FLUSH_SECONDS=3600)
+    from app.aggregates import aggregates, question_stats, user_stats
+    from app.extensions import db
+    from app.grading import grade_sessions
+    from app.models import Answer, ExamQuestion, ExamSession, Question, User
+
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {"email_enc": b"x", "email_hash": f"bench-{i}", "password_hash": "x"} for i in range(args.users)
+        ])
+        bank_size = args.questions * 50
+        seed_questions(bank_size)
+        bank = range(1, bank_size + 1)
+        sids = db.session.execute(insert(ExamSession).returning(ExamSession.id), [
+            {"user_id": 1 + i % args.users} for i in range(args.sessions)
+        ]).scalars().all()
+        papers = {sid: random.sample(bank, args.questions) for sid in sids}
+        db.session.execute(insert(ExamQuestion), [
+            {"exam_session_id": sid, "question_id": qid} for sid, qids in papers.items() for qid in qids
+        ])
+        db.session.commit()
+
+        t0 = time.perf_counter()
+        for lo in range(0, len(sids), args.batch):
+            grade_sessions({
+                sid: [{"question_id": q, "chosen_option": random.choice("ABCD")} for q in papers[sid]]
+                for sid in sids[lo:lo + args.batch]
+            })
+            db.session.commit()
+        grade_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        rows = aggregates.flush()
+        flush_ms = (time.perf_counter() - t0) * 1000
+
+        paper = papers[sids[-1]]
+        user_id = 1 + (len(sids) - 1) % args.users
+
+        def group_by():
+            db.session.execute(
+                select(Answer.question_id, func.count(),
+                       func.sum(case((Answer.chosen_option == Question.correct_option, 1), else_=0)))
+                .join(Question, Question.id == Answer.question_id)
+                .where(Answer.question_id.in_(paper))
+                .group_by(Answer.question_id)
+            ).all()
+            db.session.execute(
+                select(func.count(), func.sum(ExamSession.score), func.max(ExamSession.score))
+                .where(ExamSession.user_id == user_id, ExamSession.submitted.is_(True))
+            ).one()
+            db.session.rollback()
+
+        def counters():
+            question_stats(paper)
+            user_stats(user_id)
+            db.session.rollback()
+
+        print(f"{args.sessions} sessions x {args.questions} questions, {args.users} users")
+        print(f"grading {grade_s * 1000 / len(sids):.3f} ms/session incl. counter bookkeeping; "
+              f"flush of {rows} counter rows {flush_ms:.1f} ms")
+        for name, fn in (("GROUP BY", group_by), ("counters", counters)):
+            print(f"  {name:<9} {summarize(timed(fn, args.repeat))}")
+
+        t0 = time.perf_counter()
+        result = app.test_cli_runner().invoke(args=["exam", "rebuild-stats", "--chunk-size", "5000"])
+        if result.exit_code:
+            raise SystemExit(result.output)
+        print(f"rebuild-stats {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
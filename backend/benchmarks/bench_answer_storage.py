@@ -0,0 +1,98 @@
+"""Answer storage: one answers row per answer versus a packed record per
+session. Grades the same synthetic submissions in both modes and reports
+bytes on disk (SQLite dbstat), grading time and a full scoring scan:
+
+    python -m benchmarks.bench_answer_storage --sessions 20000 --questions 30
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import insert, select, text
+
+from benchmarks._common import load_app, seed_questions
+
+
+def table_bytes():
+    from app.extensions import db
+
+    rows = db.session.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")).all()
+    return {name: size for name, size in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--questions", type=int, default=30, help="Answers per session.")
+    parser.add_argument("--batch", type=int, default=500, help="Sessions graded per transaction.")
+    args = parser.parse_args()
+
+    app = load_app(EXAM_EXPIRY_ENABLED="false")
+    import numpy as np
+    from app.extensions import db
+    from app.grading import grade_sessions
+    from app.models import Answer, ExamQuestion, ExamSession, User
+    from app.packed import score_packed
+    from app.regrade import load_key_array, option_codes, score_chunk
+
+    with app.app_context():
+        db.session.add(User(email_enc=b"x", email_hash="bench", password_hash="x"))
+        seed_questions(args.questions * 50)
+        db.session.commit()
+        key = load_key_array()
+        bank = range(1, args.questions * 50 + 1)
+
+        print(f"{args.sessions} sessions x {args.questions} answers")
+        print(f"{'storage':<8} {'bytes':>12} {'bytes/answer':>13} {'grade/session':>14} {'scan':>9}")
+        for mode in ("rows", "packed"):
+            app.config["ANSWER_STORAGE"] = mode
+            first = db.session.execute(insert(ExamSession).returning(ExamSession.id), [
+                {"user_id": 1, "answer_ids": b"" if mode == "packed" else None,
+                 "answer_codes": b"" if mode == "packed" else None} for _ in range(args.sessions)
+            ]).scalars().all()
+            papers = {sid: random.sample(bank, args.questions) for sid in first}
+            db.session.execute(insert(ExamQuestion), [
+                {"exam_session_id": sid, "question_id": qid} for sid, qids in papers.items() for qid in qids
+            ])
+            db.session.commit()
+            before = table_bytes()
+
+            t0 = time.perf_counter()
+            sids = list(papers)
+            for lo in range(0, len(sids), args.batch):
+                grade_sessions({
+                    sid: [{"question_id": q, "chosen_option": random.choice("ABCD")} for q in papers[sid]]
+                    for sid in sids[lo:lo + args.batch]
+                })
+                db.session.commit()
+            grade_ms = (time.perf_counter() - t0) * 1000 / len(sids)
+            after = table_bytes()
+            grown = sum(after.get(name, 0) - before.get(name, 0)
+                        for name in after if name == "exam_sessions" or "answers" in name)
+
+            t0 = time.perf_counter()
+            if mode == "rows":
+                rows = db.session.execute(
+                    select(Answer.exam_session_id, Answer.question_id, Answer.chosen_option)
+                    .where(Answer.exam_session_id.between(sids[0], sids[-1])).order_by(Answer.id)
+                ).all()
+                s, q, c = zip(*rows)
+                scores = score_chunk(key, sids, s, q, option_codes(c))
+            else:
+                records = db.session.execute(
+                    select(ExamSession.answer_ids, ExamSession.answer_codes)
+                    .where(ExamSession.id.between(sids[0], sids[-1])).order_by(ExamSession.id)
+                ).all()
+                scores = score_packed(key, records)
+            scan_ms = (time.perf_counter() - t0) * 1000
+            stored = db.session.scalars(
+                select(ExamSession.score).where(ExamSession.id.between(sids[0], sids[-1])).order_by(ExamSession.id)
+            ).all()
+            assert np.array_equal(scores, np.asarray(stored)), "scan disagrees with graded scores"
+
+            print(f"{mode:<8} {grown:>12,} {grown / (len(sids) * args.questions):>13.1f}"
+                  f" {grade_ms:>12.3f}ms {scan_ms:>7.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Archival of finished sessions: grades synthetic submissions, backdates
+them, runs ``flask exam archive`` and reports its throughput, the hot
+tables' on-disk bytes before and after (SQLite dbstat, after VACUUM) and
+/api/exam/history latency for a user whose sessions are now archived:
+
+    python -m benchmarks.bench_archive --sessions 20000 --questions 30
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text, update
+
+from benchmarks._common import auth_header, load_app, seed_questions, summarize, timed
+
+TABLES = ("exam_sessions", "exam_questions", "answers", "archived_sessions", "archive_segments")
+
+
+def table_bytes():
+    from app.extensions import db
+
+    db.session.commit()
+    with db.engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql("VACUUM")
+    rows = db.session.execute(text(
+        "SELECT m.tbl_name, SUM(d.pgsize) FROM dbstat d JOIN sqlite_master m ON m.name = d.name GROUP BY m.tbl_name"
+    )).all()
+    db.session.rollback()
+    return {name: size for name, size in rows if name in TABLES}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--questions", type=int, default=30)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--storage", choices=("rows", "packed"), default="rows")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    app = load_app(EXAM_EXPIRY_ENABLED="false", ANSWER_STORAGE=args.storage, AGGREGATES_FLUSH_SECONDS=3600)
+    from app.extensions import db
+    from app.grading import grade_sessions
+    from app.models import ExamQuestion, ExamSession, User
+
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {"email_enc": b"x", "email_hash": f"bench-{i}", "password_hash": "x"} for i in range(args.users)
+        ])
+        seed_questions(args.questions * 50)
+        bank = range(1, args.questions * 50 + 1)
+        blob = b"" if args.storage == "packed" else None
+        sids = db.session.execute(insert(ExamSession).returning(ExamSession.id), [
+            {"user_id": 1 + i % args.users, "answer_ids": blob, "answer_codes": blob} for i in range(args.sessions)
+        ]).scalars().all()
+        papers = {sid: random.sample(bank, args.questions) for sid in sids}
+        db.session.execute(insert(ExamQuestion), [
+            {"exam_session_id": sid, "question_id": qid} for sid, qids in papers.items() for qid in qids
+        ])
+        for lo in range(0, len(sids), 500):
+            grade_sessions({
+                sid: [{"question_id": q, "chosen_option": random.choice("ABCD")} for q in papers[sid]]
+                for sid in sids[lo:lo + 500]
+            })
+            db.session.commit()
+        old = datetime.utcnow() - timedelta(days=400)
+        db.session.execute(update(ExamSession).values(start_time=old, end_time=old))
+        db.session.commit()
+        headers = auth_header(1)
+        before = table_bytes()
+
+    client = app.test_client()
+    history = lambda: client.get("/api/exam/history?limit=20", headers=headers)  # noqa: E731
+    hot_history = summarize(timed(history, args.repeat))
+
+    t0 = time.perf_counter()
+    result = app.test_cli_runner().invoke(args=["exam", "archive", "--chunk-size", str(args.chunk_size)])
+    if result.exit_code:
+        raise SystemExit(result.output)
+    elapsed = time.perf_counter() - t0
+    archived_history = summarize(timed(history, args.repeat))
+
+    with app.app_context():
+        after = table_bytes()
+
+    print(f"{args.sessions} sessions x {args.questions} answers ({args.storage} storage)")
+    print("\n".join(result.output.strip().splitlines()[-3:]))
+    print(f"archive run {elapsed:.1f}s, {args.sessions / elapsed:,.0f} sessions/s")
+    print(f"{'table':<18} {'before':>12} {'after':>12}")
+    for name in TABLES:
+        print(f"{name:<18} {before.get(name, 0):>12,} {after.get(name, 0):>12,}")
+    print(f"{'total':<18} {sum(before.values()):>12,} {sum(after.values()):>12,}")
+    print(f"history page, hot:      {hot_history}")
+    print(f"history page, archived: {archived_history}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Answer rows written during the end-of-exam submit burst, with and
+without autosave.
+
+Every simulated candidate starts an exam and answers it; then all of them
+submit at once, as happens at a fixed exam deadline. Without autosave the
+whole answer sheet is written by the submit burst. With autosave the
+answers were sent one by one through /api/exam/answer while the exam ran
+and flushed in batches by the write-behind buffer, so the burst only grades
+what is stored:
+
+    python -m benchmarks.bench_autosave --candidates 200 --questions 50
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import event
+
+from benchmarks._common import auth_header, load_app, seed_questions
+
+
+def run(app, candidates, autosave):
+    from app.autosave import answer_buffer
+    from app.extensions import db
+    from app.models import User
+
+    written = {"rows": 0}
+
+    def count_answer_rows(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("INSERT INTO ANSWERS"):
+            written["rows"] += len(parameters) if executemany else 1
+
+    with app.app_context():
+        first = db.session.query(User).count() + 1
+        db.session.add_all(
+            User(email_enc=b"x", email_hash=f"bench-{autosave}-{i}", password_hash="x") for i in range(candidates)
+        )
+        db.session.commit()
+        client = app.test_client()
+        sheets = []
+        for uid in range(first, first + candidates):
+            headers = auth_header(uid)
+            paper = client.post("/api/exam/start", headers=headers).get_json()
+            answers = [{"question_id": q["id"], "chosen_option": random.choice("ABCD")} for q in paper["questions"]]
+            sheets.append((headers, paper["session_id"], answers))
+
+        event.listen(db.engine, "before_cursor_execute", count_answer_rows)
+        if autosave:
+            t0 = time.perf_counter()
+            for headers, session_id, answers in sheets:
+                for ans in answers:
+                    resp = client.post("/api/exam/answer", headers=headers, json={"session_id": session_id, **ans})
+                    assert resp.status_code == 202, resp.get_json()
+            answer_buffer.flush()
+            during = written["rows"], time.perf_counter() - t0
+        else:
+            during = 0, 0.0
+
+        written["rows"] = 0
+        t0 = time.perf_counter()
+        for headers, session_id, answers in sheets:
+            # the final payload repeats every answer; unchanged ones are not rewritten
+            resp = client.post("/api/exam/submit", headers=headers, json={"session_id": session_id, "answers": answers})
+            assert resp.status_code == 200, resp.get_json()
+        burst = written["rows"], time.perf_counter() - t0
+        event.remove(db.engine, "before_cursor_execute", count_answer_rows)
+    return during, burst
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candidates", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=50, help="Questions per exam.")
+    args = parser.parse_args()
+
+    # flushes are driven by the benchmark, not the background timer
+    app = load_app(EXAM_QUESTION_COUNT=args.questions, AUTOSAVE_FLUSH_SECONDS=3600,
+                   AUTOSAVE_FLUSH_SIZE=10 * args.questions * args.candidates)
+    with app.app_context():
+        seed_questions(args.questions * 20)
+
+    print(f"{args.candidates} candidates x {args.questions} answers, all submitting together")
+    print(f"{'mode':<10} {'rows during exam':>17} {'rows at submit':>15} {'submit burst':>13} {'rows/s at submit':>17}")
+    for autosave in (False, True):
+        (during_rows, _), (burst_rows, burst_s) = run(app, args.candidates, autosave)
+        print(f"{'autosave' if autosave else 'submit':<10} {during_rows:>17} {burst_rows:>15}"
+              f" {burst_s * 1000:>11.1f}ms {burst_rows / burst_s:>17,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Pre-fork server start-up: boots gunicorn (gunicorn.conf.py, wsgi:app) the
+old way and the new way and reports the time until every worker has
+loaded the app, the time to add one worker (SIGTTIN) and per-worker memory:
+
+* ``legacy``: every worker imports and builds the app itself, with
+  db.create_all() and Swagger on each boot;
+* ``preload``: the master builds the app once and forks the workers from
+  it, schema left to migrations (DB_CREATE_ALL=false), Swagger off.
+
+RSS counts shared pages in every process that maps them; USS is what the
+worker alone holds and PSS splits shared pages between the processes, so
+the total PSS is the footprint of the whole server:
+
+    python -m benchmarks.bench_cold_start --workers 4
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import psutil
+
+from benchmarks._common import BACKEND_DIR
+
+MODES = {
+    "legacy": {"GUNICORN_PRELOAD": "false", "DB_CREATE_ALL": "true", "SWAGGER_ENABLED": "true"},
+    "preload": {"GUNICORN_PRELOAD": "true", "DB_CREATE_ALL": "false", "SWAGGER_ENABLED": "false"},
+}
+
+# gunicorn.conf.py plus a hook that reports each worker once its app is loaded
+CONFIG = """\
+exec(compile(open({conf!r}).read(), {conf!r}, "exec"))
+
+
+def post_worker_init(worker):
+    open(os.path.join({ready!r}, str(os.getpid())), "w").close()
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(ready_dir, n, timeout=120):
+    deadline = time.monotonic() + timeout
+    while len(os.listdir(ready_dir)) < n:
+        if time.monotonic() > deadline:
+            raise SystemExit(f"only {len(os.listdir(ready_dir))}/{n} workers came up")
+        time.sleep(0.005)
+
+
+def run(mode, args, env):
+    workdir = tempfile.mkdtemp(prefix=f"gunicorn-{mode}-")
+    ready = os.path.join(workdir, "ready")
+    os.mkdir(ready)
+    config = os.path.join(workdir, "gunicorn.conf.py")
+    Path(config).write_text(CONFIG.format(conf=str(BACKEND_DIR / "gunicorn.conf.py"), ready=ready))
+    env = {**env, **MODES[mode], "WEB_CONCURRENCY": str(args.workers), "BIND": f"127.0.0.1:{free_port()}"}
+
+    t0 = time.perf_counter()
+    master = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", config, "wsgi:app"],
+                              cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(ready, args.workers)
+        boot = time.perf_counter() - t0
+        time.sleep(args.settle)
+        proc = psutil.Process(master.pid)
+        workers = [p.memory_full_info() for p in proc.children()]
+        master_mem = proc.memory_full_info()
+
+        t0 = time.perf_counter()
+        master.send_signal(signal.SIGTTIN)
+        wait_ready(ready, args.workers + 1)
+        scale = time.perf_counter() - t0
+    finally:
+        master.terminate()
+        master.wait(30)
+
+    mib = lambda values: sum(values) / len(values) / 2 ** 20  # noqa: E731
+    return {
+        "boot_s": boot,
+        "add_worker_ms": scale * 1000,
+        "worker_rss_mib": mib([m.rss for m in workers]),
+        "worker_uss_mib": mib([m.uss for m in workers]),
+        "worker_pss_mib": mib([m.pss for m in workers]),
+        "total_pss_mib": (master_mem.pss + sum(m.pss for m in workers)) / 2 ** 20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--settle", type=float, default=1.0, help="Seconds to wait before sampling memory.")
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="bench-")
+    env = {
+        **os.environ,
+        "DATABASE_URL": "sqlite:///" + os.path.join(db_dir, "bench.db"),
+        "JWT_SECRET": os.getenv("JWT_SECRET", "bench-secret-bench-secret-bench-secret"),
+        "FLASK_SECRET": os.getenv("FLASK_SECRET", "bench-secret"),
+        "EMAIL_ENC_KEY": os.getenv("EMAIL_ENC_KEY", "q4u0CPzVyqx0W1C8X0bH1l6bJQ1rG3zqg7m6Kx5bZ8c="),
+    }
+    # the release step: schema through the migrations, before any server starts
+    subprocess.run([sys.executable, "-m", "flask", "--app", "manage", "db", "upgrade"], cwd=BACKEND_DIR,
+                   env={**env, "DB_CREATE_ALL": "false"}, check=True, capture_output=True)
+
+    results = {mode: run(mode, args, env) for mode in MODES}
+    print(f"{args.workers} workers")
+    print(f"{'':<16}" + "".join(f"{mode:>10}" for mode in results))
+    for key in results["legacy"]:
+        print(f"{key:<16}" + "".join(f"{r[key]:>10.1f}" for r in results.values()))
+
+
+if __name__ == "__main__":
+    main()
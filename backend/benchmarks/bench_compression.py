@@ -0,0 +1,80 @@
+"""Exam paper responses: bytes on the wire and CPU per response.
+
+Compares the uncompressed body, gzip of the whole body for every response,
+the gzip assembled from cached per-question blocks, and a refresh answered
+304 from the ETag:
+
+    python -m benchmarks.bench_compression --questions 30 --text-bytes 600
+"""
+import argparse
+import gzip
+import random
+import string
+import time
+
+from sqlalchemy import insert
+
+from benchmarks._common import auth_header, load_app
+
+
+def cpu_us(fn, repeat):
+    t0 = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - t0) / repeat * 1e6
+
+
+def prose(n):
+    words = ["".join(random.choices(string.ascii_lowercase, k=random.randint(2, 9))) for _ in range(400)]
+    text = []
+    while sum(len(w) + 1 for w in text) < n:
+        text.append(random.choice(words))
+    return " ".join(text)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=30, help="Questions per exam.")
+    parser.add_argument("--text-bytes", type=int, default=600, help="Approximate length of each question text.")
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args()
+
+    app = load_app(EXAM_QUESTION_COUNT=args.questions)
+    from app.extensions import db
+    from app.models import Question, User
+
+    with app.app_context():
+        db.session.add(User(email_enc=b"x", email_hash="bench", password_hash="x"))
+        db.session.execute(insert(Question), [
+            {"question_text": prose(args.text_bytes), "option_a": prose(40), "option_b": prose(40),
+             "option_c": prose(40), "option_d": prose(40), "correct_option": "A"}
+            for _ in range(args.questions * 20)
+        ])
+        db.session.commit()
+        headers = auth_header(1)
+        client = app.test_client()
+        sid = client.post("/api/exam/start", headers=headers).get_json()["session_id"]
+        url = f"/api/exam/{sid}"
+
+        plain = client.get(url, headers=headers)
+        gzip_headers = {**headers, "Accept-Encoding": "gzip"}
+        assembled = client.get(url, headers=gzip_headers)
+        assert gzip.decompress(assembled.data) == plain.data
+        whole = gzip.compress(plain.data, 6)
+
+        rows = [
+            ("identity", len(plain.data), cpu_us(lambda: client.get(url, headers=headers), args.repeat)),
+            ("gzip whole body", len(whole), cpu_us(lambda: client.get(url, headers=headers), args.repeat)
+             + cpu_us(lambda: gzip.compress(plain.data, 6), args.repeat)),
+            ("gzip cached blocks", len(assembled.data), cpu_us(lambda: client.get(url, headers=gzip_headers), args.repeat)),
+            ("304 revalidation", 0, cpu_us(lambda: client.get(url, headers={**headers, "If-None-Match": plain.headers["ETag"]}),
+                                           args.repeat)),
+        ]
+        print(f"{args.questions} questions of ~{args.text_bytes} bytes; CPU includes the full request")
+        print(f"{'response':<20} {'bytes':>8} {'cpu/req':>10}")
+        for name, size, cpu in rows:
+            print(f"{name:<20} {size:>8} {cpu:>8.0f}us")
+
+
+if __name__ == "__main__":
+    main()
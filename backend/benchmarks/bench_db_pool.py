@@ -0,0 +1,67 @@
+"""Connection pool behaviour when demand exceeds pool size.
+
+Each simulated request checks out a connection, runs a query and holds
+the connection for --hold-ms (standing in for the rest of the request).
+Run it with the pool settings of one worker to size DB_POOL_SIZE and
+DB_MAX_OVERFLOW:
+
+    python -m benchmarks.bench_db_pool --pool-size 5 --max-overflow 0 --threads 5 10 20 40
+"""
+import argparse
+import threading
+import time
+
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import text
+
+from benchmarks._common import load_app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--max-overflow", type=int, default=0)
+    parser.add_argument("--pool-timeout", type=int, default=2)
+    parser.add_argument("--threads", type=int, nargs="+", default=[5, 10, 20, 40])
+    parser.add_argument("--hold-ms", type=float, default=20)
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+
+    app = load_app(DB_POOL_SIZE=args.pool_size, DB_MAX_OVERFLOW=args.max_overflow,
+                   DB_POOL_TIMEOUT=args.pool_timeout)
+    from app.db_metrics import pool_metrics
+    from app.extensions import db
+
+    print(f"pool_size={args.pool_size} max_overflow={args.max_overflow} hold={args.hold_ms}ms")
+    print(f"{'threads':>7}  {'req/s':>8}  {'wait p50':>9}  {'wait p95':>9}  {'wait max':>9}  {'timeouts':>8}")
+    with app.app_context():
+        engine = db.engine
+        for n in args.threads:
+            engine.dispose()
+            pool_metrics.__init__()
+            done = [0]
+            deadline = time.monotonic() + args.seconds
+
+            def worker():
+                while time.monotonic() < deadline:
+                    try:
+                        with engine.connect() as conn:
+                            conn.execute(text("SELECT 1"))
+                            time.sleep(args.hold_ms / 1000)
+                        done[0] += 1
+                    except sa_exc.TimeoutError:
+                        pass
+
+            threads = [threading.Thread(target=worker) for _ in range(n)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            stats = pool_metrics.stats(engine.pool)
+            wait = stats["wait_ms"]
+            print(f"{n:>7}  {done[0] / args.seconds:>8.1f}  {wait['p50']:>7.2f}ms  {wait['p95']:>7.2f}ms"
+                  f"  {wait['max']:>7.2f}ms  {stats['timeouts']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Per-call cost of email decryption and profile serialization.
+
+    python -m benchmarks.bench_email_crypto
+"""
+import argparse
+import timeit
+from datetime import datetime
+
+from cryptography.fernet import Fernet
+
+
+def per_call_us(stmt, number):
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    from app.models import User
+    from app.profiles import public_profile
+    from app.security import EmailKeyRing, decrypt_email
+
+    key = Fernet.generate_key().decode()
+    keyring = EmailKeyRing([key, Fernet.generate_key().decode()])
+    token = keyring.encrypt("student@example.com")
+    tokens = [token] * 100
+    user = User(id=1, email_enc=token, email_hash="x", password_hash="x", full_name="Student",
+                created_at=datetime.utcnow(), updated_at=datetime.utcnow())
+
+    def fresh_fernet_each_call():
+        Fernet(key.encode()).decrypt(token).decode("utf-8")
+
+    def profile_uncached():
+        user.to_public(email_plain=keyring.decrypt(user.email_enc))
+
+    rows = [
+        ("new Fernet per call (old decrypt_email)", per_call_us(fresh_fernet_each_call, args.number)),
+        ("cached Fernet decrypt_email", per_call_us(lambda: decrypt_email(token, key), args.number)),
+        ("EmailKeyRing.decrypt", per_call_us(lambda: keyring.decrypt(token), args.number)),
+        ("EmailKeyRing.decrypt_many, per token", per_call_us(lambda: keyring.decrypt_many(tokens), args.number // 100) / 100),
+        ("to_public + decrypt", per_call_us(profile_uncached, args.number)),
+    ]
+    public_profile(user, keyring)
+    rows.append(("public_profile memo hit", per_call_us(lambda: public_profile(user, keyring), args.number)))
+
+    for label, us in rows:
+        print(f"{label:<42} {us:>9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
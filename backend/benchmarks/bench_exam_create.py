@@ -0,0 +1,43 @@
+"""Statements and latency per exam start as exams get longer.
+
+    python -m benchmarks.bench_exam_create --lengths 10 50 100
+"""
+import argparse
+
+from sqlalchemy import event
+
+from benchmarks._common import auth_header, load_app, seed_questions, summarize, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    app = load_app()
+    from app.extensions import db
+    from app.models import User
+
+    statements = []
+    with app.app_context():
+        db.session.add(User(email_enc=b"x", email_hash="bench", password_hash="x"))
+        db.session.commit()
+        seed_questions(max(args.lengths) * 10)
+        headers = auth_header(1)
+        client = app.test_client()
+        event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+        print(f"{'questions':>9}  {'statements':>10}  {'p50':>9}  {'p95':>9}")
+        for length in args.lengths:
+            app.config["EXAM_QUESTION_COUNT"] = length
+            client.post("/api/exam/start", headers=headers)  # warm the bank
+            statements.clear()
+            client.post("/api/exam/start", headers=headers)
+            per_start = len(statements)
+            stats = summarize(timed(lambda: client.post("/api/exam/start", headers=headers), args.repeat))
+            print(f"{length:>9}  {per_start:>10}  {stats['p50_ms']:>7.3f}ms  {stats['p95_ms']:>7.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Exam start latency as the question bank grows.
+
+Compares the old per-request draw (hydrate every Question, then
+random.sample) with the cached QuestionBank draw, and times the full
+POST /api/exam/start round trip with the cache in place.
+
+    python -m benchmarks.bench_exam_start --sizes 1000 10000 50000
+"""
+import argparse
+import random
+
+from benchmarks._common import auth_header, load_app, seed_questions, summarize, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    app = load_app()
+    from app.models import Question, User
+    from app.extensions import db
+    from app.question_bank import question_bank
+
+    with app.app_context():
+        db.session.add(User(email_enc=b"x", email_hash="bench", password_hash="x"))
+        db.session.commit()
+        headers = auth_header(1)
+        client = app.test_client()
+
+        seeded = 0
+        print(f"{'bank':>8}  {'full scan p50':>14}  {'cached p50':>11}  {'/start p50':>11}  {'/start p95':>11}")
+        for size in args.sizes:
+            seed_questions(size - seeded, start=seeded)
+            seeded = size
+
+            def full_scan():
+                random.sample(Question.query.all(), 10)
+                db.session.expunge_all()
+
+            question_bank.snapshot()  # warm the cache outside the timed loop
+            scan = summarize(timed(full_scan, max(5, args.repeat // 5)))
+            cached = summarize(timed(lambda: question_bank.snapshot().sample(10), args.repeat))
+            start = summarize(timed(lambda: client.post("/api/exam/start", headers=headers), args.repeat))
+            print(f"{size:>8}  {scan['p50_ms']:>12.3f}ms  {cached['p50_ms']:>9.3f}ms"
+                  f"  {start['p50_ms']:>9.3f}ms  {start['p95_ms']:>9.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
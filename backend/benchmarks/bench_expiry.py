@@ -0,0 +1,75 @@
+"""Deadline recovery and auto-submit throughput of the exam expiry scheduler.
+
+Seeds many finished sessions plus a smaller number of open ones whose
+deadline has passed (as after a restart following an outage), then times
+rebuilding the deadline heap from the partial index and auto-submitting
+every expired session in batches:
+
+    python -m benchmarks.bench_expiry --finished 200000 --open 20000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, text
+
+from benchmarks._common import load_app, seed_questions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--finished", type=int, default=200_000)
+    parser.add_argument("--open", type=int, default=20_000)
+    parser.add_argument("--questions", type=int, default=10, help="Questions per session.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    app = load_app(EXAM_EXPIRY_ENABLED="false", EXAM_EXPIRY_BATCH_SIZE=args.batch_size)
+    from app.expiry import exam_expiry
+    from app.extensions import db
+    from app.models import Answer, ExamQuestion, ExamSession, User
+
+    with app.app_context():
+        db.session.add(User(email_enc=b"x", email_hash="bench", password_hash="x"))
+        seed_questions(args.questions)
+        past = datetime.utcnow() - timedelta(hours=2)
+        rows = [{"user_id": 1, "start_time": past, "expires_at": past, "submitted": True, "score": 0}
+                for _ in range(args.finished)]
+        rows += [{"user_id": 1, "start_time": past, "expires_at": past + timedelta(seconds=i % 600), "submitted": False}
+                 for i in range(args.open)]
+        for lo in range(0, len(rows), 20_000):
+            db.session.execute(insert(ExamSession), rows[lo:lo + 20_000])
+        open_ids = range(args.finished + 1, args.finished + args.open + 1)
+        db.session.execute(insert(ExamQuestion), [
+            {"exam_session_id": sid, "question_id": q} for sid in open_ids for q in range(1, args.questions + 1)
+        ])
+        db.session.execute(insert(Answer), [
+            {"exam_session_id": sid, "question_id": 1, "chosen_option": "A"} for sid in open_ids
+        ])
+        db.session.commit()
+
+        recovery = select(ExamSession.id, ExamSession.expires_at).where(
+            ExamSession.submitted.is_(False), ExamSession.expires_at.is_not(None))
+        sql = str(recovery.compile(db.engine, compile_kwargs={"literal_binds": True}))
+        plan = db.session.execute(text("EXPLAIN QUERY PLAN " + sql)).all()
+        print("recovery plan:", "; ".join(row[-1] for row in plan))
+
+        t0 = time.perf_counter()
+        scheduled = exam_expiry.rebuild()
+        print(f"rebuild: {scheduled} open of {args.finished + args.open} sessions"
+              f" in {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+        t0 = time.perf_counter()
+        batches = 0
+        while exam_expiry.expire_due():
+            batches += 1
+        elapsed = time.perf_counter() - t0
+        print(f"expire: {exam_expiry.expired} sessions in {batches} batches, {elapsed:.2f}s"
+              f" ({exam_expiry.expired / elapsed:,.0f} sessions/s)")
+
+        graded = db.session.query(ExamSession).filter(ExamSession.submitted.is_(False)).count()
+        assert graded == 0, f"{graded} sessions left open"
+
+
+if __name__ == "__main__":
+    main()
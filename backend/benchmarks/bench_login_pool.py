@@ -0,0 +1,61 @@
+"""Login throughput and /health latency with and without the bcrypt pool.
+
+Drives concurrent logins for a fixed duration while a probe thread keeps
+calling /health, for each PASSWORD_HASH_EXECUTOR mode.
+
+    python -m benchmarks.bench_login_pool --clients 32 --seconds 10
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+
+from benchmarks._common import load_app, summarize, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--modes", nargs="+", default=["inline", "thread", "process"])
+    args = parser.parse_args()
+
+    app = load_app(PASSWORD_HASH_ROUNDS=args.rounds, PASSWORD_HASH_WORKERS=args.workers)
+    from app.hashing import password_hasher
+
+    client = app.test_client()
+    creds = {"email": "bench@example.com", "password": "Passw0rd!"}
+    client.post("/api/auth/register", json=creds)
+    client.post("/api/auth/login", json=creds)  # burn the deliberate first failure
+
+    print(f"{'mode':>8}  {'logins/s':>9}  {'503s':>6}  {'/health p50':>11}  {'/health p95':>11}")
+    for mode in args.modes:
+        app.config["PASSWORD_HASH_EXECUTOR"] = mode
+        password_hasher.configure(app.config)
+        deadline = time.monotonic() + args.seconds
+        statuses = Counter()
+
+        def login_loop():
+            c = app.test_client()
+            while time.monotonic() < deadline:
+                statuses[c.post("/api/auth/login", json=creds).status_code] += 1
+
+        threads = [threading.Thread(target=login_loop) for _ in range(args.clients)]
+        for t in threads:
+            t.start()
+        probes = []
+        while time.monotonic() < deadline:
+            probes += timed(lambda: client.get("/health"), 1)
+            time.sleep(0.01)
+        for t in threads:
+            t.join()
+
+        health = summarize(probes)
+        print(f"{mode:>8}  {statuses[200] / args.seconds:>9.1f}  {statuses[503]:>6}"
+              f"  {health['p50_ms']:>9.3f}ms  {health['p95_ms']:>9.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
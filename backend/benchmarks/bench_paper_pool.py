@@ -0,0 +1,102 @@
+"""POST /api/exam/start latency under a burst of simultaneous starts, with
+papers drawn per request versus popped from the pre-generated pool.
+
+Reports the end-to-end latency and, separately, the time spent getting the
+paper, since the session INSERTs dominate the total on SQLite. Uses a
+stratified mix so each draw does real work:
+
+    python -m benchmarks.bench_paper_pool --bank 20000 --burst 400 --threads 16
+"""
+import argparse
+import threading
+import time
+
+from benchmarks._common import auth_header, load_app, seed_questions, summarize
+
+
+def burst(app, headers, starts, threads):
+    samples = []
+    lock = threading.Lock()
+    per_thread = starts // threads
+
+    def worker():
+        client = app.test_client()
+        mine = []
+        for _ in range(per_thread):
+            t0 = time.perf_counter()
+            resp = client.post("/api/exam/start", headers=headers)
+            mine.append((time.perf_counter() - t0) * 1000)
+            assert resp.status_code == 200, resp.get_json()
+        with lock:
+            samples.extend(mine)
+
+    t0 = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return samples, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bank", type=int, default=20000)
+    parser.add_argument("--burst", type=int, default=400, help="Starts in the burst.")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--mix", default="topic-0/*:2,topic-1/*:2,*/1:2,*/2:2,*/3:2")
+    args = parser.parse_args()
+
+    app = load_app(EXAM_PAPER_MIX=args.mix, PAPER_POOL_SIZE=args.burst, PAPER_POOL_LOW_WATER=args.burst // 4,
+                   EXAM_EXPIRY_ENABLED="false")
+    from app.extensions import db
+    from app.models import User
+    from app.papers import paper_pool
+    from app.question_bank import question_bank
+
+    with app.app_context():
+        db.session.add(User(email_enc=b"x", email_hash="bench", password_hash="x"))
+        db.session.commit()
+        seed_questions(args.bank)
+        headers = auth_header(1)
+        take_ms = []
+        take = paper_pool.take
+
+        def timed_take():
+            t0 = time.perf_counter()
+            paper = take()
+            take_ms.append((time.perf_counter() - t0) * 1000)
+            return paper
+
+        paper_pool.take = timed_take
+        bank = question_bank.snapshot()
+        k = paper_pool.question_count()
+        t0 = time.perf_counter()
+        for _ in range(200):
+            paper_pool.draw(bank, k)
+        print(f"mix {args.mix!r}: {k} questions, one draw {(time.perf_counter() - t0) / 200 * 1000:.3f}ms")
+
+        print(f"{'mode':<8} {'p50':>9} {'p95':>9} {'p99':>9} {'starts/s':>9} {'hit rate':>9}"
+              f" {'paper p50':>10} {'paper p99':>10}")
+        for mode in ("inline", "pool"):
+            size = paper_pool.size
+            if mode == "inline":
+                paper_pool.size = 0
+                paper_pool._papers.clear()
+            else:
+                paper_pool.refill()
+            hits, misses = paper_pool.hits, paper_pool.misses
+            take_ms.clear()
+            samples, elapsed = burst(app, headers, args.burst, args.threads)
+            paper_pool.size = size
+            stats = summarize(samples)
+            ordered = sorted(samples)
+            served = paper_pool.hits - hits + paper_pool.misses - misses
+            print(f"{mode:<8} {stats['p50_ms']:>7.2f}ms {stats['p95_ms']:>7.2f}ms"
+                  f" {ordered[int(len(ordered) * 0.99) - 1]:>7.2f}ms {len(samples) / elapsed:>9.0f}"
+                  f" {(paper_pool.hits - hits) / served:>9.0%}"
+                  f" {summarize(take_ms)['p50_ms']:>8.3f}ms {sorted(take_ms)[int(len(take_ms) * 0.99) - 1]:>8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
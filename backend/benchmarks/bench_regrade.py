@@ -0,0 +1,89 @@
+"""Throughput of `flask exam regrade` on a synthetic answer history.
+
+Every --open-every-th session is still open and its answers, stored after
+those of the next (submitted) session, are to the same questions; the
+regrade must ignore them. The
+scores written back are checked against a plain-Python recount, exiting 1 on
+a mismatch:
+
+    python -m benchmarks.bench_regrade --sessions 20000 --answers-per-session 50
+"""
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict
+
+from sqlalchemy import insert, select
+
+from benchmarks._common import load_app, seed_questions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--answers-per-session", type=int, default=50)
+    parser.add_argument("--questions", type=int, default=5000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--open-every", type=int, default=7, help="Every n-th session is left open (0 = none).")
+    args = parser.parse_args()
+
+    app = load_app()
+    from app.extensions import db
+    from app.models import Answer, ExamSession, Question, User
+
+    def is_open(sid):
+        return args.open_every and sid % args.open_every == 0
+
+    with app.app_context():
+        db.session.add(User(email_enc=b"x", email_hash="bench", password_hash="x"))
+        db.session.commit()
+        seed_questions(args.questions)
+
+        t0 = time.perf_counter()
+        for lo in range(0, args.sessions, 1000):
+            n = min(1000, args.sessions - lo)
+            db.session.execute(insert(ExamSession), [
+                {"user_id": 1, "submitted": not is_open(sid), "score": None if is_open(sid) else 0}
+                for sid in range(lo + 1, lo + n + 1)
+            ])
+            papers = {sid: random.sample(range(1, args.questions + 1), args.answers_per_session)
+                      for sid in range(lo + 1, lo + n + 1)}
+            rows = []
+            for sid in range(lo + 1, lo + n + 1):
+                if is_open(sid):
+                    continue
+                rows.extend({"exam_session_id": sid, "question_id": qid, "chosen_option": random.choice("ABCD")}
+                            for qid in papers[sid])
+                if is_open(sid - 1) and sid - 1 > lo:
+                    # the open session before it kept autosaving afterwards,
+                    # to the same question ids
+                    rows.extend({"exam_session_id": sid - 1, "question_id": qid,
+                                 "chosen_option": random.choice("ABCD")} for qid in papers[sid])
+            db.session.execute(insert(Answer), rows)
+            db.session.commit()
+        print(f"seeded {args.sessions * args.answers_per_session:,} answers in {time.perf_counter() - t0:.1f}s")
+
+    result = app.test_cli_runner().invoke(args=["exam", "regrade", "--chunk-size", str(args.chunk_size)])
+    print(next(line for line in result.output.splitlines() if line.startswith("updated")))
+
+    with app.app_context():
+        key = dict(db.session.execute(select(Question.id, Question.correct_option)).all())
+        expected = defaultdict(int)
+        for sid, qid, option in db.session.execute(
+            select(Answer.exam_session_id, Answer.question_id, Answer.chosen_option)
+        ):
+            expected[sid] += key[qid] == option
+        wrong = [
+            sid for sid, score in db.session.execute(
+                select(ExamSession.id, ExamSession.score).where(ExamSession.submitted.is_(True))
+            ) if score != expected[sid]
+        ]
+    if wrong:
+        print(f"{len(wrong)} sessions scored wrong, e.g. {wrong[:5]}", file=sys.stderr)
+        sys.exit(1)
+    print("scores match a plain recount")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""JWT revocation overhead: seeds a denylist of --revoked live entries, then
+times the revocation check on its own and GET /api/auth/me end to end with
+no check, with the Bloom filter + LRU denylist and with a naive database
+query per request. Also reports the filter's measured false-positive rate:
+
+    python -m benchmarks.bench_revocation --revoked 100000
+"""
+import argparse
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from benchmarks._common import load_app, summarize, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--revoked", type=int, default=100_000, help="Live revoked jtis.")
+    parser.add_argument("--users", type=int, default=1000, help="Users the jtis belong to; 1 in 10 also has a revoke-all.")
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--probes", type=int, default=100_000, help="Unrevoked jtis checked for false positives.")
+    args = parser.parse_args()
+
+    app = load_app(PASSWORD_HASH_ROUNDS=4, REVOCATION_SYNC_SECONDS=3600,
+                   REVOCATION_BLOOM_CAPACITY=max(100_000, args.revoked))
+    from flask_jwt_extended import decode_token
+
+    from app.extensions import db, jwt
+    from app.models import RevokedToken, User
+    from app.revocation import token_denylist
+
+    client = app.test_client()
+    creds = {"email": "revoke@example.com", "password": "Passw0rd!", "full_name": "Bench"}
+    client.post("/api/auth/register", json=creds)
+    client.post("/api/auth/login", json=creds)  # the first login always fails
+    token = client.post("/api/auth/login", json=creds).get_json()["access_token"]
+    headers = {"Authorization": "Bearer " + token}
+
+    with app.app_context():
+        payload = decode_token(token)
+        db.session.execute(insert(User), [
+            {"email_enc": b"x", "email_hash": f"bench-{i}", "password_hash": "x"} for i in range(args.users)
+        ])
+        expires = datetime.utcnow() + timedelta(days=7)
+        rows = [{"jti": str(uuid.uuid4()), "user_id": 2 + i % args.users, "expires_at": expires}
+                for i in range(args.revoked)]
+        rows += [{"jti": None, "user_id": 2 + i, "expires_at": expires} for i in range(0, args.users, 10)]
+        for lo in range(0, len(rows), 10_000):
+            db.session.execute(insert(RevokedToken), rows[lo:lo + 10_000])
+        db.session.commit()
+        revoked = {"jti": rows[0]["jti"], "sub": str(rows[0]["user_id"]), "iat": 0}
+
+    def naive(jwt_header, jwt_payload):
+        # what a plain per-request check costs: look the token and the user up
+        with db.engine.connect() as conn:
+            if conn.execute(select(RevokedToken.id).where(RevokedToken.jti == jwt_payload["jti"])).first():
+                return True
+            cutoff = conn.execute(
+                select(RevokedToken.revoked_at)
+                .where(RevokedToken.user_id == int(jwt_payload["sub"]), RevokedToken.jti.is_(None))
+                .order_by(RevokedToken.revoked_at.desc()).limit(1)
+            ).scalar()
+            return cutoff is not None and jwt_payload["iat_us"] <= (cutoff - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+
+    denylist = jwt._token_in_blocklist_callback
+    with app.test_request_context():
+        token_denylist.is_revoked(payload)  # loads the filter
+        print(f"{args.revoked} revoked jtis, {args.users // 10} revoke-alls; "
+              f"filter {token_denylist.stats()['bloom_bytes']:,} bytes")
+        print("check only, per call:")
+        for name, fn in (
+            ("valid token, Bloom negative", lambda: token_denylist.is_revoked(payload)),
+            ("revoked token, LRU hit", lambda: token_denylist.is_revoked(revoked)),
+            ("naive query", lambda: naive(None, payload)),
+        ):
+            print(f"  {name:<28} {summarize(timed(fn, args.repeat))}")
+        before = token_denylist.store_lookups
+        hits = sum(token_denylist.is_revoked({"jti": str(uuid.uuid4()), "sub": "0"}) for _ in range(args.probes))
+        lookups = token_denylist.store_lookups - before
+        print(f"false positives: {lookups} store lookups for {args.probes} unrevoked probes "
+              f"({lookups / args.probes:.3%}), {hits} wrongly denied")
+
+    me = lambda: client.get("/api/auth/me", headers=headers)  # noqa: E731
+    print("GET /api/auth/me:")
+    results = {}
+    for name, callback in (("no check", lambda h, p: False), ("denylist", denylist), ("naive query", naive)):
+        jwt._token_in_blocklist_callback = callback
+        assert me().status_code == 200
+        results[name] = summarize(timed(me, args.repeat))
+        print(f"  {name:<12} {results[name]}")
+    jwt._token_in_blocklist_callback = denylist
+    for name in ("denylist", "naive query"):
+        print(f"  overhead of {name}: {results[name]['p50_ms'] - results['no check']['p50_ms']:+.3f} ms p50")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Serialization CPU per request: exam papers and ordinary JSON responses.
+
+Papers: building the question dicts and running them through jsonify (the
+old start_exam path) versus joining the bank's cached per-question JSON
+fragments. Other responses: Flask's default JSON provider versus the
+orjson provider (skipped when orjson is not installed).
+
+    python -m benchmarks.bench_serialization --questions 10 50 100
+"""
+import argparse
+import time
+
+from flask import jsonify
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks._common import load_app, seed_questions
+
+
+def cpu_us(fn, repeat):
+    t0 = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - t0) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = load_app(JSON_PROVIDER="default")
+    from app.json_provider import OrjsonProvider, orjson
+    from app.question_bank import question_bank
+
+    with app.app_context(), app.test_request_context():
+        seed_questions(max(args.questions) * 10)
+        bank = question_bank.snapshot()
+
+        print("exam paper, CPU per response")
+        print(f"{'questions':>9} {'dicts+jsonify':>14} {'fragments':>10} {'speedup':>8}")
+        for k in args.questions:
+            ids = bank.ids[:k]
+
+            def old_path():
+                payload = [
+                    {"id": qid, "text": bank.payloads[qid]["text"], "options": dict(bank.payloads[qid]["options"])}
+                    for qid in ids
+                ]
+                return jsonify({"session_id": 1, "expires_at": "2024-01-01T00:00:00Z", "questions": payload}).data
+
+            def new_path():
+                return b'{"expires_at":"%sZ","questions":%s,"session_id":%d}\n' % (
+                    b"2024-01-01T00:00:00", bank.questions_json(ids), 1)
+
+            before, after = cpu_us(old_path, args.repeat), cpu_us(new_path, args.repeat)
+            print(f"{k:>9} {before:>12.1f}us {after:>8.1f}us {before / after:>7.1f}x")
+
+        if orjson is None:
+            print("orjson is not installed; skipping the provider comparison")
+            return
+        default, fast = DefaultJSONProvider(app), OrjsonProvider(app)
+        samples = {
+            "profile": {"id": 7, "email": "student@example.com", "full_name": "Ada Lovelace",
+                        "created_at": "2024-01-01T00:00:00Z", "updated_at": "2024-01-01T00:00:00Z"},
+            "submission": {"ticket": 41, "session_id": 12, "status": "graded", "score": 8, "error": None},
+            "stats": {"db_pool": {"size": 20, "checked_out": 3, "overflow": 0, "waits": 0},
+                      "paper_pool": {"depth": 180, "size": 200, "hits": 9000, "misses": 12},
+                      "grading_queue": {"workers": 2, "batches": 50, "graded": 9000, "rejected": 3}},
+        }
+        print("\nJSON provider, CPU per response")
+        print(f"{'payload':>10} {'default':>10} {'orjson':>10} {'speedup':>8}")
+        for name, obj in samples.items():
+            before = cpu_us(lambda: default.response(obj).data, args.repeat)
+            after = cpu_us(lambda: fast.response(obj).data, args.repeat)
+            print(f"{name:>10} {before:>8.1f}us {after:>8.1f}us {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
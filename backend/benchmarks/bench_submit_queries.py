@@ -0,0 +1,58 @@
+"""Round trips per /api/exam/submit as the number of answers grows.
+
+Exits non-zero if the statement count is not flat across exam lengths,
+so it can double as a regression check for the N+1 pattern:
+
+    python -m benchmarks.bench_submit_queries --lengths 10 50 100
+"""
+import argparse
+import sys
+
+from sqlalchemy import event
+
+from benchmarks._common import auth_header, load_app, seed_questions, summarize, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = load_app()
+    from app.extensions import db
+    from app.models import User
+
+    statements = []
+    counts = {}
+    with app.app_context():
+        db.session.add(User(email_enc=b"x", email_hash="bench", password_hash="x"))
+        db.session.commit()
+        seed_questions(max(args.lengths) * 10)
+        headers = auth_header(1)
+        client = app.test_client()
+        event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+        def start_and_submit():
+            paper = client.post("/api/exam/start", headers=headers).get_json()
+            answers = [{"question_id": q["id"], "chosen_option": "A"} for q in paper["questions"]]
+            statements.clear()
+            resp = client.post("/api/exam/submit", headers=headers,
+                               json={"session_id": paper["session_id"], "answers": answers})
+            assert resp.status_code == 200, resp.get_json()
+            return len(statements)
+
+        print(f"{'answers':>7}  {'statements':>10}  {'start+submit p50':>16}")
+        for length in args.lengths:
+            app.config["EXAM_QUESTION_COUNT"] = length
+            counts[length] = start_and_submit()
+            stats = summarize(timed(start_and_submit, args.repeat))
+            print(f"{length:>7}  {counts[length]:>10}  {stats['p50_ms']:>14.3f}ms")
+
+    if len(set(counts.values())) != 1:
+        print("FAIL: statements per submit grow with the number of answers", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Fail when a request path's SQL falls back to a table scan.
+
+Runs the real journey (register, login, start, autosave, refetch, submit,
+history pages, statistics, archival and archived reads) against a throwaway SQLite database, records every
+statement the engine executes and runs EXPLAIN QUERY PLAN on each one.
+Any ``SCAN <table>`` step outside the allowlist below is reported and
+the script exits 1, so a dropped index or a query that stops matching
+one shows up before it reaches a large table:
+
+    python -m benchmarks.check_query_plans
+"""
+import re
+import sys
+
+from sqlalchemy import event
+
+from benchmarks._common import load_app, seed_questions
+
+# statements that read a whole table on purpose
+ALLOWED_SCANS = {
+    "questions",  # the question bank snapshot loads every question once per reload
+}
+ALLOWED_STATEMENTS = (
+    # flask exam archive sizes the tables once per run for its bytes-saved report
+    re.compile(r"FROM dbstat\b"),
+    re.compile(r'^SELECT COUNT\(\*\) FROM "\w+"$'),
+)
+
+
+def journey(app, client):
+    from app.aggregates import aggregates
+
+    creds = {"email": "plans@example.com", "password": "Passw0rd!", "full_name": "Plan Check"}
+    client.post("/api/auth/register", json=creds)
+    client.post("/api/auth/login", json=creds)
+    token = client.post("/api/auth/login", json=creds).get_json()["access_token"]
+    headers = {"Authorization": "Bearer " + token}
+    client.get("/api/auth/me", headers=headers)
+
+    for _ in range(3):
+        paper = client.post("/api/exam/start", headers=headers).get_json()
+        sid, questions = paper["session_id"], paper["questions"]
+        client.post("/api/exam/answer", headers=headers,
+                    json={"session_id": sid, "question_id": questions[0]["id"], "chosen_option": "A"})
+        etag = client.get(f"/api/exam/{sid}", headers=headers).headers.get("ETag")
+        client.get(f"/api/exam/{sid}", headers={**headers, "If-None-Match": etag})
+        answers = [{"question_id": q["id"], "chosen_option": "B"} for q in questions[1:]]
+        client.post("/api/exam/submit", headers=headers, json={"session_id": sid, "answers": answers})
+
+    page = client.get("/api/exam/history?limit=2", headers=headers).get_json()
+    client.get(f"/api/exam/history?limit=2&before={page['next_before']}", headers=headers)
+
+    aggregates.flush()
+    client.get(f"/api/exam/stats?session_id={sid}", headers=headers)
+
+    # archive everything submitted, then read it back
+    app.test_cli_runner().invoke(args=["exam", "archive", "--older-than-days", "-1"])
+    client.get("/api/exam/history?limit=2", headers=headers)
+    client.get(f"/api/exam/stats?session_id={sid}", headers=headers)
+
+    # revoke tokens, use a revoked one, sync and prune the denylist
+    from app.revocation import token_denylist
+
+    tokens = client.post("/api/auth/login", json=creds).get_json()
+    client.post("/api/auth/logout", headers=headers, json={"refresh_token": tokens["refresh_token"]})
+    client.get("/api/auth/me", headers=headers)
+    client.post("/api/auth/revoke-all", headers={"Authorization": "Bearer " + tokens["access_token"]})
+    client.get("/api/auth/me", headers={"Authorization": "Bearer " + tokens["access_token"]})
+    token_denylist.sync()
+    token_denylist.prune()
+
+
+def main():
+    app = load_app(EXAM_SUBMIT_MODE="sync", PASSWORD_HASH_ROUNDS=4, LOGIN_RATE_LIMIT_ENABLED="false")
+    from app.extensions import db
+
+    statements = {}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        statements.setdefault(statement, parameters)
+
+    with app.app_context():
+        seed_questions(500)
+        event.listen(db.engine, "before_cursor_execute", record)
+        journey(app, app.test_client())
+        event.remove(db.engine, "before_cursor_execute", record)
+
+        failures = []
+        with db.engine.connect() as conn:
+            for statement, parameters in statements.items():
+                if not re.match(r"\s*(SELECT|UPDATE|DELETE|WITH)\b", statement, re.I):
+                    continue
+                if any(pattern.search(statement) for pattern in ALLOWED_STATEMENTS):
+                    continue
+                plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+                for row in plan:
+                    match = re.match(r"SCAN (\w+)", row[-1])
+                    if match and match.group(1) not in ALLOWED_SCANS:
+                        failures.append((statement, row[-1]))
+
+    print(f"checked {len(statements)} distinct statements")
+    for statement, step in failures:
+        print(f"SCAN: {step}\n  {' '.join(statement.split())}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
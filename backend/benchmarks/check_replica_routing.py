@@ -0,0 +1,128 @@
+"""Read/write routing against a primary and a replica SQLite file.
+
+The replica is a copy of the primary refreshed with the SQLite backup API,
+standing in for streaming replication. Each step reports how many
+statements went to each database and checks where they were supposed to
+go: GET reads on the replica, writes and the requests right after a write
+on the primary (also a new account's first read with its fresh token), and reads back on the primary while the replica is
+unreachable, then on the replica again once a health check passes.
+Exits 1 on a misrouted step:
+
+    python -m benchmarks.check_replica_routing
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from sqlalchemy import event
+
+from benchmarks._common import load_app, seed_questions
+
+STICKY_SECONDS = 0.5
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="replica-")
+    primary_path = os.path.join(workdir, "primary.db")
+    replica_path = os.path.join(workdir, "replica.db")
+    app = load_app(
+        "sqlite:///" + primary_path,
+        DATABASE_REPLICA_URLS="sqlite:///" + replica_path,
+        REPLICA_STICKY_SECONDS=STICKY_SECONDS,
+        REPLICA_HEALTH_INTERVAL_SECONDS=3600,  # checks run explicitly below
+        REVOCATION_SYNC_SECONDS=3600,  # keep the denylist's background reads out of the counts
+        PASSWORD_HASH_ROUNDS=4,
+        EXAM_SUBMIT_MODE="sync",
+    )
+    from app.aggregates import aggregates
+    from app.extensions import db
+    from app.routing import replica_router
+
+    def replicate():
+        with sqlite3.connect(primary_path) as src, sqlite3.connect(replica_path) as dst:
+            src.backup(dst)
+
+    counts = Counter()
+    with app.app_context():
+        seed_questions(200)
+        primary, replica = db.engines[None], db.engines["replica_0"]
+        event.listen(primary, "before_cursor_execute", lambda *a: counts.update(["primary"]))
+        event.listen(replica, "before_cursor_execute", lambda *a: counts.update(["replica"]))
+    replicate()
+
+    client = app.test_client()
+    failures = []
+
+    def step(name, fn, expect):
+        counts.clear()
+        resp = fn()
+        got = "replica" if counts["replica"] and not counts["primary"] else "primary"
+        ok = got == expect and resp.status_code < 400
+        print(f"{'ok ' if ok else 'BAD'} {name:<44} primary={counts['primary']:<3} replica={counts['replica']:<3}"
+              f" status={resp.status_code}")
+        if not ok:
+            failures.append(name)
+        return resp
+
+    creds = {"email": "replica@example.com", "password": "Passw0rd!", "full_name": "Replica Check"}
+    client.post("/api/auth/register", json=creds)
+    client.post("/api/auth/login", json=creds)
+    token = client.post("/api/auth/login", json=creds).get_json()["access_token"]
+    headers = {"Authorization": "Bearer " + token}
+    client.get("/api/exam/history", headers=headers)  # loads the token denylist from the primary
+    time.sleep(STICKY_SECONDS)
+    replicate()
+
+    step("GET /me", lambda: client.get("/api/auth/me", headers=headers), "replica")
+    start = step("POST /exam/start", lambda: client.post("/api/exam/start", headers=headers), "primary").get_json()
+    step("GET /exam/history right after a write", lambda: client.get("/api/exam/history", headers=headers), "primary")
+    answers = [{"question_id": q["id"], "chosen_option": "A"} for q in start["questions"]]
+    step("POST /exam/submit", lambda: client.post(
+        "/api/exam/submit", headers=headers, json={"session_id": start["session_id"], "answers": answers}), "primary")
+    step("GET /exam/stats right after a write", lambda: client.get("/api/exam/stats", headers=headers), "primary")
+
+    # a new account is not on the replica yet; its token's first reads must
+    # not go there, even from another address (the user key, not the client's)
+    fresh = {"email": "fresh@example.com", "password": "Passw0rd!", "full_name": "Fresh Replica"}
+    new_token = step("POST /register", lambda: client.post(
+        "/api/auth/register", json=fresh, environ_base={"REMOTE_ADDR": "10.0.0.1"}), "primary").get_json()["access_token"]
+    step("GET /me right after register, other address", lambda: client.get(
+        "/api/auth/me", headers={"Authorization": "Bearer " + new_token}, environ_base={"REMOTE_ADDR": "10.0.0.2"}),
+        "primary")
+
+    time.sleep(STICKY_SECONDS)
+    replicate()
+    resp = step("GET /exam/history after the sticky window", lambda: client.get("/api/exam/history", headers=headers),
+                "replica")
+    if [s["session_id"] for s in resp.get_json()["sessions"]] != [start["session_id"]]:
+        failures.append("history from the replica is missing the replicated session")
+
+    # take the replica away: new connections fail until it is back
+    with app.app_context():
+        replica.dispose()
+    shutil.move(replica_path, replica_path + ".away")
+    os.mkdir(replica_path)
+    step("GET /exam/history, replica down", lambda: client.get("/api/exam/history", headers=headers), "primary")
+    step("GET /exam/stats, replica still marked down", lambda: client.get("/api/exam/stats", headers=headers),
+         "primary")
+    os.rmdir(replica_path)
+    shutil.move(replica_path + ".away", replica_path)
+    with app.app_context():
+        print("health check:", replica_router.check())
+    step("GET /exam/history, replica back", lambda: client.get("/api/exam/history", headers=headers), "replica")
+
+    print("router:", replica_router.stats())
+    with app.app_context():
+        aggregates.flush()  # before the databases go away
+    shutil.rmtree(workdir, ignore_errors=True)
+    if failures:
+        print("misrouted:", ", ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
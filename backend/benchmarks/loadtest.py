@@ -0,0 +1,192 @@
+"""End-to-end load test of the auth and exam journey.
+
+Each virtual user runs the real flow against the app factory:
+register -> login (deliberately fails the first time) -> login -> /me
+-> /exam/start -> /exam/submit (plus a long-poll for the score with
+--submit-mode async), repeated until the run ends. Reports
+throughput, p50/p95/p99 latency and SQL statements per request for each
+endpoint, and can save or compare JSON baselines:
+
+    python -m benchmarks.loadtest --users 50 --seconds 30 --save benchmarks/baselines/main.json
+    python -m benchmarks.loadtest --users 50 --seconds 30 --compare benchmarks/baselines/main.json
+
+By default it uses a throwaway SQLite file; pass --database-url to point it
+at a local Postgres instead. Baselines are machine specific, so compare
+runs from the same host and settings.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from sqlalchemy import event
+
+from benchmarks._common import load_app, seed_questions
+
+STEPS = ("register", "login_first", "login", "me", "exam_start", "exam_submit", "exam_result")
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.local = threading.local()
+
+    def count_statement(self, *_):
+        self.local.statements = getattr(self.local, "statements", 0) + 1
+
+    def call(self, step, fn, expect):
+        self.local.statements = 0
+        started = time.perf_counter()
+        resp = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.latency[step].append(elapsed)
+            self.queries[step].append(self.local.statements)
+            if resp.status_code != expect:
+                self.errors[step] += 1
+        return resp if resp.status_code == expect else None
+
+
+def journey(client, rec, async_submit=False):
+    creds = {"email": f"vu-{uuid.uuid4().hex}@example.com", "password": "Passw0rd!", "full_name": "Load Test"}
+    if not rec.call("register", lambda: client.post("/api/auth/register", json=creds), 201):
+        return
+    rec.call("login_first", lambda: client.post("/api/auth/login", json=creds), 401)
+    resp = rec.call("login", lambda: client.post("/api/auth/login", json=creds), 200)
+    if not resp:
+        return
+    headers = {"Authorization": "Bearer " + resp.get_json()["access_token"]}
+    rec.call("me", lambda: client.get("/api/auth/me", headers=headers), 200)
+    resp = rec.call("exam_start", lambda: client.post("/api/exam/start", headers=headers), 200)
+    if not resp:
+        return
+    paper = resp.get_json()
+    answers = [{"question_id": q["id"], "chosen_option": random.choice("ABCD")} for q in paper["questions"]]
+    resp = rec.call("exam_submit", lambda: client.post(
+        "/api/exam/submit", headers=headers, json={"session_id": paper["session_id"], "answers": answers}),
+        202 if async_submit else 200)
+    if resp and async_submit:
+        status_url = resp.get_json()["status_url"]
+        rec.call("exam_result", lambda: client.get(status_url + "?wait=10", headers=headers), 200)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def report(rec, seconds):
+    endpoints = {}
+    for step in STEPS:
+        samples = sorted(rec.latency.get(step, ()))
+        queries = rec.queries.get(step, ())
+        endpoints[step] = {
+            "requests": len(samples),
+            "errors": rec.errors.get(step, 0),
+            "rps": round(len(samples) / seconds, 2),
+            "p50_ms": round(percentile(samples, 50), 3),
+            "p95_ms": round(percentile(samples, 95), 3),
+            "p99_ms": round(percentile(samples, 99), 3),
+            "queries_per_request": round(sum(queries) / len(queries), 2) if queries else 0.0,
+        }
+    return endpoints
+
+
+def compare(result, baseline, tolerance):
+    regressions = []
+    for step, now in result["endpoints"].items():
+        before = baseline["endpoints"].get(step)
+        if not before or not now["requests"]:
+            continue
+        for field in ("p95_ms", "p99_ms", "queries_per_request"):
+            if before[field] and now[field] > before[field] * (1 + tolerance):
+                regressions.append(f"{step}.{field}: {before[field]} -> {now[field]}")
+        if before["rps"] and now["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{step}.rps: {before['rps']} -> {now['rps']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users.")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--submit-mode", choices=("sync", "async"), default="sync")
+    parser.add_argument("--save", help="Write the result as a JSON baseline.")
+    parser.add_argument("--compare", help="Baseline JSON to compare against; exits 1 on regression.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    config = {
+        "PASSWORD_HASH_ROUNDS": args.bcrypt_rounds,
+        "PASSWORD_HASH_QUEUE_SIZE": max(16, args.users * 2),
+        # behind one trusted proxy; each journey is a new student with an
+        # address of its own, so the login limiter stays on as in production
+        "PROXY_FIX_HOPS": 1,
+        "EXAM_SUBMIT_MODE": args.submit_mode,
+    }
+    app = load_app(args.database_url, **config)
+    from app.extensions import db
+
+    rec = Recorder()
+    with app.app_context():
+        seed_questions(args.questions)
+        event.listen(db.engine, "after_cursor_execute", rec.count_statement)
+
+    deadline = time.monotonic() + args.seconds
+    journeys = [0] * args.users
+
+    def user(i):
+        client = app.test_client()
+        while time.monotonic() < deadline:
+            n = journeys[i]
+            client.environ_base["HTTP_X_FORWARDED_FOR"] = f"10.{i % 256}.{n // 256 % 256}.{n % 256}"
+            journey(client, rec, args.submit_mode == "async")
+            journeys[i] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(args.users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "settings": {**vars(args), "python": platform.python_version(), "machine": platform.machine()},
+        "journeys_per_second": round(sum(journeys) / elapsed, 2),
+        "endpoints": report(rec, elapsed),
+    }
+
+    print(f"{args.users} users, {elapsed:.1f}s, {result['journeys_per_second']} journeys/s")
+    print(f"{'endpoint':<12} {'reqs':>6} {'err':>4} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'q/req':>6}")
+    for step, row in result["endpoints"].items():
+        print(f"{step:<12} {row['requests']:>6} {row['errors']:>4} {row['rps']:>8} {row['p50_ms']:>7.1f}ms"
+              f" {row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms {row['queries_per_request']:>6}")
+
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(result, fh, indent=2)
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(result, json.load(fh), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Gunicorn settings, run from backend/: ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+The master imports the app once (preload_app) and forks the workers from
+it, so a worker boots in the time a fork takes and shares the master's
+memory pages until it writes to them. Run ``flask --app manage db upgrade``
+before starting and set DB_CREATE_ALL=false / SWAGGER_ENABLED=false in
+production. Every setting can be overridden on the command line.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8001')}")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+timeout = 60
+graceful_timeout = 30
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from app.extensions import db
+
+    # connections opened while loading (the schema check) must
+    # not be shared by the forked workers; each opens its own on first use
+    with server.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    # keep the loaded objects out of the workers' garbage collections, which
+    # would otherwise touch (and copy) every shared page
+    gc.freeze()
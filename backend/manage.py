@@ -0,0 +1,18 @@
+"""Entry point for the Flask CLI: ``flask --app manage exam regrade``.
+
+``flask --app app.py`` imports the app/ package instead of app.py, so this
+module loads app.py by path and exposes its ``app``. The ``flask db``
+commands (Flask-Migrate, which pulls in alembic) are only registered here,
+so web workers never import them.
+"""
+import importlib.util
+from pathlib import Path
+
+from flask_migrate import Migrate
+
+_spec = importlib.util.spec_from_file_location("app_main", Path(__file__).with_name("app.py"))
+_main = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_main)
+
+app = _main.app
+Migrate(app, _main.db)
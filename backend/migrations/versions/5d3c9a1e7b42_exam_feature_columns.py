@@ -0,0 +1,88 @@
+"""exam feature columns and tables
+
+Schema changes made by models.py before migrations existed: the async
+grading queue (exam_submissions), one answer per question for autosave
+(uq_answers_session_question), server-side deadlines (expires_at and the
+partial index over open sessions), question topic/difficulty for paper
+pools, content hashes for the importer, question updated_at for the
+fragment cache, and packed answer storage (answer_ids/answer_codes).
+
+Revision ID: 5d3c9a1e7b42
+Revises: 6a60ab8158f8
+Create Date: 2026-10-18 09:10:41.512087
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d3c9a1e7b42'
+down_revision = '6a60ab8158f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('topic', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('difficulty', sa.SmallInteger(), nullable=True))
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_questions_content_hash', ['content_hash'], unique=False)
+
+    with op.batch_alter_table('exam_sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('expires_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('answer_ids', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('answer_codes', sa.LargeBinary(), nullable=True))
+        batch_op.create_index('ix_exam_sessions_open_expires_at', ['expires_at'], unique=False, postgresql_where=sa.text('submitted IS false'), sqlite_where=sa.text('submitted IS 0'))
+
+    # the old submit path could store a question twice; keep the latest row
+    op.execute(
+        "DELETE FROM answers WHERE id NOT IN ("
+        "SELECT id FROM (SELECT MAX(id) AS id FROM answers GROUP BY exam_session_id, question_id) AS latest)"
+    )
+    with op.batch_alter_table('answers', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_answers_session_question', ['exam_session_id', 'question_id'])
+
+    op.create_table('exam_submissions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('exam_session_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('answers', sa.JSON(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=True),
+    sa.Column('error', sa.String(length=255), nullable=True),
+    sa.Column('claim_token', sa.String(length=32), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('graded_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['exam_session_id'], ['exam_sessions.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('exam_session_id')
+    )
+    with op.batch_alter_table('exam_submissions', schema=None) as batch_op:
+        batch_op.create_index('ix_exam_submissions_status_id', ['status', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('exam_submissions', schema=None) as batch_op:
+        batch_op.drop_index('ix_exam_submissions_status_id')
+
+    op.drop_table('exam_submissions')
+    with op.batch_alter_table('answers', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_answers_session_question', type_='unique')
+
+    with op.batch_alter_table('exam_sessions', schema=None) as batch_op:
+        batch_op.drop_index('ix_exam_sessions_open_expires_at', postgresql_where=sa.text('submitted IS false'), sqlite_where=sa.text('submitted IS 0'))
+        batch_op.drop_column('answer_codes')
+        batch_op.drop_column('answer_ids')
+        batch_op.drop_column('expires_at')
+
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.drop_index('ix_questions_content_hash')
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('difficulty')
+        batch_op.drop_column('topic')
@@ -0,0 +1,88 @@
+"""baseline schema
+
+The schema of the original release, as its db.create_all() built it.
+Databases created that way should be stamped with this revision
+(flask --app manage db stamp 6a60ab8158f8) and then upgraded; the next
+revision adds what the exam features introduced before migrations existed.
+
+Revision ID: 6a60ab8158f8
+Revises: 
+Create Date: 2026-10-18 07:52:06.246665
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a60ab8158f8'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('questions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('question_text', sa.Text(), nullable=False),
+    sa.Column('option_a', sa.String(length=255), nullable=False),
+    sa.Column('option_b', sa.String(length=255), nullable=False),
+    sa.Column('option_c', sa.String(length=255), nullable=False),
+    sa.Column('option_d', sa.String(length=255), nullable=False),
+    sa.Column('correct_option', sa.String(length=1), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email_enc', sa.LargeBinary(), nullable=False),
+    sa.Column('email_hash', sa.String(length=64), nullable=False),
+    sa.Column('password_hash', sa.String(length=255), nullable=False),
+    sa.Column('full_name', sa.String(length=120), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('first_login_attempted', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email_hash')
+    )
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index('ix_users_email_hash', ['email_hash'], unique=False)
+
+    op.create_table('exam_sessions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('end_time', sa.DateTime(), nullable=True),
+    sa.Column('submitted', sa.Boolean(), nullable=True),
+    sa.Column('score', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('answers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('exam_session_id', sa.Integer(), nullable=False),
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('chosen_option', sa.String(length=1), nullable=False),
+    sa.ForeignKeyConstraint(['exam_session_id'], ['exam_sessions.id'], ),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('exam_questions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('exam_session_id', sa.Integer(), nullable=False),
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['exam_session_id'], ['exam_sessions.id'], ),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('exam_questions')
+    op.drop_table('answers')
+    op.drop_table('exam_sessions')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_email_hash')
+
+    op.drop_table('users')
+    op.drop_table('questions')
@@ -0,0 +1,14 @@
+"""WSGI entry point for production: ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+Loads app.py by path like manage.py (``app`` is also the package name), but
+without the ``flask db`` commands. With ``preload_app`` the gunicorn master
+imports this once and every worker is forked from the loaded app.
+"""
+import importlib.util
+from pathlib import Path
+
+_spec = importlib.util.spec_from_file_location("app_main", Path(__file__).with_name("app.py"))
+_main = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_main)
+
+app = _main.app
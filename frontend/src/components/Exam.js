@@ -17,6 +17,10 @@ export default function Exam({ token, onExit }) {
         const res = await apiRequest("/api/exam/start", "POST", null, token);
         setSessionId(res.session_id);
         setQuestions(res.questions);
+        // the server owns the deadline; late submits are rejected
+        if (res.expires_at) {
+          setTimeLeft(Math.max(0, Math.floor((Date.parse(res.expires_at) - Date.now()) / 1000)));
+        }
       } catch (err) {
         console.error("Error starting exam:", err);
       }